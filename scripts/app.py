@@ -16,16 +16,166 @@ from feishu_oauth import get_auth_url, feishu_login_flow
 # Lazy loaded imports: wrapper, ppt_generator, canva_uploader, screenshot_automation
 
 # -------------------------------------------------------------------
-# Helper: list generated files for a client
+# Helper: cached reads over the output manifest (keyed on manifest version)
 # -------------------------------------------------------------------
-def list_client_files(client_folder: Path):
-    files = []
-    for f in client_folder.iterdir():
-        if f.is_file() and f.suffix in {".md", ".json", ".png", ".jpg", ".pptx"}:
-            files.append(f)
-    return files
+DASHBOARD_PAGE_SIZE = 20
 
 
+@st.cache_data(show_spinner=False)
+def cached_client_count(version: int, search: str) -> int:
+    from output_manifest import count_clients
+    return count_clients(search)
+
+
+@st.cache_data(show_spinner=False)
+def cached_clients(version: int, search: str, offset: int) -> list:
+    from output_manifest import list_clients
+    return list_clients(search, offset, DASHBOARD_PAGE_SIZE)
+
+
+@st.cache_data(show_spinner=False)
+def cached_client_names(version: int) -> list:
+    from output_manifest import list_clients
+    return [c["client"] for c in list_clients()]
+
+
+@st.cache_data(show_spinner=False)
+def cached_client_files(version: int, client: str) -> list:
+    from output_manifest import list_files
+    return list_files(client)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def read_preview(path: str, mtime: float) -> str:
+    return Path(path).read_text(encoding="utf-8")
+
+
+# -------------------------------------------------------------------
+# Helper: show background job status (jobs run in job_queue workers)
+# -------------------------------------------------------------------
+def render_jobs(kind: str, limit: int = 5):
+    from job_queue import list_jobs, STATUS_LABELS, QUEUED, RUNNING
+    jobs = list_jobs(kind=kind, limit=limit)
+    if not jobs:
+        return
+    st.subheader("🗂️ 最近任务")
+    for job in jobs:
+        params = job["params"]
+        label = params.get("client_name", job["id"])
+        st.markdown(f"**{label}** · `{job['id']}` · {STATUS_LABELS[job['status']]}")
+        if job["status"] in (QUEUED, RUNNING):
+            st.progress(job["progress"], text=job["message"] or "等待 worker 领取...")
+        elif job["status"] == "failed":
+            with st.expander("查看错误"):
+                st.code(job["error"] or "")
+        else:
+            result = job["result"] or {}
+            for w in result.get("warnings", []):
+                st.warning(f"⚠️ {w}")
+            if result.get("project_key"):
+                render_sync_status(result["project_key"])
+            if result.get("client_folder"):
+                st.caption("结果文件已生成，可在【仪表盘】中预览和下载。")
+                for f in Path(result["client_folder"]).glob("*.pptx"):
+                    if st.button(f"📤 发送 {f.name} 到 Canva", key=f"canva_{job['id']}_{f.name}"):
+                        from canva_uploader import upload_to_canva
+                        res = upload_to_canva(str(f))
+                        if res.get("success"):
+                            st.success(res.get("message"))
+                            st.markdown(f"[🎨 打开 Canva]({res.get('design_url')})", unsafe_allow_html=True)
+                        else:
+                            st.error(res.get("error"))
+            if result.get("report") and Path(result["report"]).exists():
+                with st.expander("📄 查看报告", expanded=job is jobs[0]):
+                    st.markdown(Path(result["report"]).read_text(encoding="utf-8"))
+    if any(j["status"] in (QUEUED, RUNNING) for j in jobs):
+        if st.button("🔄 刷新任务状态", key=f"refresh_{kind}"):
+            st.rerun()
+
+
+def render_sync_status(project_key: str):
+    from platform_outbox import get_project
+    sync = get_project(project_key)
+    if sync["doc_url"]:
+        st.markdown(f"📄 [查看交付文档]({sync['doc_url']})")
+    if sync["pending"]:
+        st.caption(f"🔄 平台同步中（{sync['pending']} 条待投递）")
+    if sync["dead"]:
+        st.warning(f"⚠️ {sync['dead']} 条平台同步失败，可运行 `python platform_outbox.py retry --project {project_key}` 重试")
+        if sync["last_error"]:
+            with st.expander("查看同步错误"):
+                st.code(sync["last_error"])
+    # 多平台同步时单个平台失败不会重试，需要到该平台手动补录
+    from platform_fanout import recent_failures
+    failures = recent_failures(limit=10, project_key=project_key)
+    if failures:
+        platforms = sorted({f["platform"] for f in failures})
+        st.warning(f"⚠️ {len(failures)} 个操作未同步到 {', '.join(p.upper() for p in platforms)}，其他平台已写入")
+        with st.expander("查看单平台同步失败"):
+            for f in failures:
+                st.caption(f"{f['time']} · {f['platform'].upper()} · {f['operation']}")
+                st.code(f["error"])
+
+
+# -------------------------------------------------------------------
+# Helper: live per-stage token stream of the running pipeline job
+# -------------------------------------------------------------------
+PIPELINE_STAGES = [("D", "矩阵提取"), ("B", "转化路径"), ("C", "质检暴改"), ("A", "商业提案")]
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+
+def live_fragment(run_every: float):
+    """Auto-refreshing fragment when the installed Streamlit supports it."""
+    if _fragment is None:
+        return lambda fn: fn
+    return _fragment(run_every=run_every)
+
+
+@live_fragment(run_every=1)
+def render_pipeline_stream():
+    from job_queue import list_jobs, cancel_job, QUEUED, RUNNING
+    from stage_stream import read_stage, STATUS_LABELS as STAGE_LABELS
+    active = [j for j in list_jobs(kind="pipeline", limit=10) if j["status"] in (QUEUED, RUNNING)]
+    watched = st.session_state.get("stream_watching")
+    if not active:
+        if watched:
+            # 刚刚结束：整页刷新一次，让任务列表和仪表盘显示结果
+            st.session_state.stream_watching = None
+            st.rerun()
+        return
+
+    if len(active) > 1:
+        job = st.selectbox("正在运行的流水线", active, format_func=lambda j: f"{j['params']['client_name']} ({j['id']})")
+    else:
+        job = active[0]
+    st.session_state.stream_watching = job["id"]
+    client_folder = job["params"]["client_folder"]
+
+    col_title, col_cancel = st.columns([4, 1])
+    with col_title:
+        st.subheader(f"📡 实时生成 · {job['params']['client_name']}")
+        st.caption(job["message"] or "等待 worker 领取...")
+    with col_cancel:
+        if st.button("🛑 取消", key=f"cancel_{job['id']}"):
+            if cancel_job(job["id"]):
+                st.warning("已发出取消请求，当前阶段会在下一个 token 处停止。")
+
+    for stage, name in PIPELINE_STAGES:
+        info = read_stage(client_folder, stage)
+        label = (f"{stage} · {name} · {STAGE_LABELS[info['status']]} · "
+                 f"{info['elapsed']:.0f}s · {info['tokens']} tokens · {info['tokens_per_sec']:.1f} tok/s")
+        with st.expander(label, expanded=info["status"] == "running"):
+            st.markdown(info["text"] or "_等待输出..._")
+
+
+def submit_job(kind: str, params: dict) -> str:
+    from job_queue import enqueue, ensure_worker_running
+    job_id = enqueue(kind, params)
+    if ensure_worker_running():
+        st.info("🛠️ 已启动后台 worker")
+    st.success(f"✅ 任务已提交（{job_id}），可离开本页，完成后结果会出现在仪表盘。")
+    return job_id
+
 
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
@@ -90,58 +240,71 @@ page = st.sidebar.radio("页面", ["仪表盘", "🚀 新建项目", "压力测
 # ---------------------------------------------------------------
 if page == "仪表盘":
     st.header("📊 仪表盘")
-    output_root = Path(__file__).parent.parent / "output"
-    output_root.mkdir(parents=True, exist_ok=True)  # Create if not exists
-    clients = [p.name for p in output_root.iterdir() if p.is_dir()]
+    from output_manifest import manifest_version, remove_client
+
+    render_jobs("pipeline", limit=3)
     st.subheader("已生成的客户文件夹")
 
+    version = manifest_version()
+    col_search, col_page = st.columns([3, 1])
+    with col_search:
+        search = st.text_input("🔍 搜索客户", "", key="dash_search").strip()
+    total = cached_client_count(version, search)
+    pages = max(1, (total + DASHBOARD_PAGE_SIZE - 1) // DASHBOARD_PAGE_SIZE)
+    with col_page:
+        page_no = st.number_input(f"页码（共 {pages} 页）", min_value=1, max_value=pages, value=1, step=1)
+
+    clients = cached_clients(version, search, (page_no - 1) * DASHBOARD_PAGE_SIZE)
     if not clients:
         st.info("暂无数据，请先去【运行流水线】")
     else:
-        for client in clients:
-            with st.expander(f"📂 {client} (点击查看文件)", expanded=False):
-                folder_path = output_root / client
-                
+        for info in clients:
+            client = info["client"]
+            with st.expander(f"📂 {client} · {info['file_count']} 个文件 · {info['total_size'] / 1024:.0f} KB", expanded=False):
                 # Management Actions
                 col_del, _ = st.columns([1, 4])
                 with col_del:
                     if st.button("🗑️ 删除此客户", key=f"del_{client}"):
-                        import shutil
                         try:
-                            shutil.rmtree(folder_path)
+                            remove_client(client)
                             st.success(f"已删除 {client}！")
                             st.rerun()
                         except Exception as e:
                             st.error(f"删除失败: {e}")
 
                 # List Files
-                files = list_client_files(folder_path)
+                files = cached_client_files(version, client)
                 if not files:
                     st.warning("文件夹为空")
                 else:
                     for f in files:
-                        st.markdown(f"**📄 {f.name}**")
+                        st.markdown(f"**📄 {f['name']}** · {f['size'] / 1024:.1f} KB")
                         col_view, col_dl = st.columns([1, 1])
-                        
+
                         # Preview Content for Markdown/JSON
-                        if f.suffix in [".md", ".json", ".txt"]:
+                        if f["suffix"] in [".md", ".json", ".txt"]:
                             with col_view:
-                                if st.checkbox(f"👀 预览", key=f"view_{client}_{f.name}"):
-                                    content = f.read_text(encoding="utf-8")
-                                    if f.suffix == ".json":
+                                if st.checkbox(f"👀 预览", key=f"view_{client}_{f['name']}"):
+                                    content = read_preview(f["path"], f["mtime"])
+                                    if f["suffix"] == ".json":
                                         st.code(content, language="json")
                                     else:
                                         st.markdown(content)
-                        
-                        # Download Button
+
+                        # Download Button – payload is read only after the user asks for it
                         with col_dl:
-                            with open(f, "rb") as fh:
-                                st.download_button(
-                                    label="📥 下载",
-                                    data=fh,
-                                    file_name=f.name,
-                                    key=f"db_dash_{client}_{f.name}"
-                                )
+                            dl_key = f"db_dash_{client}_{f['name']}"
+                            if st.session_state.get(f"prep_{dl_key}"):
+                                with open(f["path"], "rb") as fh:
+                                    st.download_button(
+                                        label="📥 下载",
+                                        data=fh.read(),
+                                        file_name=f["name"],
+                                        key=dl_key
+                                    )
+                            elif st.button("📥 准备下载", key=f"btn_{dl_key}"):
+                                st.session_state[f"prep_{dl_key}"] = True
+                                st.rerun()
                         st.divider()
     st.info("💡 提示：这里可以管理生成的结果文件夹。")
 
@@ -181,13 +344,22 @@ elif page == "🚀 新建项目":
         
 
             
+        c_structured_d = st.checkbox("D 阶段使用结构化 JSON 输出（关键词/问题直接用于压力测试）", value=False)
+
         # Buttons
         st.caption("👇 点击下方按钮，自动保存配置并运行流水线，无需手动上传下载。")
         run_submitted = st.form_submit_button("🚀 保存并立即开始运行 (Save & Run)")
         
 
         
-    if run_submitted:
+    # 同一客户已有流水线在排队/执行时不再重复提交（也避免覆盖它正在读取的输入文件）
+    from job_queue import active_job_for_client, STATUS_LABELS
+    running_job = active_job_for_client(c_name) if run_submitted else None
+    if running_job:
+        st.warning(f"⏳ 客户「{c_name}」已有流水线任务 `{running_job['id']}` "
+                   f"{STATUS_LABELS[running_job['status']]}，完成后再重新提交")
+        st.progress(running_job["progress"], text=running_job["message"] or "等待 worker 领取...")
+    elif run_submitted:
          # Construct JSON logic
          # Parse inputs
         anchors = [line.strip() for line in c_anchors_text.split('\n') if line.strip()]
@@ -217,109 +389,34 @@ elif page == "🚀 新建项目":
         json_str = json.dumps(data, indent=4, ensure_ascii=False)
 
         st.write("---")
-        st.info(f"正在保存配置并启动流水线 (Output: output/{c_name}) ...")
 
         # Save to file
         client_folder = (Path(__file__).parent.parent / "output" / c_name).resolve()
         client_folder.mkdir(parents=True, exist_ok=True)
         input_path = client_folder / f"{c_name}.json"
         input_path.write_text(json_str, encoding='utf-8')
+        from output_manifest import record_file
+        record_file(input_path)
 
-        # ===== 平台集成：创建项目 =====
-        project_id = None
-        manager = None
-        try:
-            from platform_integration_manager import get_platform_manager
-
-            # 检查配置文件是否存在
-            config_path = Path(__file__).parent.parent / "config" / "platform_config.yaml"
-            if not config_path.exists():
-                st.warning("⚠️ 平台配置文件不存在，跳过Notion/飞书同步")
-            else:
-                manager = get_platform_manager()
-                st.info(f"📤 正在同步到 {manager.get_current_platform()}...")
-
-                # 创建项目记录
-                project_data = {
-                    "client_name": c_name,
-                    "industry": c_type,
-                    "contact": "待补充",
-                    "start_date": datetime.now().isoformat(),
-                    "description": f"产品: {c_product}, 目标: {c_goal}"
-                }
-                project_id = manager.create_new_project(project_data)
-                st.success(f"✅ 项目已创建并同步到 {manager.get_current_platform()}！")
-        except Exception as e:
-            st.warning(f"⚠️ 平台同步失败: {e}（不影响流水线执行）")
-
-        # Run Pipeline
-        with st.spinner("🚀 正在执行 D→B→C→A 全自动流水线 (耗时约 1-2 分钟)..."):
-            from wrapper import run_pipeline
-            from ppt_generator import generate_ppt
-            from platform_adapter import StageStatus
-
-            # 执行流水线
-            run_pipeline(str(c_name), str(input_path.resolve()))
-
-            # 标记阶段完成（只在完成后创建记录，避免重复）
-            if project_id and manager:
-                for stage in ["D", "B", "C", "A"]:
-                    try:
-                        manager.update_stage_progress(
-                            project_id=project_id,
-                            stage=stage,
-                            status=StageStatus.COMPLETED,
-                            duration_minutes=2
-                        )
-                    except:
-                        pass
-
-            # Generate PPT
-            generate_ppt(str(c_name), str(client_folder))
-
-        # ===== 完成项目并生成文档 =====
-        if project_id and manager:
-            try:
-                results = {
-                    "d_matrix": str(client_folder / f"{c_name}_D_矩阵提取.md"),
-                    "b_conversion": str(client_folder / f"{c_name}_B_转化路径.md"),
-                    "c_quality": str(client_folder / f"{c_name}_C_质检暴改.md"),
-                    "a_proposal": str(client_folder / f"{c_name}_A_商业提案.md"),
-                }
-                doc_url = manager.complete_project(project_id, c_name, results)
-                st.success(f"📄 [查看交付文档]({doc_url})")
-            except Exception as e:
-                st.warning(f"⚠️ 文档生成失败: {e}")
-
-        st.success("🎉 执行完成！结果如下：")
-        
-        # Show results directly (Copied from Dashboard logic)
-        files = list_client_files(client_folder)
-        for f in files:
-            with st.expander(f"📄 {f.name} (点击预览)", expanded=False):
-                col_dl, col_action = st.columns([1, 1])
-                with col_dl:
-                    with open(f, "rb") as fh:
-                        st.download_button(label="📥 下载", data=fh, file_name=f.name, key=f"dl_new_{f.name}")
-                with col_action:
-                    if f.suffix == ".pptx":
-                        if st.button(f"📤 发送到 Canva", key=f"canva_new_{f.name}"):
-                            from canva_uploader import upload_to_canva
-                            with st.spinner("正在上传..."):
-                                res = upload_to_canva(str(f))
-                                if res.get("success"):
-                                    st.success(res.get("message"))
-                                    st.markdown(f"[🎨 打开 Canva]({res.get('design_url')})", unsafe_allow_html=True)
-                                else:
-                                    st.error(res.get("error"))
-                
-                # Preview content
-                if f.suffix in [".md", ".json", ".txt"]:
-                    content = f.read_text(encoding="utf-8")
-                    if f.suffix == ".json":
-                        st.code(content, language="json")
-                    else:
-                        st.markdown(content)
+        # 流水线、PPT 在后台 worker 中执行；平台同步经发件箱异步投递
+        from platform_outbox import new_project_key
+        submit_job("pipeline", {
+            "client_name": c_name,
+            "client_folder": str(client_folder),
+            "input_path": str(input_path),
+            "structured_d": c_structured_d,
+            "project_key": new_project_key(),
+            "project_data": {
+                "client_name": c_name,
+                "industry": c_type,
+                "contact": "待补充",
+                "start_date": datetime.now().isoformat(),
+                "description": f"产品: {c_product}, 目标: {c_goal}"
+            },
+        })
+
+    render_pipeline_stream()
+    render_jobs("pipeline")
 
 # ---------------------------------------------------------------
 # 2️⃣ Run Pipeline – D→B→C→A
@@ -332,8 +429,8 @@ elif page == "🚀 新建项目":
 elif page == "压力测试":
     st.header("🔎 AI 压力测试")
     output_root = Path(__file__).parent.parent / "output"
-    output_root.mkdir(parents=True, exist_ok=True)
-    client_list = [d.name for d in output_root.iterdir() if d.is_dir()]
+    from output_manifest import manifest_version
+    client_list = cached_client_names(manifest_version())
     if not client_list:
         st.info("暂无客户数据，请先在【🚀 新建项目】创建项目。")
     else:
@@ -341,13 +438,12 @@ elif page == "压力测试":
         engines = st.multiselect("选择 AI 引擎", ["deepseek", "chatgpt"], default=["deepseek"])
         if st.button("开始压力测试"):
             client_folder = output_root / client_name
-            with st.spinner("正在以多角色发起攻击..."):
-                from wrapper import run_pressure_test
-                # Use user-selected engines
-                res = run_pressure_test(client_folder.name, str(client_folder), engines)
-                st.success(f"测试完成！报告已生成: {res}")
-                with open(res, "r") as f:
-                    st.markdown(f.read())
+            submit_job("pressure_test", {
+                "client_name": client_folder.name,
+                "client_folder": str(client_folder),
+                "engines": engines,
+            })
+        render_jobs("pressure_test")
 
 # ---------------------------------------------------------------
 # 4️⃣ Comparison Report – before/after
@@ -355,14 +451,14 @@ elif page == "压力测试":
 elif page == "对比报告":
     st.header("📈 前后对比报告")
     output_root = Path(__file__).parent.parent / "output"
-    output_root.mkdir(parents=True, exist_ok=True)
-    client_list = [d.name for d in output_root.iterdir() if d.is_dir()]
+    from output_manifest import manifest_version
+    client_list = cached_client_names(manifest_version())
     if not client_list:
         st.info("暂无客户数据，请先在【🚀 新建项目】创建项目。")
     else:
         client_name = st.selectbox("选择客户", client_list, key="cmp_client")
         client_folder = output_root / client_name
-        json_files = [f.name for f in client_folder.iterdir() if f.is_file() and f.suffix == ".json"]
+        json_files = [f["name"] for f in cached_client_files(manifest_version(), client_name) if f["suffix"] == ".json"]
         if not json_files:
             st.warning("该客户暂无 JSON 测试文件。")
         else:
@@ -374,12 +470,12 @@ elif page == "对比报告":
                 else:
                     p_before = client_folder / before_file
                     p_after = client_folder / after_file
-                    with st.spinner("正在进行语义差异分析..."):
-                        from wrapper import generate_comparison_report
-                        res = generate_comparison_report(str(p_before), str(p_after), client_name)
-                        st.success("对比报告生成完成！")
-                        with open(res, "r") as f:
-                            st.markdown(f.read())
+                    submit_job("comparison", {
+                        "client_name": client_name,
+                        "before": str(p_before),
+                        "after": str(p_after),
+                    })
+        render_jobs("comparison")
 
 # ---------------------------------------------------------------
 # 5️⃣ Settings – show (admin only) env vars
@@ -430,14 +526,18 @@ elif page == "设置":
         if st.button("测试平台连接"):
             with st.spinner(f"正在测试 {platform.upper()} 连接..."):
                 try:
+                    # 用临时实例测试所选平台，不改动全局单例当前使用的平台
                     from platform_integration_manager import PlatformIntegrationManager
                     manager = PlatformIntegrationManager()
+                    if manager.platform.value != platform:
+                        manager.switch_platform(platform)
+                    # 增量同步本地镜像：只拉取上次同步后修改过的记录，同时验证连接
+                    changed = manager.sync_mirror()
                     current = manager.get_current_platform()
                     st.success(f"✅ 平台连接成功！当前使用: {current}")
 
                     # 显示项目统计
-                    projects = manager.get_all_projects()
-                    st.info(f"📊 已同步项目数: {len(projects)}")
+                    st.info(f"📊 已同步项目数: {manager.count_projects()}（本次增量 {changed} 条）")
                 except Exception as e:
                     st.error(f"❌ 连接失败: {e}")
                     st.warning("请检查配置文件中的 AppID/Secret/Token 是否正确配置")
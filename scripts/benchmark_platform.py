@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+平台同步压测
+在进程内启动 fake_platform_server，把飞书 / Notion 请求重定向过去，
+并发跑完整的项目生命周期（创建 → 阶段进度 → 完成交付 → 压力测试结果），
+统计吞吐量与各步骤 p50/p99 延迟。
+
+用法：
+    python benchmark_platform.py --platform feishu --projects 50 --concurrency 8 --latency-ms 80
+    python benchmark_platform.py --platform notion --mode outbox --projects 20
+    python benchmark_platform.py --platform feishu --error-rate 0.02 --json output/bench.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List
+
+import yaml
+
+from fake_platform_server import FakePlatformServer, FakeServerConfig
+
+
+STAGES = ["D", "B", "C", "A"]
+
+# 交付文档中各章节的模拟结果文件（与 DOCUMENT_SECTIONS 的 results 键一致）
+RESULT_KEYS = ["d_matrix", "b_conversion", "c_quality", "a_proposal", "pressure_test"]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.5), 1),
+        "p99_ms": round(percentile(samples, 0.99), 1),
+        "max_ms": round(max(samples), 1) if samples else 0.0,
+    }
+
+
+def build_config(base_url: str) -> Dict[str, Any]:
+    """指向模拟服务的平台配置（ID 任意，模拟服务按需创建）"""
+    return {
+        "feishu": {
+            "app_id": "cli_bench",
+            "app_secret": "bench",
+            "bitable": {
+                "app_token": "bascnBench",
+                "tables": {"clients": "tblClients", "projects": "tblProjects",
+                           "pressure_tests": "tblPressure", "feedback": "tblFeedback"},
+            },
+            "drive": {"root_folder_token": "fldBenchRoot"},
+            "bot": {"webhook_url": f"{base_url}/open-apis/bot/v2/hook/bench", "debounce_seconds": 0.5},
+        },
+        "notion": {
+            "api_key": "secret_bench",
+            "databases": {"clients": "db-clients", "projects": "db-projects",
+                          "pressure_tests": "db-pressure", "feedback": "db-feedback"},
+            "pages": {},
+        },
+    }
+
+
+def write_result_files(directory: Path, sections: int) -> Dict[str, str]:
+    """生成模拟的阶段结果 markdown（标题、列表、表格混排）"""
+    body = []
+    for i in range(sections):
+        body.append(f"## 章节 {i + 1}\n\n这是 **加粗** 与 `代码` 混排的段落。\n")
+        body.append("\n".join(f"- 要点 {j}" for j in range(5)) + "\n")
+        body.append("| 关键词 | 得分 |\n| --- | --- |\n" + "\n".join(f"| 词{j} | {j * 10} |" for j in range(8)) + "\n")
+    content = "\n".join(body)
+    results = {}
+    for key in RESULT_KEYS:
+        path = directory / f"bench_{key}.md"
+        path.write_text(f"# {key}\n\n{content}", encoding="utf-8")
+        results[key] = str(path)
+    return results
+
+
+class Timer:
+    """按步骤收集耗时（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+
+    def measure(self, step: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.samples.setdefault(step, []).append(elapsed)
+
+
+def run_lifecycle(manager, index: int, results: Dict[str, str], timer: Timer):
+    """直接调用：一个项目的完整生命周期"""
+    from platform_adapter import StageStatus
+
+    client_name = f"压测客户{index:04d}"
+    project_id = timer.measure("create_project", manager.create_new_project,
+                               {"client_name": client_name, "industry": "其他"})
+    timer.measure("stages_running", manager.update_stages_progress, project_id, STAGES, StageStatus.RUNNING,
+                  client_name=client_name)
+    timer.measure("stages_completed", manager.update_stages_progress, project_id, STAGES, StageStatus.COMPLETED, 5,
+                  client_name=client_name)
+    timer.measure("complete_project", manager.complete_project, project_id, client_name, results)
+    timer.measure("pressure_test", manager.add_pressure_test_result, project_id, ["deepseek", "kimi"], 20, 72.5, 35.0)
+
+
+def run_direct(manager, args, results: Dict[str, str], timer: Timer) -> Dict[str, Any]:
+    failures = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(timer.measure, "lifecycle", run_lifecycle, manager, i, results, timer)
+                   for i in range(args.projects)]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failures.append(str(e))
+    return {"failed": len(failures), "errors": failures[:5]}
+
+
+def run_outbox(manager, args, results: Dict[str, str], timer: Timer) -> Dict[str, Any]:
+    """经发件箱：先全部登记，再由派发线程投递，统计排空时间"""
+    import platform_outbox as outbox
+    from platform_adapter import StageStatus
+
+    for i in range(args.projects):
+        client_name = f"压测客户{i:04d}"
+        key = timer.measure("enqueue", manager.sync_new_project, {"client_name": client_name, "industry": "其他"})
+        manager.sync_stages_progress(key, STAGES, StageStatus.RUNNING, client_name=client_name)
+        manager.sync_stages_progress(key, STAGES, StageStatus.COMPLETED, 5, client_name=client_name)
+        manager.sync_complete_project(key, client_name, results)
+        manager.sync_pressure_test_result(key, ["deepseek", "kimi"], 20, 72.5, 35.0)
+
+    dispatcher = outbox.OutboxDispatcher(lambda: manager, concurrency=args.concurrency)
+    thread = threading.Thread(target=dispatcher.run, daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        counts = outbox.backlog()
+        if not counts.get(outbox.PENDING) and not counts.get(outbox.DELIVERING):
+            break
+        time.sleep(0.2)
+    timer.samples["drain"] = [(time.perf_counter() - start) * 1000]
+    dispatcher.stop()
+    counts = outbox.backlog()
+    # 每条事件从登记到投递完成的耗时（含排队）
+    delivered = outbox.list_events(outbox.DELIVERED, limit=args.projects * 5)
+    timer.samples["event_delivery"] = [(e["delivered_at"] - e["created_at"]) * 1000 for e in delivered]
+    return {"failed": counts.get(outbox.DEAD, 0) + counts.get(outbox.PENDING, 0), "backlog": counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="平台同步压测（本地模拟服务）")
+    parser.add_argument("--platform", choices=["feishu", "notion"], default="feishu")
+    parser.add_argument("--mode", choices=["direct", "outbox"], default="direct",
+                        help="direct 直接调用 PlatformIntegrationManager；outbox 经发件箱派发")
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--sections", type=int, default=5, help="每个结果文件的章节数（影响文档块数量）")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--feishu-rps", type=float, default=50)
+    parser.add_argument("--notion-rps", type=float, default=3)
+    parser.add_argument("--timeout", type=float, default=600, help="outbox 模式等待排空的最长秒数")
+    parser.add_argument("--json", help="把结果写入该 JSON 文件")
+    args = parser.parse_args()
+
+    server = FakePlatformServer(FakeServerConfig(
+        args.latency_ms, args.jitter_ms, args.error_rate, args.feishu_rps, args.notion_rps
+    )).start()
+    workdir = Path(tempfile.mkdtemp(prefix="geo_bench_"))
+
+    # 平台请求、镜像与发件箱都指向临时环境，不影响真实数据
+    os.environ["GEO_FEISHU_API_BASE"] = server.base_url
+    os.environ["GEO_NOTION_API_BASE"] = server.base_url
+    os.environ["GEO_MIRROR_DB"] = str(workdir / "mirror.sqlite")
+    os.environ["GEO_OUTBOX_DB"] = str(workdir / "outbox.sqlite")
+
+    from http_session import latency_stats
+    from platform_integration_manager import PlatformIntegrationManager
+
+    config = {"default_platform": args.platform, **build_config(server.base_url)}
+    config_path = workdir / "platform_config.yaml"
+    config_path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding="utf-8")
+    manager = PlatformIntegrationManager(str(config_path))
+    results = write_result_files(workdir, args.sections)
+
+    print(f"\n🏁 压测开始: {args.platform} / {args.mode}，{args.projects} 个项目，并发 {args.concurrency}")
+    timer = Timer()
+    start = time.perf_counter()
+    if args.mode == "direct":
+        outcome = run_direct(manager, args, results, timer)
+    else:
+        outcome = run_outbox(manager, args, results, timer)
+    elapsed = time.perf_counter() - start
+    manager.notifier.flush()
+
+    report = {
+        "platform": args.platform,
+        "mode": args.mode,
+        "projects": args.projects,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_projects_per_s": round((args.projects - outcome["failed"]) / elapsed, 2) if elapsed else 0,
+        **outcome,
+        "steps": {step: summarize(samples) for step, samples in timer.samples.items()},
+        "client_endpoints": latency_stats.snapshot(),
+        "server_endpoints": server.stats(),
+    }
+    server.stop()
+
+    print("\n" + "=" * 70)
+    print(f"📊 压测结果（{report['elapsed_s']}s，{report['throughput_projects_per_s']} 项目/秒，失败 {outcome['failed']}）")
+    print("=" * 70)
+    print(f"{'步骤':<24}{'次数':>8}{'p50(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+    for step, s in report["steps"].items():
+        print(f"{step:<24}{s['count']:>8}{s['p50_ms']:>12}{s['p99_ms']:>12}{s['max_ms']:>12}")
+    for error in outcome.get("errors", []):
+        print(f"❌ {error}")
+    print("\n服务端各接口:")
+    for name, s in sorted(report["server_endpoints"].items(), key=lambda kv: -kv[1]["count"]):
+        print(f"  {s['count']:>6}  {s['avg_ms']:>8}ms  {s['statuses']}  {name}")
+
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n💾 结果已保存: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
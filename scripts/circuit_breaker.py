@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+熔断与截止时间
+平台变慢或不可用时，避免每次适配器调用都等满超时：
+
+- 熔断器：按接口（如 "POST open.feishu.cn/open-apis/bitable/v1/apps/:id/tables/:id/records"、
+  "notion pages.create"）统计。连续失败（网络错误、5xx）或慢调用达到阈值后打开，打开期间直接抛
+  CircuitOpenError；冷却结束进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。
+- 截止时间：deadline(seconds) 给一次高层操作设置总预算，期间的每个请求把超时压缩到剩余时间内，
+  预算用完时抛 DeadlineExceeded。预算存放在 contextvars 中，提交到线程池时用 submit_with_context
+  把它带到工作线程。
+
+用法：
+    from circuit_breaker import get_breaker, deadline
+    with deadline(60, "complete_project"):
+        manager.document_generator.create_project_document(...)
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+FAILURE_THRESHOLD = 5       # 连续失败多少次后打开
+SLOW_CALL_MS = 10_000       # 超过该耗时的调用按失败计
+OPEN_SECONDS = 30           # 打开后多久进入半开状态
+MIN_TIMEOUT = 0.5           # 压缩后的单次请求超时下限（秒）
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，请求未发出"""
+
+    def __init__(self, key: str, retry_in: float):
+        self.key = key
+        self.retry_in = retry_in
+        super().__init__(f"接口已熔断，{retry_in:.0f}秒后重试: {key}")
+
+
+class DeadlineExceeded(TimeoutError):
+    """高层操作的总时间预算已用完"""
+
+    def __init__(self, operation: str = ""):
+        self.operation = operation
+        super().__init__(f"操作超出截止时间: {operation}" if operation else "操作超出截止时间")
+
+
+class CircuitBreaker:
+    """单个接口的熔断器（线程安全）"""
+
+    def __init__(self, key: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 slow_call_ms: float = SLOW_CALL_MS, open_seconds: float = OPEN_SECONDS):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.slow_call_ms = slow_call_ms
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0           # 连续失败次数
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False       # 半开状态下是否已有探测请求在途
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """发请求前调用：熔断中抛 CircuitOpenError；半开状态只放行一个探测请求"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self.opened_at + self.open_seconds - time.monotonic()
+            if self.state == OPEN and retry_in <= 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(self.key, max(retry_in, 0))
+
+    def record(self, ok: bool, elapsed_ms: float = 0.0):
+        """请求结束后调用：ok 为 False 或耗时超过 slow_call_ms 时计为失败"""
+        failed = not ok or elapsed_ms > self.slow_call_ms
+        with self._lock:
+            probe = self._probing
+            self._probing = False
+            if not failed:
+                self.failures = 0
+                if self.state != CLOSED:
+                    self.state = CLOSED
+                    print(f"✅ 接口已恢复: {self.key}")
+                return
+            self.failures += 1
+            if probe or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                print(f"⛔ 接口熔断 {self.open_seconds:.0f}秒（连续失败 {self.failures} 次）: {self.key}")
+
+    def release(self):
+        """放行后请求并未发出（如排队时超过截止时间），归还半开探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "times_opened": self.times_opened}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(key: str) -> CircuitBreaker:
+    """获取接口对应的共享熔断器"""
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(key)
+            _breakers[key] = breaker
+        return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns:
+        {接口: {"state", "failures", "times_opened"}}
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.key: b.snapshot() for b in breakers}
+
+
+# ============ 截止时间 ============
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("platform_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float], operation: str = ""):
+    """
+    给当前上下文设置总时间预算；嵌套时取更早的截止时间，seconds 为空或 <= 0 时不限制
+    """
+    current = _deadline.get()
+    if not seconds or seconds <= 0:
+        yield
+        return
+    at = time.monotonic() + seconds
+    if current and current[0] <= at:
+        yield
+        return
+    token = _deadline.set((at, operation))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """当前截止时间的剩余秒数（未设置时为 None）"""
+    current = _deadline.get()
+    return None if current is None else current[0] - time.monotonic()
+
+
+def current_operation() -> str:
+    """当前截止时间所属的操作名（未设置时为空字符串）"""
+    current = _deadline.get()
+    return current[1] if current else ""
+
+
+def check_deadline():
+    """预算已用完时抛 DeadlineExceeded"""
+    current = _deadline.get()
+    if current and current[0] <= time.monotonic():
+        raise DeadlineExceeded(current[1])
+
+
+def bounded_timeout(timeout: Any) -> Any:
+    """
+    把单次请求的超时压缩到剩余预算内
+
+    Args:
+        timeout: requests 风格的超时，秒数或 (connect, read)
+
+    Returns:
+        同样形式的超时；没有截止时间时原样返回
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        check_deadline()
+    left = max(left, MIN_TIMEOUT)
+    if isinstance(timeout, tuple):
+        return tuple(left if t is None else min(t, left) for t in timeout)
+    return left if timeout is None else min(timeout, left)
+
+
+def submit_with_context(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """提交到线程池，并把当前上下文（含截止时间）带到工作线程"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
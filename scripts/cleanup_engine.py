@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+测试数据清理引擎
+cleanup_auto.py / cleanup_test_data.py 共用：
+1. 按游标翻页遍历 Notion 数据库，标题关键词 / 关联关系尽量下推为服务端 filter
+2. 先生成清理计划（dry run 只打印计划），计划落盘到 output/.cleanup/
+3. 按步骤顺序执行（先删子记录再删客户项目），步骤内并发归档，
+   请求经 notion_scheduler 以 BULK 优先级限流
+4. 每完成一项追加写入检查点，中断后 --resume 只处理剩余项
+
+用法：
+    python cleanup_engine.py plan --mode auto        # 只生成并打印计划
+    python cleanup_engine.py run --mode test_data    # 生成计划并执行
+    python cleanup_engine.py run --resume            # 继续上次未完成的计划
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import yaml
+
+from notion_scheduler import get_notion_client, BULK, MAX_CONCURRENCY
+from output_manifest import remove_client
+from platform_adapter import iter_pages
+
+
+ROOT = Path(__file__).parent.parent
+CONFIG_PATH = ROOT / "config" / "platform_config.yaml"
+OUTPUT_DIR = ROOT / "output"
+CLEANUP_DIR = OUTPUT_DIR / ".cleanup"   # 清理计划与检查点
+
+NOTION_PAGE_SIZE = 100
+FILTER_CONDITIONS_LIMIT = 50   # 单个 or 组合 filter 的条件数，超过则拆成多次查询
+
+# 测试数据关键词
+TEST_KEYWORDS = ["测试", "test", "Test", "关联测试", "流程测试"]
+
+# 自动清理时按名称直接删除的阶段记录
+STAGE_RECORD_NAMES = ["D阶段", "B阶段", "C阶段", "A阶段", "测试任务"]
+
+# 测试脚本生成的临时文件
+TEMP_FILES = [
+    ROOT / "input" / "flow_test_client.json",
+    Path(__file__).parent / "test_extraction.py",
+    Path(__file__).parent / "test_new_format_extraction.py",
+    Path(__file__).parent / "test_relation.py",
+    Path(__file__).parent / "verify_relation.py",
+    Path(__file__).parent / "check_notion_data.py",
+    Path(__file__).parent / "test_full_flow.py",
+]
+
+# 计划中的步骤（执行顺序：先删执行记录再删客户项目）
+STEP_RECORDS = "records"
+STEP_CLIENTS = "clients"
+STEP_FOLDERS = "folders"
+STEP_TEMP_FILES = "temp_files"
+
+STEP_TITLES = {
+    STEP_RECORDS: "Notion项目执行记录",
+    STEP_CLIENTS: "Notion客户项目记录",
+    STEP_FOLDERS: "本地测试文件夹",
+    STEP_TEMP_FILES: "临时文件",
+}
+
+
+def load_notion_config() -> Dict[str, Any]:
+    with open(CONFIG_PATH) as f:
+        return yaml.safe_load(f)["notion"]
+
+
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class CleanupEngine:
+    """扫描 → 计划 → 执行"""
+
+    def __init__(self, notion_config: Dict[str, Any], keywords: Optional[List[str]] = None,
+                 concurrency: int = MAX_CONCURRENCY):
+        self.notion = get_notion_client(notion_config["api_key"], priority=BULK)
+        self.databases = notion_config["databases"]
+        self.keywords = keywords or TEST_KEYWORDS
+        self.concurrency = concurrency
+        self._schemas: Dict[str, Dict[str, Any]] = {}
+
+    # ============ Notion 扫描 ============
+
+    def iter_database(self, database_id: str, query_filter: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """遍历数据库全部页面（按 next_cursor 翻页）"""
+        query: Dict[str, Any] = {"database_id": database_id, "page_size": NOTION_PAGE_SIZE}
+        if query_filter:
+            query["filter"] = query_filter
+
+        def fetch_page(cursor: Optional[str]):
+            response = self.notion.databases.query(**query, **({"start_cursor": cursor} if cursor else {}))
+            return response["results"], response.get("next_cursor") if response.get("has_more") else None
+
+        return iter_pages(fetch_page)
+
+    def _properties(self, database_id: str) -> Dict[str, Any]:
+        if database_id not in self._schemas:
+            self._schemas[database_id] = self.notion.databases.retrieve(database_id=database_id)["properties"]
+        return self._schemas[database_id]
+
+    def _property_names(self, database_id: str, prop_type: str) -> List[str]:
+        return [name for name, prop in self._properties(database_id).items() if prop["type"] == prop_type]
+
+    def _query_any(self, database_id: str, conditions: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """满足任一条件的页面（条件过多时拆分查询并去重）"""
+        seen = set()
+        for chunk in _chunks(conditions, FILTER_CONDITIONS_LIMIT):
+            query_filter = chunk[0] if len(chunk) == 1 else {"or": chunk}
+            for page in self.iter_database(database_id, query_filter):
+                if page["id"] not in seen:
+                    seen.add(page["id"])
+                    yield page
+
+    def _title_conditions(self, database_id: str, contains: Iterable[str] = (),
+                          equals: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        title_prop = self._property_names(database_id, "title")[0]
+        return ([{"property": title_prop, "title": {"contains": kw}} for kw in contains] +
+                [{"property": title_prop, "title": {"equals": name}} for name in equals])
+
+    @staticmethod
+    def _title(page: Dict[str, Any]) -> str:
+        for value in page["properties"].values():
+            if value["type"] == "title" and value["title"]:
+                return "".join(t.get("plain_text") or t["text"]["content"] for t in value["title"])
+        return ""
+
+    @staticmethod
+    def _relation_ids(page: Dict[str, Any]) -> List[str]:
+        return [rel["id"] for value in page["properties"].values()
+                if value["type"] == "relation" for rel in value.get("relation") or []]
+
+    def _is_test_name(self, name: str) -> bool:
+        # Notion 的 contains 不区分大小写，这里按原关键词再确认一次
+        return any(keyword in name for keyword in self.keywords)
+
+    def find_test_clients(self) -> List[Dict[str, Any]]:
+        """客户项目数据库中名称含测试关键词的记录"""
+        database_id = self.databases["clients"]
+        return [
+            {"kind": "notion_page", "id": page["id"], "name": self._title(page)}
+            for page in self._query_any(database_id, self._title_conditions(database_id, contains=self.keywords))
+            if self._is_test_name(self._title(page))
+        ]
+
+    def find_test_records(self, client_ids: Iterable[str] = (),
+                          names: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        项目执行记录数据库中的测试记录
+
+        Args:
+            client_ids: 关联到这些客户项目的记录也算测试记录
+            names: 名称完全匹配即删除的记录
+        """
+        database_id = self.databases["projects"]
+        client_ids = set(client_ids)
+        names = set(names)
+        conditions = self._title_conditions(database_id, contains=self.keywords, equals=names)
+        for rel_prop in self._property_names(database_id, "relation"):
+            conditions += [{"property": rel_prop, "relation": {"contains": cid}} for cid in client_ids]
+
+        records = []
+        for page in self._query_any(database_id, conditions):
+            name = self._title(page)
+            if self._is_test_name(name) or name in names or client_ids.intersection(self._relation_ids(page)):
+                records.append({"kind": "notion_page", "id": page["id"], "name": name})
+        return records
+
+    # ============ 本地扫描 ============
+
+    def find_test_folders(self) -> List[Dict[str, Any]]:
+        if not OUTPUT_DIR.exists():
+            return []
+        return [
+            {"kind": "folder", "id": str(folder), "name": folder.name}
+            for folder in sorted(OUTPUT_DIR.iterdir())
+            if folder.is_dir() and not folder.name.startswith(".") and self._is_test_name(folder.name)
+        ]
+
+    @staticmethod
+    def find_temp_files(paths: Iterable[Path] = TEMP_FILES) -> List[Dict[str, Any]]:
+        return [{"kind": "file", "id": str(p), "name": p.name} for p in paths if p.exists()]
+
+    # ============ 计划 ============
+
+    def build_plan(self, mode: str) -> Dict[str, Any]:
+        """
+        生成清理计划
+
+        Args:
+            mode: "test_data" 删除测试客户及关联到它们的执行记录；
+                  "auto" 另外按名称删除所有阶段记录（STAGE_RECORD_NAMES）
+        """
+        print("🔍 扫描客户项目数据库...")
+        clients = self.find_test_clients()
+        print("🔍 扫描项目执行记录数据库...")
+        if mode == "auto":
+            records = self.find_test_records(names=STAGE_RECORD_NAMES)
+        else:
+            records = self.find_test_records(client_ids=[c["id"] for c in clients])
+
+        plan = {
+            "id": f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}",
+            "mode": mode,
+            "created_at": time.time(),
+            "steps": [
+                {"name": STEP_RECORDS, "items": records},
+                {"name": STEP_CLIENTS, "items": clients},
+                {"name": STEP_FOLDERS, "items": self.find_test_folders()},
+                {"name": STEP_TEMP_FILES, "items": self.find_temp_files()},
+            ]
+        }
+        save_plan(plan)
+        return plan
+
+    # ============ 执行 ============
+
+    def execute(self, plan: Dict[str, Any], steps: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+        """
+        执行计划（跳过检查点中已完成的项）
+
+        Args:
+            steps: 只执行这些步骤（默认全部）
+
+        Returns:
+            {步骤: {"done": 成功数, "failed": 失败数}}
+        """
+        steps = set(steps) if steps is not None else None
+        done = load_checkpoint(plan["id"])
+        stats = {}
+        with open(_checkpoint_path(plan["id"]), "a", encoding="utf-8") as checkpoint:
+            lock = threading.Lock()
+
+            def run(item: Dict[str, Any]):
+                self._delete(item)
+                with lock:
+                    checkpoint.write(item["id"] + "\n")
+                    checkpoint.flush()
+
+            for step in plan["steps"]:
+                if steps is not None and step["name"] not in steps:
+                    continue
+                pending = [item for item in step["items"] if item["id"] not in done]
+                stats[step["name"]] = {"done": len(step["items"]) - len(pending), "failed": 0}
+                if not pending:
+                    continue
+                print(f"\n🗑️  删除{STEP_TITLES[step['name']]}（{len(pending)} 项）...")
+                workers = self.concurrency if pending[0]["kind"] == "notion_page" else 1
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = {executor.submit(run, item): item for item in pending}
+                    for future in as_completed(futures):
+                        item = futures[future]
+                        try:
+                            future.result()
+                            stats[step["name"]]["done"] += 1
+                            print(f"  ✅ 已删除: {item['name']}")
+                        except Exception as e:
+                            stats[step["name"]]["failed"] += 1
+                            print(f"  ❌ 删除出错: {item['name']} - {e}")
+        return stats
+
+    def _delete(self, item: Dict[str, Any]):
+        if item["kind"] == "notion_page":
+            try:
+                self.notion.pages.update(page_id=item["id"], archived=True)
+            except Exception as e:
+                # 已被删除（或已归档）的页面视为完成
+                if getattr(e, "code", None) != "object_not_found":
+                    raise
+        elif item["kind"] == "folder":
+            # 客户目录经清单删除，文件管理页不再显示已删除的客户
+            remove_client(item["name"])
+        elif item["kind"] == "file":
+            Path(item["id"]).unlink(missing_ok=True)
+
+
+# ============ 计划与检查点存储 ============
+
+def _plan_path(plan_id: str) -> Path:
+    return CLEANUP_DIR / f"{plan_id}.json"
+
+
+def _checkpoint_path(plan_id: str) -> Path:
+    return CLEANUP_DIR / f"{plan_id}.done"
+
+
+def save_plan(plan: Dict[str, Any]):
+    CLEANUP_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _plan_path(plan["id"]).with_suffix(".tmp")
+    tmp.write_text(json.dumps(plan, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(_plan_path(plan["id"]))
+
+
+def load_checkpoint(plan_id: str) -> set:
+    path = _checkpoint_path(plan_id)
+    if not path.exists():
+        return set()
+    return {line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()}
+
+
+def latest_unfinished_plan() -> Optional[Dict[str, Any]]:
+    """最近一个仍有未完成项的计划"""
+    if not CLEANUP_DIR.exists():
+        return None
+    for path in sorted(CLEANUP_DIR.glob("*.json"), reverse=True):
+        plan = json.loads(path.read_text(encoding="utf-8"))
+        done = load_checkpoint(plan["id"])
+        if any(item["id"] not in done for step in plan["steps"] for item in step["items"]):
+            return plan
+    return None
+
+
+def print_plan(plan: Dict[str, Any], steps: Optional[Iterable[str]] = None):
+    done = load_checkpoint(plan["id"])
+    print(f"\n📋 清理计划 {plan['id']}（{plan['mode']}）")
+    for step in plan["steps"]:
+        if steps is not None and step["name"] not in steps:
+            continue
+        pending = [item for item in step["items"] if item["id"] not in done]
+        print(f"\n{STEP_TITLES[step['name']]}: {len(pending)} 项待删除" +
+              (f"（已完成 {len(step['items']) - len(pending)} 项）" if len(pending) < len(step["items"]) else ""))
+        for item in pending:
+            print(f"  • {item['name']}")
+
+
+def print_stats(stats: Dict[str, Dict[str, int]]):
+    print("\n" + "=" * 70)
+    print("🎉 清理完成！")
+    print("=" * 70)
+    print("总计:")
+    for name, counts in stats.items():
+        line = f"  • {STEP_TITLES[name]}: {counts['done']}"
+        if counts["failed"]:
+            line += f"（失败 {counts['failed']}，可用 --resume 重试）"
+        print(line)
+    print("=" * 70)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GEO工具测试数据清理")
+    parser.add_argument("command", choices=["plan", "run"])
+    parser.add_argument("--mode", choices=["auto", "test_data"], default="test_data")
+    parser.add_argument("--resume", action="store_true", help="继续上次未完成的计划")
+    args = parser.parse_args()
+
+    engine = CleanupEngine(load_notion_config())
+    plan = latest_unfinished_plan() if args.resume else None
+    if args.resume and plan is None:
+        print("✅ 没有未完成的清理计划")
+        return
+    plan = plan or engine.build_plan(args.mode)
+    print_plan(plan)
+    if args.command == "plan":
+        print(f"\n（dry run，未删除任何数据；执行: python cleanup_engine.py run --resume）")
+        return
+    print_stats(engine.execute(plan))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+D矩阵解析器
+把 {client}_D_矩阵提取.md 中的 5 个板块一次性解析为结构化列表
+
+支持的版式（模型输出经常漂移，这里统一处理）：
+- 两列表格：| **1. 硬核实体词** | 1. 词A<br>2. 词B |
+- 多行表格：| **1. 硬核实体词** | 1 | **词A** | ... |，后续行首列留空
+- 标题 + 表格：### 1. 硬核实体词 后接 | 序号 | 实体词 | 说明 |
+- 标题 + 列表：### 1. 硬核实体词 后接 1. 词A / - 词A
+
+解析结果按文件 mtime + 内容哈希缓存，压力测试、PPT、平台文档共用一次解析。
+结构化模式下 D 阶段直接输出 JSON（{client}_D_矩阵提取.json），此时跳过 markdown 解析。
+"""
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 五个板块的键名（按 D Prompt 的输出顺序）
+SECTIONS = ["entities", "comparisons", "tags", "questions", "assertions"]
+
+SECTION_NAMES = {
+    "entities": "硬核实体词",
+    "comparisons": "对比/评价短语",
+    "tags": "原创语义标签",
+    "questions": "预测 AI 热门提问",
+    "assertions": "标准断言",
+}
+
+# 板块标签识别：去掉编号/加粗后整格匹配，允许带 "（≤60字）" 之类的后缀
+_SECTION_PATTERNS = [
+    (name, re.compile(rf"(?:{alias})(?:\s*[（(][^）)]*[）)])?\s*[:：]?"))
+    for name, alias in [
+        ("entities", r"(?:硬核)?实体词"),
+        ("comparisons", r"对比\s*/?\s*评价短语|对比短语|评价短语"),
+        ("tags", r"(?:原创)?语义标签"),
+        ("questions", r"(?:预测\s*)?AI\s*热门提问|热门提问"),
+        ("assertions", r"(?:可引用\s*)?[\"“”]?标准断言[\"“”]?"),
+    ]
+]
+
+_HEADING_RE = re.compile(r"^\s*#{1,6}\s+(.*)$")
+_BOLD_LINE_RE = re.compile(r"^\s*\*\*(.+?)\*\*\s*[:：]?\s*$")
+_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(?:\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+]|\d+[.、)）])\s+(.+)$")
+_NUMBERING_RE = re.compile(r"^\s*\d+\s*[.、)）]\s*")
+_INDEX_CELL_RE = re.compile(r"^\d+[.、]?$")
+_BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_BRACKET_RE = re.compile(r"\s*(?:\([^)]*\)|\[[^\]]*\]|（[^）]*）)")
+_QUOTES = "\"'“”‘’「」"
+
+# 结构化模式的 JSON 结构：5 个板块为字符串数组，deployment 为可选的平台建议
+D_JSON_SCHEMA = {
+    "type": "object",
+    "required": SECTIONS,
+    "properties": {
+        **{name: {"type": "array", "items": {"type": "string"}, "minItems": 1} for name in SECTIONS},
+        "deployment": {"type": "object", "additionalProperties": {"type": "array", "items": {"type": "string"}}},
+    },
+}
+
+_cache: Dict[str, Tuple[int, str, Dict[str, List[str]]]] = {}
+_cache_lock = threading.Lock()
+
+
+def _match_section(text: str) -> Optional[str]:
+    """判断一段文字是否为板块标签，返回板块键名"""
+    label = _NUMBERING_RE.sub("", text.replace("*", "").strip()).strip()
+    for name, pattern in _SECTION_PATTERNS:
+        if pattern.fullmatch(label):
+            return name
+    return None
+
+
+def _split_row(line: str) -> List[str]:
+    """拆分表格行为单元格"""
+    cells = line.strip()
+    if cells.startswith("|"):
+        cells = cells[1:]
+    if cells.endswith("|"):
+        cells = cells[:-1]
+    return [c.strip() for c in cells.split("|")]
+
+
+def _clean_item(section: str, text: str) -> str:
+    """清理单条内容：去编号、加粗、引号，实体词额外去括号注释"""
+    text = _NUMBERING_RE.sub("", text.replace("**", "")).strip()
+    if section == "entities":
+        text = _BRACKET_RE.sub("", text)
+    return text.strip().strip(_QUOTES).strip()
+
+
+def _cell_items(section: str, cell: str) -> List[str]:
+    """一个单元格可能用 <br> 堆了多条内容"""
+    return [_clean_item(section, part) for part in _BR_RE.split(cell)]
+
+
+def parse_d_matrix_text(content: str) -> Dict[str, List[str]]:
+    """
+    单遍解析 D 矩阵 markdown
+
+    Args:
+        content: D 阶段输出的 markdown 文本
+
+    Returns:
+        {板块键名: 条目列表}，键名见 SECTIONS
+    """
+    result: Dict[str, List[str]] = {name: [] for name in SECTIONS}
+    lines = content.splitlines()
+    current: Optional[str] = None
+
+    def add(section: Optional[str], items: List[str]):
+        if section is None:
+            return
+        bucket = result[section]
+        for item in items:
+            if len(item) > 1 and item not in bucket:
+                bucket.append(item)
+
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or _SEPARATOR_RE.match(stripped):
+            continue
+
+        # 标题行：命中板块则切换，否则结束当前板块
+        heading = _HEADING_RE.match(stripped)
+        if heading:
+            current = _match_section(heading.group(1))
+            continue
+
+        if stripped.startswith("|"):
+            cells = _split_row(stripped)
+            is_header = i + 1 < len(lines) and _SEPARATOR_RE.match(lines[i + 1].strip())
+
+            if is_header:
+                # | 序号 | 硬核实体词 | 说明 | 这类表头也能定位板块
+                for cell in cells:
+                    section = _match_section(cell)
+                    if section:
+                        current = section
+                        break
+                continue
+
+            first = cells[0] if cells else ""
+            section = _match_section(first) if first else None
+            if section:
+                current = section
+                cells = cells[1:]
+            elif first.startswith("**") and not _INDEX_CELL_RE.match(first.strip("* ")):
+                # 首列是其他加粗标签（如平台部署建议），当前板块结束
+                current = None
+                continue
+
+            # 数据行：跳过序号列，取第一个有内容的单元格
+            for cell in cells:
+                if not cell or _INDEX_CELL_RE.match(cell.strip("* ")):
+                    continue
+                add(current, _cell_items(current, cell) if current else [])
+                break
+            continue
+
+        bold = _BOLD_LINE_RE.match(stripped)
+        if bold:
+            section = _match_section(bold.group(1))
+            if section:
+                current = section
+            continue
+
+        item = _LIST_ITEM_RE.match(stripped)
+        if item and current:
+            add(current, [_clean_item(current, item.group(1))])
+
+    return result
+
+
+def parse_d_matrix(file_path) -> Dict[str, List[str]]:
+    """
+    解析 D 矩阵文件（按 mtime + 内容哈希缓存）
+
+    Args:
+        file_path: D 矩阵 markdown 文件路径
+
+    Returns:
+        {板块键名: 条目列表}
+    """
+    path = Path(file_path).resolve()
+    key = str(path)
+    mtime = path.stat().st_mtime_ns
+
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and cached[0] == mtime:
+        return {k: list(v) for k, v in cached[2].items()}
+
+    raw = path.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    if cached and cached[1] == digest:
+        parsed = cached[2]
+    else:
+        parsed = parse_d_matrix_text(raw.decode("utf-8"))
+
+    with _cache_lock:
+        _cache[key] = (mtime, digest, parsed)
+    return {k: list(v) for k, v in parsed.items()}
+
+
+def validate_d_json(data: Any) -> Dict[str, Any]:
+    """
+    按 D_JSON_SCHEMA 校验结构化输出
+
+    Args:
+        data: json.loads 后的对象
+
+    Returns:
+        规范化后的字典（条目去空白、去重）
+
+    Raises:
+        ValueError: 结构不符合要求，错误信息可直接回传给模型做修复
+    """
+    if not isinstance(data, dict):
+        raise ValueError("顶层必须是 JSON 对象")
+
+    missing = [name for name in SECTIONS if name not in data]
+    if missing:
+        raise ValueError(f"缺少字段: {', '.join(missing)}")
+
+    result: Dict[str, Any] = {}
+    for name in SECTIONS:
+        items = data[name]
+        if not isinstance(items, list) or not all(isinstance(x, str) for x in items):
+            raise ValueError(f"字段 {name} 必须是字符串数组")
+        cleaned = []
+        for item in items:
+            item = _clean_item(name, item)
+            if item and item not in cleaned:
+                cleaned.append(item)
+        if not cleaned:
+            raise ValueError(f"字段 {name} 不能为空")
+        result[name] = cleaned
+
+    deployment = data.get("deployment") or {}
+    if not isinstance(deployment, dict) or not all(
+        isinstance(v, list) and all(isinstance(x, str) for x in v) for v in deployment.values()
+    ):
+        raise ValueError("字段 deployment 必须是 {平台: 字符串数组}")
+    result["deployment"] = deployment
+    return result
+
+
+def render_d_markdown(data: Dict[str, Any]) -> str:
+    """把结构化 D 结果渲染为与普通模式一致的 markdown（供 PPT/交付文档使用）"""
+    lines = ["# D - 语义矩阵提取", "", "| 板块 | 内容 |", "|---|---|"]
+    for index, name in enumerate(SECTIONS, 1):
+        cell = "<br>".join(f"{i}. {item}" for i, item in enumerate(data[name], 1))
+        lines.append(f"| **{index}. {SECTION_NAMES[name]}** | {cell} |")
+
+    deployment = data.get("deployment") or {}
+    if deployment:
+        lines += ["", "## 平台部署建议", ""]
+        for platform, tips in deployment.items():
+            lines.append(f"### {platform}")
+            lines += [f"- {tip}" for tip in tips]
+            lines.append("")
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def d_matrix_path(client_folder: str, client_name: str) -> Path:
+    """D 矩阵文件的标准路径"""
+    return Path(client_folder) / f"{client_name}_D_矩阵提取.md"
+
+
+def d_json_path(client_folder: str, client_name: str) -> Path:
+    """结构化模式下 D 结果 JSON 的路径（与 markdown 同目录）"""
+    return Path(client_folder) / f"{client_name}_D_矩阵提取.json"
+
+
+def load_d_matrix(client_folder: str, client_name: str) -> Dict[str, List[str]]:
+    """按客户目录加载 D 矩阵结果，优先使用结构化 JSON（比 markdown 旧时视为过期，改读 markdown）"""
+    json_file = d_json_path(client_folder, client_name)
+    d_matrix_file = d_matrix_path(client_folder, client_name)
+    if json_file.exists() and (not d_matrix_file.exists()
+                               or json_file.stat().st_mtime >= d_matrix_file.stat().st_mtime):
+        try:
+            with open(json_file, "r", encoding="utf-8") as f:
+                data = validate_d_json(json.load(f))
+            return {name: data[name] for name in SECTIONS}
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"⚠️ D矩阵 JSON 无效，改为解析 markdown: {e}")
+
+    if not d_matrix_file.exists():
+        raise FileNotFoundError(f"D矩阵文件不存在: {d_matrix_file}")
+    return parse_d_matrix(d_matrix_file)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        print(json.dumps(parse_d_matrix(sys.argv[1]), ensure_ascii=False, indent=2))
+    else:
+        print("Usage: python d_matrix_parser.py <D矩阵文件.md>")
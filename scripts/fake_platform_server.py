@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+"""
+本地模拟飞书 / Notion API（压测与联调用）
+实现本项目用到的接口子集：tenant_access_token、多维表格记录、docx 文档块、云空间文件夹与上传、
+IM 消息、自定义机器人 webhook，以及 Notion pages / databases / blocks。
+数据保存在内存中，可配置延迟、错误率与限流（超限返回 429 与各平台的限流错误体）。
+
+用法：
+    python fake_platform_server.py --port 8765 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+    GEO_FEISHU_API_BASE=http://127.0.0.1:8765 GEO_NOTION_API_BASE=http://127.0.0.1:8765 python ...
+
+    # 进程内启动
+    server = FakePlatformServer(FakeServerConfig(latency_ms=50)).start()
+    server.base_url        # http://127.0.0.1:<port>
+    server.stop()
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+UPLOAD_BLOCK_SIZE = 4 * 1024 * 1024   # upload_prepare 返回的分片大小
+LIST_PAGE_SIZE = 100                  # 未指定 page_size 时的默认页大小
+
+_PARAM_RE = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+
+
+class FakeServerConfig:
+    """
+    模拟服务配置
+
+    Args:
+        latency_ms: 每个请求的基础延迟
+        jitter_ms: 在基础延迟上叠加 0~jitter_ms 的随机延迟
+        error_rate: 返回 5xx 的概率（不含获取 token）
+        feishu_rps / notion_rps: 每秒请求上限（0 表示不限）
+        webhook_per_minute: 自定义机器人每分钟消息上限
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 feishu_rps: float = 0, notion_rps: float = 3, webhook_per_minute: int = 100,
+                 seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.feishu_rps = feishu_rps
+        self.notion_rps = notion_rps
+        self.webhook_per_minute = webhook_per_minute
+        self.random = random.Random(seed)
+
+
+class _RateWindow:
+    """固定窗口计数限流"""
+
+    def __init__(self, limit: float, period: float):
+        self.limit = limit
+        self.period = period
+        self._window_start = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if not self.limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.period:
+                self._window_start = now
+                self._count = 0
+            if self._count >= self.limit:
+                return False
+            self._count += 1
+            return True
+
+    def retry_after(self) -> float:
+        return max(0.0, self.period - (time.monotonic() - self._window_start))
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _new_id(prefix: str = "") -> str:
+    return prefix + uuid.uuid4().hex[:20]
+
+
+class FakePlatformState:
+    """内存数据"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bitable: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)   # table_id -> record_id -> record
+        self.documents: Dict[str, int] = defaultdict(int)                      # document_id -> 块数
+        self.files: Dict[str, List[Dict[str, Any]]] = defaultdict(list)        # folder_token -> 文件
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.webhook_messages = 0
+        self.notion_pages: Dict[str, Dict[str, Any]] = {}
+        self.notion_blocks: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.client_tokens: Dict[Tuple[str, str], Tuple[int, Dict[str, Any]]] = {}   # 飞书 client_token 幂等
+
+
+# ============ 请求处理 ============
+
+Route = Tuple[str, "re.Pattern", str, str, Callable]   # (方法, 路径正则, 统计名, 平台, 处理函数)
+
+
+class FakePlatformHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # 保持长连接，与真实平台一致地复用连接池
+    server: "FakePlatformServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def _dispatch(self, method: str):
+        start = time.perf_counter()
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+
+        if parts.path == "/__stats":
+            self._send(200, self.server.stats())
+            return
+
+        for route_method, pattern, name, platform, handler in self.server.routes:
+            match = pattern.fullmatch(parts.path)
+            if route_method != method or not match:
+                continue
+            status, body, headers = self.server.handle(platform, handler, match.groupdict(), query, raw,
+                                                       self.headers.get("Content-Type", ""))
+            self._send(status, body, headers)
+            self.server.record(name, status, (time.perf_counter() - start) * 1000)
+            return
+
+        self._send(404, {"code": 404, "msg": f"fake server: no route for {method} {parts.path}"})
+        self.server.record(f"{method} <unknown>", 404, (time.perf_counter() - start) * 1000)
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def _ok(data: Any = None) -> Tuple[int, Dict[str, Any]]:
+    return 200, {"code": 0, "msg": "success", "data": data if data is not None else {}}
+
+
+class FakePlatformServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: Optional[FakeServerConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), FakePlatformHandler)
+        self.config = config or FakeServerConfig()
+        self.state = FakePlatformState()
+        self.limits = {
+            "feishu": _RateWindow(self.config.feishu_rps, 1.0),
+            "notion": _RateWindow(self.config.notion_rps, 1.0),
+            "webhook": _RateWindow(self.config.webhook_per_minute, 60.0),
+        }
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.routes: List[Route] = self._build_routes()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakePlatformServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-platform", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    # ============ 统计 ============
+
+    def record(self, name: str, status: int, elapsed_ms: float):
+        with self._stats_lock:
+            stat = self._stats.setdefault(name, {"count": 0, "statuses": defaultdict(int), "total_ms": 0.0})
+            stat["count"] += 1
+            stat["statuses"][status] += 1
+            stat["total_ms"] += elapsed_ms
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """{路由: {"count", "statuses", "avg_ms"}}"""
+        with self._stats_lock:
+            return {
+                name: {"count": s["count"], "statuses": dict(s["statuses"]), "avg_ms": round(s["total_ms"] / s["count"], 1)}
+                for name, s in self._stats.items()
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    # ============ 延迟 / 错误 / 限流 ============
+
+    def handle(self, platform: str, handler: Callable, params: Dict[str, str], query: Dict[str, str],
+               raw: bytes, content_type: str) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        limit = self.limits.get(platform)
+        if limit and not limit.allow():
+            return self._rate_limited(platform, limit.retry_after())
+
+        cfg = self.config
+        delay = cfg.latency_ms + (cfg.random.uniform(0, cfg.jitter_ms) if cfg.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+        if platform != "auth" and cfg.error_rate and cfg.random.random() < cfg.error_rate:
+            if platform == "notion":
+                return 500, {"object": "error", "status": 500, "code": "internal_server_error",
+                             "message": "fake server: injected error"}, {}
+            return 500, {"code": 1254000, "msg": "fake server: injected error"}, {}
+
+        body: Any = {}
+        if raw and content_type.startswith("application/json"):
+            body = json.loads(raw)
+        # 带 client_token 的飞书写请求：同一 token 重复提交时返回首次成功的结果，不重复写入
+        token_key = (handler.__name__, query["client_token"]) if query.get("client_token") else None
+        if token_key:
+            with self.state.lock:
+                cached = self.state.client_tokens.get(token_key)
+            if cached:
+                return cached[0], cached[1], {}
+        status, result = handler(params, query, body, raw)
+        if token_key and status == 200 and result.get("code") == 0:
+            with self.state.lock:
+                self.state.client_tokens[token_key] = (status, result)
+        return status, result, {}
+
+    @staticmethod
+    def _rate_limited(platform: str, retry_after: float) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        headers = {"Retry-After": str(max(1, round(retry_after)))}
+        if platform == "notion":
+            return 429, {"object": "error", "status": 429, "code": "rate_limited",
+                         "message": "You have been rate limited."}, headers
+        if platform == "webhook":
+            return 200, {"code": 9499, "msg": "too many request"}, {}
+        headers["x-ogw-ratelimit-reset"] = headers["Retry-After"]
+        return 429, {"code": 99991400, "msg": "request trigger frequency limit"}, headers
+
+    # ============ 路由 ============
+
+    def _build_routes(self) -> List[Route]:
+        bitable = r"/open-apis/bitable/v1/apps/(?P<app>[^/]+)/tables/(?P<table>[^/]+)/records"
+        spec = [
+            ("POST", r"/open-apis/auth/v3/tenant_access_token/internal", "auth", self._tenant_token),
+            ("POST", bitable, "feishu", self._bitable_create),
+            ("GET", bitable, "feishu", self._bitable_list),
+            ("POST", bitable + r"/batch_create", "feishu", self._bitable_batch_create),
+            ("POST", bitable + r"/batch_update", "feishu", self._bitable_batch_update),
+            ("POST", bitable + r"/search", "feishu", self._bitable_search),
+            ("GET", bitable + r"/(?P<record>[^/]+)", "feishu", self._bitable_get),
+            ("PUT", bitable + r"/(?P<record>[^/]+)", "feishu", self._bitable_update),
+            ("POST", r"/open-apis/docx/v1/documents", "feishu", self._docx_create),
+            ("POST", r"/open-apis/docx/v1/documents/(?P<doc>[^/]+)/blocks/(?P<block>[^/]+)/descendant", "feishu",
+             self._docx_descendant),
+            ("POST", r"/open-apis/drive/v1/permissions/(?P<doc>[^/]+)/members", "feishu", lambda *a: _ok()),
+            ("POST", r"/open-apis/drive/v1/files/create_folder", "feishu", self._drive_create_folder),
+            ("GET", r"/open-apis/drive/v1/files", "feishu", self._drive_list),
+            ("POST", r"/open-apis/drive/v1/files/upload_all", "feishu", self._drive_upload_all),
+            ("POST", r"/open-apis/drive/v1/files/upload_prepare", "feishu", self._drive_upload_prepare),
+            ("POST", r"/open-apis/drive/v1/files/upload_part", "feishu", lambda *a: _ok()),
+            ("POST", r"/open-apis/drive/v1/files/upload_finish", "feishu", self._drive_upload_finish),
+            ("POST", r"/open-apis/im/v1/messages", "feishu", self._im_send),
+            ("PATCH", r"/open-apis/im/v1/messages/(?P<message>[^/]+)", "feishu", self._im_update),
+            ("POST", r"/open-apis/bot/v2/hook/(?P<hook>[^/]+)", "webhook", self._webhook),
+            ("POST", r"/v1/pages", "notion", self._notion_page_create),
+            ("GET", r"/v1/pages/(?P<page>[^/]+)", "notion", self._notion_page_get),
+            ("PATCH", r"/v1/pages/(?P<page>[^/]+)", "notion", self._notion_page_update),
+            ("GET", r"/v1/databases/(?P<db>[^/]+)", "notion", self._notion_db_get),
+            ("POST", r"/v1/databases/(?P<db>[^/]+)/query", "notion", self._notion_db_query),
+            ("PATCH", r"/v1/blocks/(?P<block>[^/]+)/children", "notion", self._notion_blocks_append),
+            ("GET", r"/v1/blocks/(?P<block>[^/]+)/children", "notion", self._notion_blocks_list),
+        ]
+        # 统计名把路径参数显示为 :name
+        return [(method, re.compile(path), method + " " + _PARAM_RE.sub(r":\1", path), platform, handler)
+                for method, path, platform, handler in spec]
+
+    # ============ 飞书 ============
+
+    @staticmethod
+    def _tenant_token(params, query, body, raw):
+        return 200, {"code": 0, "msg": "ok", "tenant_access_token": f"t-fake-{body.get('app_id', '')}", "expire": 7200}
+
+    def _put_record(self, table: str, fields: Dict[str, Any], record_id: Optional[str] = None) -> Dict[str, Any]:
+        with self.state.lock:
+            records = self.state.bitable[table]
+            record_id = record_id or _new_id("rec")
+            record = records.setdefault(record_id, {"record_id": record_id, "fields": {}})
+            record["fields"].update(fields)
+            record["last_modified_time"] = int(time.time() * 1000)
+            return {"record_id": record_id, "fields": dict(record["fields"])}
+
+    def _bitable_create(self, params, query, body, raw):
+        return _ok({"record": self._put_record(params["table"], body.get("fields", {}))})
+
+    def _bitable_update(self, params, query, body, raw):
+        if params["record"] not in self.state.bitable[params["table"]]:
+            return 200, {"code": 1254043, "msg": "RecordIdNotFound"}
+        return _ok({"record": self._put_record(params["table"], body.get("fields", {}), params["record"])})
+
+    def _bitable_get(self, params, query, body, raw):
+        record = self.state.bitable[params["table"]].get(params["record"])
+        if record is None:
+            return 200, {"code": 1254043, "msg": "RecordIdNotFound"}
+        return _ok({"record": {"record_id": record["record_id"], "fields": record["fields"]}})
+
+    def _bitable_batch_create(self, params, query, body, raw):
+        records = [self._put_record(params["table"], r.get("fields", {})) for r in body.get("records", [])]
+        return _ok({"records": records})
+
+    def _bitable_batch_update(self, params, query, body, raw):
+        records = [self._put_record(params["table"], r.get("fields", {}), r["record_id"]) for r in body.get("records", [])]
+        return _ok({"records": records})
+
+    def _page(self, items: List[Any], token: Optional[str], page_size: Any) -> Tuple[List[Any], Dict[str, Any]]:
+        start = int(token or 0)
+        size = int(page_size or LIST_PAGE_SIZE)
+        end = start + size
+        return items[start:end], {"has_more": end < len(items), "page_token": str(end) if end < len(items) else None}
+
+    def _bitable_list(self, params, query, body, raw):
+        with self.state.lock:
+            records = list(self.state.bitable[params["table"]].values())
+        match = re.match(r"CurrentValue\.\[(.+?)\]='(.*)'", query.get("filter", ""))
+        if match:
+            records = [r for r in records if r["fields"].get(match.group(1)) == match.group(2)]
+        items, paging = self._page(records, query.get("page_token"), query.get("page_size"))
+        field_names = json.loads(query["field_names"]) if query.get("field_names") else None
+        items = [{"record_id": r["record_id"],
+                  "fields": {k: v for k, v in r["fields"].items() if not field_names or k in field_names}}
+                 for r in items]
+        return _ok({"items": items, "total": len(records), **paging})
+
+    def _bitable_search(self, params, query, body, raw):
+        with self.state.lock:
+            records = list(self.state.bitable[params["table"]].values())
+        items, paging = self._page(records, query.get("page_token"), query.get("page_size"))
+        items = [{"record_id": r["record_id"], "fields": r["fields"],
+                  **({"last_modified_time": r["last_modified_time"]} if body.get("automatic_fields") else {})}
+                 for r in items]
+        return _ok({"items": items, "total": len(records), **paging})
+
+    def _docx_create(self, params, query, body, raw):
+        doc_id = _new_id("dox")
+        with self.state.lock:
+            self.state.documents[doc_id] = 1
+        return _ok({"document": {"document_id": doc_id, "revision_id": 1, "title": body.get("title", "")}})
+
+    def _docx_descendant(self, params, query, body, raw):
+        with self.state.lock:
+            if params["doc"] not in self.state.documents:
+                return 200, {"code": 1770002, "msg": "not found"}
+            self.state.documents[params["doc"]] += len(body.get("descendants", []))
+        children = [{"block_id": _new_id("blk")} for _ in body.get("children_id", [])]
+        return _ok({"children": children, "document_revision_id": self.state.documents[params["doc"]]})
+
+    def _drive_create_folder(self, params, query, body, raw):
+        token = _new_id("fld")
+        return _ok({"token": token, "url": f"https://fake.feishu.cn/drive/folder/{token}"})
+
+    def _drive_list(self, params, query, body, raw):
+        with self.state.lock:
+            files = list(self.state.files.get(query.get("folder_token", ""), []))
+        items, paging = self._page(files, query.get("page_token"), query.get("page_size"))
+        return _ok({"files": items, "has_more": paging["has_more"], "next_page_token": paging["page_token"]})
+
+    def _add_file(self, folder: str, name: str) -> str:
+        token = _new_id("box")
+        with self.state.lock:
+            self.state.files[folder].append({"token": token, "name": name, "type": "file"})
+        return token
+
+    def _drive_upload_all(self, params, query, body, raw):
+        folder = re.search(rb'name="parent_node"\r\n\r\n([^\r]*)', raw)
+        name = re.search(rb'name="file_name"\r\n\r\n([^\r]*)', raw)
+        token = self._add_file(folder.group(1).decode() if folder else "",
+                               name.group(1).decode("utf-8", "replace") if name else "file")
+        return _ok({"file_token": token})
+
+    def _drive_upload_prepare(self, params, query, body, raw):
+        upload_id = _new_id("upl")
+        size = int(body.get("size", 0))
+        with self.state.lock:
+            self.state.uploads[upload_id] = {"folder": body.get("parent_node", ""), "name": body.get("file_name", "")}
+        return _ok({"upload_id": upload_id, "block_size": UPLOAD_BLOCK_SIZE,
+                    "block_num": max(1, -(-size // UPLOAD_BLOCK_SIZE))})
+
+    def _drive_upload_finish(self, params, query, body, raw):
+        with self.state.lock:
+            upload = self.state.uploads.pop(body.get("upload_id"), None)
+        if upload is None:
+            return 200, {"code": 1061002, "msg": "params error: upload_id"}
+        return _ok({"file_token": self._add_file(upload["folder"], upload["name"])})
+
+    def _im_send(self, params, query, body, raw):
+        message_id = _new_id("om_")
+        with self.state.lock:
+            self.state.messages[message_id] = {"chat_id": body.get("receive_id"), "content": body.get("content")}
+        return _ok({"message_id": message_id})
+
+    def _im_update(self, params, query, body, raw):
+        with self.state.lock:
+            if params["message"] not in self.state.messages:
+                return 200, {"code": 230001, "msg": "message not found"}
+            self.state.messages[params["message"]]["content"] = body.get("content")
+        return _ok()
+
+    def _webhook(self, params, query, body, raw):
+        with self.state.lock:
+            self.state.webhook_messages += 1
+        return 200, {"code": 0, "msg": "success", "data": {}}
+
+    # ============ Notion ============
+
+    @staticmethod
+    def _notion_properties(properties: Dict[str, Any]) -> Dict[str, Any]:
+        """补全请求体中省略的 type / id / plain_text，与读取接口返回格式一致"""
+        result = {}
+        for name, value in properties.items():
+            prop_type = next((k for k in value if k not in ("id", "type")), "rich_text")
+            content = value[prop_type]
+            if prop_type in ("title", "rich_text"):
+                content = [{**t, "type": "text", "plain_text": t.get("text", {}).get("content", "")} for t in content]
+            result[name] = {"id": _new_id()[:4], "type": prop_type, prop_type: content}
+        return result
+
+    def _notion_page_create(self, params, query, body, raw):
+        page_id = str(uuid.uuid4())
+        now = _now_iso()
+        page = {
+            "object": "page", "id": page_id, "created_time": now, "last_edited_time": now, "archived": False,
+            "parent": body.get("parent", {}),
+            "properties": self._notion_properties(body.get("properties", {})),
+            "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+        }
+        with self.state.lock:
+            self.state.notion_pages[page_id] = page
+        if body.get("children"):
+            self._append_children(page_id, body["children"])
+        return 200, page
+
+    def _notion_page_get(self, params, query, body, raw):
+        page = self.state.notion_pages.get(params["page"])
+        if page is None:
+            return self._notion_not_found(params["page"])
+        return 200, page
+
+    def _notion_page_update(self, params, query, body, raw):
+        with self.state.lock:
+            page = self.state.notion_pages.get(params["page"])
+            if page is None:
+                return self._notion_not_found(params["page"])
+            page["properties"].update(self._notion_properties(body.get("properties", {})))
+            if "archived" in body:
+                page["archived"] = body["archived"]
+            page["last_edited_time"] = _now_iso()
+            return 200, page
+
+    @staticmethod
+    def _notion_not_found(object_id: str):
+        return 404, {"object": "error", "status": 404, "code": "object_not_found",
+                     "message": f"Could not find page with ID: {object_id}."}
+
+    def _notion_db_pages(self, db_id: str) -> List[Dict[str, Any]]:
+        with self.state.lock:
+            return [p for p in self.state.notion_pages.values()
+                    if p["parent"].get("database_id") == db_id and not p["archived"]]
+
+    def _notion_db_get(self, params, query, body, raw):
+        properties = {}
+        for page in self._notion_db_pages(params["db"]):
+            for name, value in page["properties"].items():
+                properties.setdefault(name, {"id": value["id"], "name": name, "type": value["type"], value["type"]: {}})
+        return 200, {"object": "database", "id": params["db"], "properties": properties}
+
+    def _notion_db_query(self, params, query, body, raw):
+        pages = sorted(self._notion_db_pages(params["db"]), key=lambda p: p["created_time"], reverse=True)
+        query_filter = body.get("filter")
+        if query_filter:
+            pages = [p for p in pages if self._notion_match(p, query_filter)]
+        start = int(body.get("start_cursor") or 0)
+        end = start + int(body.get("page_size") or LIST_PAGE_SIZE)
+        results = pages[start:end]
+        if body.get("filter_properties"):
+            keep = set(body["filter_properties"])
+            results = [{**p, "properties": {k: v for k, v in p["properties"].items() if k in keep}} for p in results]
+        return 200, {"object": "list", "results": results, "has_more": end < len(pages),
+                     "next_cursor": str(end) if end < len(pages) else None}
+
+    def _notion_match(self, page: Dict[str, Any], query_filter: Dict[str, Any]) -> bool:
+        """支持 or/and、last_edited_time after、select equals、title contains/equals、relation contains"""
+        if "or" in query_filter:
+            return any(self._notion_match(page, f) for f in query_filter["or"])
+        if "and" in query_filter:
+            return all(self._notion_match(page, f) for f in query_filter["and"])
+        if query_filter.get("timestamp") == "last_edited_time":
+            after = query_filter["last_edited_time"].get("after")
+            return not after or page["last_edited_time"] > after.replace("+00:00", "Z")
+        prop = page["properties"].get(query_filter.get("property"))
+        if prop is None:
+            return False
+        if "select" in query_filter:
+            return (prop.get("select") or {}).get("name") == query_filter["select"].get("equals")
+        if "title" in query_filter or "rich_text" in query_filter:
+            condition = query_filter.get("title") or query_filter.get("rich_text")
+            text = "".join(t["plain_text"] for t in prop.get(prop["type"], []))
+            if "equals" in condition:
+                return text == condition["equals"]
+            return condition.get("contains", "").lower() in text.lower()
+        if "relation" in query_filter:
+            return any(r["id"] == query_filter["relation"].get("contains") for r in prop.get("relation", []))
+        return True
+
+    def _append_children(self, parent_id: str, children: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        created = []
+        with self.state.lock:
+            for child in children:
+                block = {"object": "block", "id": str(uuid.uuid4()), "has_children": False, **child}
+                content = block.get(block.get("type"))
+                nested = content.pop("children", None) if isinstance(content, dict) else None
+                self.state.notion_blocks[parent_id].append(block)
+                created.append((block, nested))
+        for block, nested in created:
+            if nested:
+                block["has_children"] = True
+                self._append_children(block["id"], nested)
+        return [block for block, _ in created]
+
+    def _notion_blocks_append(self, params, query, body, raw):
+        return 200, {"object": "list", "results": self._append_children(params["block"], body.get("children", [])),
+                     "has_more": False, "next_cursor": None}
+
+    def _notion_blocks_list(self, params, query, body, raw):
+        with self.state.lock:
+            blocks = list(self.state.notion_blocks.get(params["block"], []))
+        start = int(query.get("start_cursor") or 0)
+        end = start + int(query.get("page_size") or LIST_PAGE_SIZE)
+        return 200, {"object": "list", "results": blocks[start:end], "has_more": end < len(blocks),
+                     "next_cursor": str(end) if end < len(blocks) else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟飞书 / Notion API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--feishu-rps", type=float, default=0, help="飞书接口每秒请求上限（0 不限）")
+    parser.add_argument("--notion-rps", type=float, default=3, help="Notion 每秒请求上限（0 不限）")
+    parser.add_argument("--webhook-per-minute", type=int, default=100)
+    args = parser.parse_args()
+
+    config = FakeServerConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                              args.feishu_rps, args.notion_rps, args.webhook_per_minute)
+    server = FakePlatformServer(config, args.host, args.port)
+    print(f"🧪 模拟平台服务已启动: {server.base_url}")
+    print(f"   export GEO_FEISHU_API_BASE={server.base_url} GEO_NOTION_API_BASE={server.base_url}")
+    print(f"   统计: {server.base_url}/__stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
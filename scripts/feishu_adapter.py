@@ -3,58 +3,84 @@
 飞书平台适配器实现
 实现ProjectManager、DocumentGenerator、Notifier、FileManager接口
 """
-import requests
+import atexit
+import hashlib
 import json
+import threading
 import time
-from typing import Dict, List, Optional, Any
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Any, Union
 from datetime import datetime
 from pathlib import Path
 
+from feishu_token import get_token_manager
+from http_session import get_session
+from platform_outbox import client_token, load_checkpoint, save_checkpoint
 from platform_adapter import (
     ProjectManager, DocumentGenerator, Notifier, FileManager,
-    ProjectStatus, StageStatus
+    ProjectStatus, StageStatus, DOCUMENT_SECTIONS, iter_pages
 )
+from markdown_blocks import load_markdown, parse_markdown_cached, render, feishu_batches
+from notification_aggregator import (
+    NotificationAggregator, render_progress_card, DEFAULT_WINDOW, DEFAULT_RATE_PER_MINUTE
+)
+
+
+# 多维表格 batch_create / batch_update 单次请求的记录上限
+BITABLE_BATCH_LIMIT = 500
+
+# 列表接口单页条数上限
+BITABLE_PAGE_SIZE = 500
+DRIVE_PAGE_SIZE = 200
+
+# 共享连接池（默认带超时与 5xx/429 重试）
+http = get_session("feishu")
+UPLOAD_TIMEOUT = (5, 300)  # 上传大文件时放宽读取超时
+
+# 分片上传：超过 UPLOAD_ALL_LIMIT 的文件走 upload_prepare/part/finish
+UPLOAD_ALL_LIMIT = 4 * 1024 * 1024
+UPLOAD_CONCURRENCY = 4       # 单个文件并行上传的分片数
+UPLOAD_PART_RETRIES = 3
+UPLOAD_STATE_DIR = Path(__file__).parent.parent / "output" / ".uploads"  # 断点续传进度
+UPLOAD_ID_EXPIRED_CODES = {1061021}  # upload_id 过期/失效，只有这种错误需要丢弃续传进度
+
+
+class UploadIdExpired(Exception):
+    """飞书拒绝了保存的 upload_id，需要重新 prepare"""
+
+
+def _idempotency_params(*parts: Any) -> Dict[str, str]:
+    """经发件箱投递时带上 client_token：事件重试时同一个创建请求不会在飞书重复写入"""
+    token = client_token(*parts)
+    return {"client_token": token} if token else {}
 
 
 class FeishuClient:
-    """飞书API客户端基类"""
+    """飞书API客户端基类（同一 app_id 的所有客户端共享 tenant_access_token）"""
 
     def __init__(self, app_id: str, app_secret: str):
         self.app_id = app_id
         self.app_secret = app_secret
-        self.access_token: Optional[str] = None
-        self.token_expires_at: float = 0
+        self.token_manager = get_token_manager(app_id, app_secret)
 
     def get_access_token(self) -> str:
         """获取tenant_access_token"""
-        # 检查token是否过期
-        if self.access_token and time.time() < self.token_expires_at:
-            return self.access_token
+        return self.token_manager.get_token()
 
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-        payload = {
-            "app_id": self.app_id,
-            "app_secret": self.app_secret
-        }
-
-        response = requests.post(url, json=payload)
-        result = response.json()
-
-        if result.get("code") == 0:
-            self.access_token = result["tenant_access_token"]
-            # 提前5分钟过期
-            self.token_expires_at = time.time() + result.get("expire", 7200) - 300
-            return self.access_token
-        else:
-            raise Exception(f"获取access_token失败: {result}")
-
-    def _get_headers(self) -> Dict[str, str]:
+    def _get_headers(self, token: Optional[str] = None) -> Dict[str, str]:
         """获取请求头"""
         return {
-            "Authorization": f"Bearer {self.get_access_token()}",
+            "Authorization": f"Bearer {token or self.get_access_token()}",
             "Content-Type": "application/json; charset=utf-8"
         }
 
+    def _request(self, method: str, url: str, **kwargs):
+        """发送带鉴权的请求（token 被服务端判定失效时刷新后重试一次）"""
+        return self.token_manager.request(
+            lambda token: http.request(method, url, headers=self._get_headers(token), **kwargs)
+        )
+
 
 # ============ 飞书ProjectManager实现 ============
 
@@ -68,6 +94,8 @@ class FeishuProjectManager(ProjectManager, FeishuClient):
         self.projects_table_id = config["bitable"]["tables"]["projects"]
         self.pressure_tests_table_id = config["bitable"]["tables"]["pressure_tests"]
         self.feedback_table_id = config["bitable"]["tables"]["feedback"]
+        # 「最后更新时间」字段名（可选），用于本地镜像的服务端增量过滤
+        self.modified_field = config["bitable"].get("modified_field")
 
     def create_project(self, project_data: Dict[str, Any]) -> str:
         """创建项目记录"""
@@ -85,7 +113,8 @@ class FeishuProjectManager(ProjectManager, FeishuClient):
 
         payload = {"fields": fields}
 
-        response = requests.post(url, headers=self._get_headers(), json=payload)
+        response = self._request("POST", url,
+                                 params=_idempotency_params(self.projects_table_id, "project"), json=payload)
         result = response.json()
 
         if result.get("code") == 0:
@@ -105,7 +134,7 @@ class FeishuProjectManager(ProjectManager, FeishuClient):
             }
         }
 
-        response = requests.put(url, headers=self._get_headers(), json=payload)
+        response = self._request("PUT", url, json=payload)
         result = response.json()
 
         if result.get("code") == 0:
@@ -115,10 +144,8 @@ class FeishuProjectManager(ProjectManager, FeishuClient):
             print(f"❌ 更新项目状态失败: {result}")
             return False
 
-    def add_stage_record(self, stage_data: Dict[str, Any]) -> str:
-        """添加阶段执行记录"""
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.projects_table_id}/records"
-
+    def _stage_fields(self, stage_data: Dict[str, Any]) -> Dict[str, Any]:
+        """阶段数据 -> 飞书记录字段"""
         fields = {
             "项目ID": stage_data.get("project_id", ""),
             "执行阶段": stage_data.get("stage", ""),
@@ -131,11 +158,88 @@ class FeishuProjectManager(ProjectManager, FeishuClient):
         }
 
         # 移除None值
-        fields = {k: v for k, v in fields.items() if v is not None}
+        return {k: v for k, v in fields.items() if v is not None}
 
-        payload = {"fields": fields}
+    def _pressure_test_fields(self, test_data: Dict[str, Any]) -> Dict[str, Any]:
+        """压力测试数据 -> 飞书记录字段"""
+        return {
+            "项目ID": test_data.get("project_id", ""),
+            "测试时间": int(test_data.get("test_time", time.time()) * 1000),
+            "测试引擎": test_data.get("engines", []),
+            "关键词数量": test_data.get("keyword_count", 0),
+            "平均得分": test_data.get("avg_score", 0),
+            "提及率": test_data.get("mention_rate", 0),
+            "趋势": test_data.get("trend", "→")
+        }
+
+    def batch_create_records(self, table_id: str, fields_list: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量创建记录（按 BITABLE_BATCH_LIMIT 自动分片，每片一次请求）
+
+        Args:
+            table_id: 数据表ID
+            fields_list: 每条记录的字段
+
+        Returns:
+            record_id 列表，顺序与 fields_list 一致
+        """
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{table_id}/records/batch_create"
+        record_ids = []
+        for start in range(0, len(fields_list), BITABLE_BATCH_LIMIT):
+            chunk = fields_list[start:start + BITABLE_BATCH_LIMIT]
+            payload = {"records": [{"fields": fields} for fields in chunk]}
+
+            response = self._request("POST", url,
+                                     params=_idempotency_params(table_id, "batch", start), json=payload)
+            result = response.json()
+
+            if result.get("code") != 0:
+                raise Exception(f"批量创建记录失败: {result}")
+            record_ids.extend(r["record_id"] for r in result["data"]["records"])
+        return record_ids
+
+    def batch_update_records(self, table_id: str, updates: List[Dict[str, Any]]) -> bool:
+        """
+        批量更新记录（按 BITABLE_BATCH_LIMIT 自动分片）
+
+        Args:
+            table_id: 数据表ID
+            updates: [{"record_id": ..., "fields": {...}}]
+
+        Returns:
+            是否全部成功
+        """
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{table_id}/records/batch_update"
+        for start in range(0, len(updates), BITABLE_BATCH_LIMIT):
+            payload = {"records": updates[start:start + BITABLE_BATCH_LIMIT]}
+
+            response = self._request("POST", url, json=payload)
+            result = response.json()
+
+            if result.get("code") != 0:
+                print(f"❌ 批量更新记录失败: {result}")
+                return False
+        return True
+
+    def add_stage_records(self, stage_data_list: List[Dict[str, Any]]) -> List[str]:
+        """批量添加阶段执行记录（一次 batch_create）"""
+        if not stage_data_list:
+            return []
+        record_ids = self.batch_create_records(
+            self.projects_table_id, [self._stage_fields(s) for s in stage_data_list]
+        )
+        print(f"✅ 阶段记录批量创建成功: {', '.join(s.get('stage', '') for s in stage_data_list)}")
+        return record_ids
+
+    def add_stage_record(self, stage_data: Dict[str, Any]) -> str:
+        """添加阶段执行记录"""
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.projects_table_id}/records"
+
+        payload = {"fields": self._stage_fields(stage_data)}
 
-        response = requests.post(url, headers=self._get_headers(), json=payload)
+        response = self._request("POST", url,
+                                 params=_idempotency_params(self.projects_table_id, "stage", stage_data.get("stage")),
+                                 json=payload)
         result = response.json()
 
         if result.get("code") == 0:
@@ -149,19 +253,10 @@ class FeishuProjectManager(ProjectManager, FeishuClient):
         """添加压力测试记录"""
         url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.pressure_tests_table_id}/records"
 
-        fields = {
-            "项目ID": test_data.get("project_id", ""),
-            "测试时间": int(test_data.get("test_time", time.time()) * 1000),
-            "测试引擎": test_data.get("engines", []),
-            "关键词数量": test_data.get("keyword_count", 0),
-            "平均得分": test_data.get("avg_score", 0),
-            "提及率": test_data.get("mention_rate", 0),
-            "趋势": test_data.get("trend", "→")
-        }
-
-        payload = {"fields": fields}
+        payload = {"fields": self._pressure_test_fields(test_data)}
 
-        response = requests.post(url, headers=self._get_headers(), json=payload)
+        response = self._request("POST", url,
+                                 params=_idempotency_params(self.pressure_tests_table_id, "pressure_test"), json=payload)
         result = response.json()
 
         if result.get("code") == 0:
@@ -171,11 +266,21 @@ class FeishuProjectManager(ProjectManager, FeishuClient):
         else:
             raise Exception(f"创建压力测试记录失败: {result}")
 
+    def add_pressure_test_records(self, test_data_list: List[Dict[str, Any]]) -> List[str]:
+        """批量添加压力测试记录（一次 batch_create）"""
+        if not test_data_list:
+            return []
+        record_ids = self.batch_create_records(
+            self.pressure_tests_table_id, [self._pressure_test_fields(t) for t in test_data_list]
+        )
+        print(f"✅ 压力测试记录批量创建成功: {len(record_ids)} 条")
+        return record_ids
+
     def get_project_info(self, project_id: str) -> Optional[Dict[str, Any]]:
         """获取项目信息"""
         url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.projects_table_id}/records/{project_id}"
 
-        response = requests.get(url, headers=self._get_headers())
+        response = self._request("GET", url)
         result = response.json()
 
         if result.get("code") == 0:
@@ -184,25 +289,80 @@ class FeishuProjectManager(ProjectManager, FeishuClient):
             print(f"❌ 获取项目信息失败: {result}")
             return None
 
-    def list_projects(self, status: Optional[ProjectStatus] = None) -> List[Dict[str, Any]]:
-        """获取项目列表"""
+    def iter_projects(self, status: Optional[ProjectStatus] = None,
+                      field_names: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """逐条遍历项目（按 page_token 翻页）"""
         url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.projects_table_id}/records"
 
         # 构建筛选条件
-        params = {"page_size": 100}
+        params = {"page_size": BITABLE_PAGE_SIZE}
         if status:
             # 飞书多维表格的筛选语法
             params["filter"] = f"CurrentValue.[项目状态]='{status.value}'"
+        if field_names:
+            params["field_names"] = json.dumps(field_names, ensure_ascii=False)
 
-        response = requests.get(url, headers=self._get_headers(), params=params)
-        result = response.json()
+        def fetch_page(page_token: Optional[str]):
+            page_params = {**params, "page_token": page_token} if page_token else params
+            response = self._request("GET", url, params=page_params)
+            result = response.json()
+
+            if result.get("code") != 0:
+                raise Exception(f"获取项目列表失败: {result}")
+            data = result["data"]
+            records = data.get("items") or []
+            next_token = data.get("page_token") if data.get("has_more") else None
+            return [{"id": r["record_id"], **r["fields"]} for r in records], next_token
+
+        return iter_pages(fetch_page)
 
-        if result.get("code") == 0:
-            records = result["data"]["items"]
-            return [{"id": r["record_id"], **r["fields"]} for r in records]
-        else:
-            print(f"❌ 获取项目列表失败: {result}")
-            return []
+
+    def mirror_tables(self) -> Dict[str, str]:
+        """项目与阶段记录同在项目表中"""
+        return {
+            "projects": self.projects_table_id,
+            "pressure_tests": self.pressure_tests_table_id
+        }
+
+    def iter_table_records(self, table_id: str, modified_since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        遍历表中记录（records/search，带系统字段 last_modified_time）
+
+        配置了 bitable.modified_field（「最后更新时间」类型字段）时按该字段在服务端过滤增量，
+        否则拉取全部记录后在本地按 last_modified_time 过滤。
+        """
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{table_id}/records/search"
+
+        body: Dict[str, Any] = {"automatic_fields": True}
+        if modified_since and self.modified_field:
+            body["filter"] = {
+                "conjunction": "and",
+                "conditions": [{
+                    "field_name": self.modified_field,
+                    "operator": "isGreater",
+                    "value": ["ExactDate", str(int(modified_since * 1000))]
+                }]
+            }
+
+        def fetch_page(page_token: Optional[str]):
+            params = {"page_size": BITABLE_PAGE_SIZE}
+            if page_token:
+                params["page_token"] = page_token
+            response = self._request("POST", url, params=params, json=body)
+            result = response.json()
+
+            if result.get("code") != 0:
+                raise Exception(f"遍历多维表格记录失败: {result}")
+            data = result["data"]
+            records = []
+            for item in data.get("items") or []:
+                modified_at = item.get("last_modified_time", 0) / 1000
+                if modified_since and modified_at <= modified_since:
+                    continue
+                records.append({"id": item["record_id"], "modified_at": modified_at, "fields": item["fields"]})
+            return records, data.get("page_token") if data.get("has_more") else None
+
+        return iter_pages(fetch_page)
 
 
 # ============ 飞书DocumentGenerator实现 ============
@@ -215,24 +375,28 @@ class FeishuDocumentGenerator(DocumentGenerator, FeishuClient):
         self.root_folder_token = config.get("drive", {}).get("root_folder_token", "")
 
     def create_project_document(self, project_id: str, client_name: str, results: Dict[str, str]) -> str:
-        """创建项目交付文档"""
-        # 创建文档
-        url = "https://open.feishu.cn/open-apis/docx/v1/documents"
-
+        """创建项目交付文档（经发件箱投递时，重试会继续写入上次创建的文档）"""
         title = f"【{client_name}】GEO项目交付文档"
-        payload = {
-            "title": title,
-            "folder_token": self.root_folder_token
-        }
+        doc_id = load_checkpoint("feishu:document_id")
+        if doc_id:
+            print(f"♻️  继续写入上次创建的文档: {title}")
+        else:
+            # 创建文档
+            url = "https://open.feishu.cn/open-apis/docx/v1/documents"
+            payload = {
+                "title": title,
+                "folder_token": self.root_folder_token
+            }
 
-        response = requests.post(url, headers=self._get_headers(), json=payload)
-        result = response.json()
+            response = self._request("POST", url, json=payload)
+            result = response.json()
 
-        if result.get("code") != 0:
-            raise Exception(f"创建文档失败: {result}")
+            if result.get("code") != 0:
+                raise Exception(f"创建文档失败: {result}")
 
-        doc_id = result["data"]["document"]["document_id"]
-        print(f"✅ 文档创建成功: {title}")
+            doc_id = result["data"]["document"]["document_id"]
+            save_checkpoint("feishu:document_id", doc_id)
+            print(f"✅ 文档创建成功: {title}")
 
         # 构建文档内容
         self._build_document_content(doc_id, client_name, results)
@@ -242,58 +406,57 @@ class FeishuDocumentGenerator(DocumentGenerator, FeishuClient):
         return doc_url
 
     def _build_document_content(self, doc_id: str, client_name: str, results: Dict[str, str]):
-        """构建文档内容"""
-        # 这里需要使用飞书文档API添加内容块
-        # 简化实现，实际需要按飞书文档Block格式构建
-        url = f"https://open.feishu.cn/open-apis/docx/v1/documents/{doc_id}/blocks/batch_create"
-
-        # 构建文档结构
-        blocks = [
-            self._create_heading_block("📋 项目概览", 1),
-            self._create_text_block(f"客户名称：{client_name}"),
-            self._create_heading_block("🎯 D - 矩阵提取结果", 2),
-            self._create_file_block(results.get("d_matrix", "")),
-            self._create_heading_block("🔄 B - 转化路径设计", 2),
-            self._create_file_block(results.get("b_conversion", "")),
-            self._create_heading_block("✅ C - 质检改进方案", 2),
-            self._create_file_block(results.get("c_quality", "")),
-            self._create_heading_block("💼 A - 商业提案", 2),
-            self._create_file_block(results.get("a_proposal", "")),
+        """把各阶段结果 markdown 渲染为文档块写入"""
+        nodes = [
+            {"type": "heading", "level": 1, "text": "📋 项目概览"},
+            {"type": "paragraph", "text": f"客户名称：{client_name}"},
         ]
+        for title, key in DOCUMENT_SECTIONS:
+            if key not in results:
+                continue
+            file_path = results[key]
+            nodes.append({"type": "heading", "level": 2, "text": title})
+            if file_path and Path(file_path).exists():
+                nodes.extend(load_markdown(file_path))
+            else:
+                nodes.append({"type": "paragraph", "text": "（未生成）"})
 
-        # 批量创建块（简化版）
-        # 实际实现需要按飞书API格式
         print(f"📝 正在构建文档内容...")
+        self._append_blocks(doc_id, render(nodes, "feishu"))
+
+    def _append_blocks(self, doc_id: str, units: List[List[Dict[str, Any]]]):
+        """
+        按 descendant 接口上限分批追加到文档末尾
+
+        docx 对同一文档的写入按版本串行生效，并行写同一文档只会互相冲突重试，
+        因此同一文档内按顺序提交，靠大批次（每次最多 1000 块）减少请求数。
+        经发件箱投递时每批写入后记下进度，重试跳过已写入的批次。
+        """
+        url = f"https://open.feishu.cn/open-apis/docx/v1/documents/{doc_id}/blocks/{doc_id}/descendant"
+        step = f"feishu:{doc_id}:batches"
+        done = load_checkpoint(step) or 0
+
+        for index, batch in enumerate(feishu_batches(units)):
+            if index < done:
+                continue
+            payload = {**batch, "index": -1}
+            params = {"document_revision_id": -1, **_idempotency_params(doc_id, index)}
+            response = self._request("POST", url, params=params, json=payload)
+            result = response.json()
 
-    def _create_heading_block(self, text: str, level: int) -> Dict:
-        """创建标题块"""
-        return {
-            "block_type": "heading",
-            "heading": {
-                "level": level,
-                "text": {"content": text}
-            }
-        }
-
-    def _create_text_block(self, text: str) -> Dict:
-        """创建文本块"""
-        return {
-            "block_type": "text",
-            "text": {"content": text}
-        }
-
-    def _create_file_block(self, file_path: str) -> Dict:
-        """创建文件块（占位）"""
-        return {
-            "block_type": "text",
-            "text": {"content": f"📎 附件：{Path(file_path).name}"}
-        }
+            if result.get("code") != 0:
+                raise Exception(f"写入文档内容失败: {result}")
+            save_checkpoint(step, index + 1)
 
     def update_document(self, doc_id: str, content: str) -> bool:
-        """更新文档内容"""
-        # 飞书文档更新API
-        print(f"📝 更新文档: {doc_id}")
-        return True
+        """更新文档内容（把 markdown 追加到文档末尾）"""
+        try:
+            self._append_blocks(doc_id, render(parse_markdown_cached(content), "feishu"))
+            print(f"📝 更新文档: {doc_id}")
+            return True
+        except Exception as e:
+            print(f"❌ 更新文档失败: {e}")
+            return False
 
     def set_document_permission(self, doc_id: str, user_ids: List[str], permission: str = 'view') -> bool:
         """设置文档权限"""
@@ -305,7 +468,7 @@ class FeishuDocumentGenerator(DocumentGenerator, FeishuClient):
                 "member_id": user_id,
                 "perm": permission  # view/edit
             }
-            response = requests.post(url, headers=self._get_headers(), json=payload)
+            response = self._request("POST", url, json=payload)
 
         print(f"✅ 文档权限设置完成")
         return True
@@ -321,107 +484,98 @@ class FeishuDocumentGenerator(DocumentGenerator, FeishuClient):
 # ============ 飞书Notifier实现 ============
 
 class FeishuNotifier(Notifier, FeishuClient):
-    """飞书机器人通知器"""
+    """
+    飞书机器人通知器
+
+    同一项目的进度通知经 NotificationAggregator 合并：配置了 bot.default_group_id 时
+    以应用身份发到群里并原地更新同一张卡片；只有自定义机器人 webhook 时无法更新已发消息，
+    每个合并窗口发一张包含全部阶段的新卡片。卡片状态与限流额度由所有进程共享。
+    """
 
     def __init__(self, config: Dict[str, Any]):
         FeishuClient.__init__(self, config["app_id"], config["app_secret"])
-        self.webhook_url = config.get("bot", {}).get("webhook_url", "")
-        self.default_group_id = config.get("bot", {}).get("default_group_id", "")
-
-    def send_progress_notification(self, project_id: str, stage: str, status: StageStatus, message: str) -> bool:
-        """发送进度通知"""
-        card_content = {
-            "msg_type": "interactive",
-            "card": {
-                "header": {
-                    "title": {
-                        "tag": "plain_text",
-                        "content": "📢 项目进度更新"
-                    },
-                    "template": "blue"
-                },
-                "elements": [
-                    {
-                        "tag": "div",
-                        "text": {
-                            "tag": "lark_md",
-                            "content": f"**阶段**: {stage}\n**状态**: {status.value}\n\n{message}"
-                        }
-                    }
-                ]
-            }
-        }
-
-        response = requests.post(self.webhook_url, json=card_content)
-        return response.status_code == 200
+        bot_config = config.get("bot", {})
+        self.webhook_url = bot_config.get("webhook_url", "")
+        self.default_group_id = bot_config.get("default_group_id", "")
+        self.aggregator = NotificationAggregator(
+            channel=self.default_group_id or self.webhook_url,
+            send_card=self._send_card,
+            update_card=self._update_card if self.default_group_id else None,
+            render_card=render_progress_card,
+            window=bot_config.get("debounce_seconds", DEFAULT_WINDOW),
+            rate_per_minute=bot_config.get("rate_per_minute", DEFAULT_RATE_PER_MINUTE)
+        )
+        # 正常退出前把窗口内尚未发送的进度发出去（异常退出时由其他进程接着发送）
+        atexit.register(self.aggregator.flush)
+
+    def send_progress_notification(self, project_id: str, stage: str, status: StageStatus, message: str,
+                                   client_name: Optional[str] = None) -> bool:
+        """登记进度通知（写入共享的卡片状态后返回，合并窗口结束时由后台线程发送，进程退出也不会丢失）"""
+        self.aggregator.progress(project_id, stage, status.value, message, title=client_name)
+        return True
 
     def send_completion_notification(self, project_id: str, client_name: str, doc_url: str) -> bool:
-        """发送完成通知"""
-        card_content = {
-            "msg_type": "interactive",
-            "card": {
-                "header": {
-                    "title": {
-                        "tag": "plain_text",
-                        "content": "✅ 项目已完成"
-                    },
-                    "template": "green"
-                },
-                "elements": [
-                    {
-                        "tag": "div",
-                        "text": {
-                            "tag": "lark_md",
-                            "content": f"**客户**: {client_name}\n**项目ID**: {project_id}\n\n所有阶段已完成，请查看交付文档。"
-                        }
-                    },
-                    {
-                        "tag": "action",
-                        "actions": [
-                            {
-                                "tag": "button",
-                                "text": {
-                                    "tag": "plain_text",
-                                    "content": "查看详细结果"
-                                },
-                                "url": doc_url,
-                                "type": "primary"
-                            }
-                        ]
-                    }
-                ]
-            }
-        }
-
-        response = requests.post(self.webhook_url, json=card_content)
-        return response.status_code == 200
+        """发送完成通知（立即发送，并把该项目的进度卡片更新为完成状态）"""
+        self.aggregator.complete(project_id, client_name, doc_url)
+        return True
 
     def send_alert(self, alert_type: str, message: str) -> bool:
         """发送告警通知"""
-        card_content = {
-            "msg_type": "interactive",
-            "card": {
-                "header": {
-                    "title": {
-                        "tag": "plain_text",
-                        "content": f"⚠️ {alert_type}"
-                    },
-                    "template": "red"
+        card = {
+            "header": {
+                "title": {
+                    "tag": "plain_text",
+                    "content": f"⚠️ {alert_type}"
                 },
-                "elements": [
-                    {
-                        "tag": "div",
-                        "text": {
-                            "tag": "lark_md",
-                            "content": message
-                        }
+                "template": "red"
+            },
+            "elements": [
+                {
+                    "tag": "div",
+                    "text": {
+                        "tag": "lark_md",
+                        "content": message
                     }
-                ]
-            }
+                }
+            ]
         }
+        return self.aggregator.send_now(card)
+
+    def flush(self):
+        self.aggregator.flush()
+
+    def _send_card(self, card: Dict[str, Any]) -> Union[str, bool]:
+        """
+        发送卡片
+
+        Returns:
+            可用于后续更新的 message_id；webhook 发送成功返回空字符串，失败返回 False
+        """
+        if self.default_group_id:
+            url = "https://open.feishu.cn/open-apis/im/v1/messages"
+            payload = {
+                "receive_id": self.default_group_id,
+                "msg_type": "interactive",
+                "content": json.dumps(card, ensure_ascii=False)
+            }
+            response = self._request("POST", url, params={"receive_id_type": "chat_id"}, json=payload)
+            result = response.json()
+            if result.get("code") == 0:
+                return result["data"]["message_id"]
+            print(f"⚠️ 飞书群消息发送失败: {result}")
+            return False
+
+        response = http.post(self.webhook_url, json={"msg_type": "interactive", "card": card})
+        if response.status_code == 200 and response.json().get("code", 0) == 0:
+            return ""
+        print(f"⚠️ 飞书机器人通知发送失败: {response.text}")
+        return False
 
-        response = requests.post(self.webhook_url, json=card_content)
-        return response.status_code == 200
+    def _update_card(self, message_id: str, card: Dict[str, Any]) -> bool:
+        """原地更新已发送的卡片（需要卡片 config.update_multi=true）"""
+        url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}"
+        response = self._request("PATCH", url, json={"content": json.dumps(card, ensure_ascii=False)})
+        return response.json().get("code") == 0
 
 
 # ============ 飞书FileManager实现 ============
@@ -442,7 +596,7 @@ class FeishuFileManager(FileManager, FeishuClient):
             "folder_token": self.root_folder_token
         }
 
-        response = requests.post(url, headers=self._get_headers(), json=payload)
+        response = self._request("POST", url, json=payload)
         result = response.json()
 
         if result.get("code") == 0:
@@ -453,43 +607,172 @@ class FeishuFileManager(FileManager, FeishuClient):
             raise Exception(f"创建文件夹失败: {result}")
 
     def upload_file(self, folder_id: str, file_path: str) -> str:
-        """上传文件"""
+        """上传文件（大文件自动分片并行上传，失败后再次调用会从已完成的分片继续）"""
+        path = Path(file_path)
+        if path.stat().st_size > UPLOAD_ALL_LIMIT:
+            file_token = self._upload_chunked(folder_id, path)
+        else:
+            file_token = self._upload_all(folder_id, path)
+        print(f"✅ 文件上传成功: {path.name}")
+        return f"https://open.feishu.cn/file/{file_token}"
+
+    def _upload_all(self, folder_id: str, path: Path) -> str:
+        """小文件一次上传"""
         url = "https://open.feishu.cn/open-apis/drive/v1/files/upload_all"
 
-        with open(file_path, 'rb') as f:
-            files = {
-                'file': (Path(file_path).name, f)
-            }
-            data = {
-                'parent_type': 'explorer',
-                'parent_node': folder_id,
-                'size': Path(file_path).stat().st_size
-            }
+        # 读入内存而不是传文件对象：token 失效重试时请求体需要能再发一次
+        files = {
+            'file': (path.name, path.read_bytes())
+        }
+        data = {
+            'parent_type': 'explorer',
+            'parent_node': folder_id,
+            'size': path.stat().st_size
+        }
 
-            response = requests.post(url, headers=self._get_headers(), files=files, data=data)
-            result = response.json()
+        response = self._request("POST", url, files=files, data=data, timeout=UPLOAD_TIMEOUT)
+        result = response.json()
 
         if result.get("code") == 0:
-            file_token = result["data"]["file_token"]
-            print(f"✅ 文件上传成功: {Path(file_path).name}")
-            return f"https://open.feishu.cn/file/{file_token}"
+            return result["data"]["file_token"]
         else:
             raise Exception(f"上传文件失败: {result}")
 
-    def list_files(self, folder_id: str) -> List[Dict[str, Any]]:
-        """列出文件夹内文件"""
-        url = f"https://open.feishu.cn/open-apis/drive/v1/files"
+    def _upload_chunked(self, folder_id: str, path: Path) -> str:
+        """分片上传：prepare → 并行 part（带 Adler-32 校验）→ finish"""
+        stat = path.stat()
+        state_key = hashlib.sha1(f"{folder_id}|{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()
+        state_file = UPLOAD_STATE_DIR / f"{state_key}.json"
+        state = json.loads(state_file.read_text(encoding="utf-8")) if state_file.exists() else None
+
+        try:
+            return self._upload_parts(folder_id, path, state_file, state)
+        except UploadIdExpired as e:
+            if state is None:
+                raise
+            # 只有 upload_id 过期才丢弃续传进度从头再传；其他错误保留进度，下次调用继续
+            print(f"⚠️  upload_id 已失效，重新上传 {path.name}: {e}")
+            state_file.unlink(missing_ok=True)
+            return self._upload_parts(folder_id, path, state_file, None)
+
+    def _upload_parts(self, folder_id: str, path: Path, state_file: Path, state: Optional[Dict[str, Any]]) -> str:
+        if state is None:
+            state = self._upload_prepare(folder_id, path)
+            state["done"] = []
+            self._save_upload_state(state_file, state)
+
+        lock = threading.Lock()
+        pending = [seq for seq in range(state["block_num"]) if seq not in state["done"]]
+
+        def upload(seq: int):
+            self._upload_part(path, state["upload_id"], seq, state["block_size"])
+            with lock:
+                state["done"].append(seq)
+                self._save_upload_state(state_file, state)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as executor:
+                # list() 触发异常传播：任一分片最终失败则整体失败，已完成的分片保留在续传进度里
+                list(executor.map(upload, pending))
+
+        file_token = self._upload_finish(state["upload_id"], state["block_num"])
+        state_file.unlink(missing_ok=True)
+        return file_token
+
+    def _upload_prepare(self, folder_id: str, path: Path) -> Dict[str, Any]:
+        url = "https://open.feishu.cn/open-apis/drive/v1/files/upload_prepare"
 
-        params = {
-            "folder_token": folder_id,
-            "page_size": 100
+        payload = {
+            "file_name": path.name,
+            "parent_type": "explorer",
+            "parent_node": folder_id,
+            "size": path.stat().st_size
         }
 
-        response = requests.get(url, headers=self._get_headers(), params=params)
+        response = self._request("POST", url, json=payload)
         result = response.json()
 
         if result.get("code") == 0:
-            return result["data"]["files"]
+            data = result["data"]
+            return {"upload_id": data["upload_id"], "block_size": data["block_size"], "block_num": data["block_num"]}
         else:
-            print(f"❌ 获取文件列表失败: {result}")
-            return []
+            raise Exception(f"分片上传预处理失败: {result}")
+
+    def _upload_part(self, path: Path, upload_id: str, seq: int, block_size: int):
+        url = "https://open.feishu.cn/open-apis/drive/v1/files/upload_part"
+
+        with open(path, 'rb') as f:
+            f.seek(seq * block_size)
+            chunk = f.read(block_size)
+
+        data = {
+            'upload_id': upload_id,
+            'seq': seq,
+            'size': len(chunk),
+            'checksum': str(zlib.adler32(chunk))
+        }
+
+        for attempt in range(1, UPLOAD_PART_RETRIES + 1):
+            try:
+                response = self._request("POST", url, files={'file': (path.name, chunk)},
+                                         data=data, timeout=UPLOAD_TIMEOUT)
+                result = response.json()
+                if result.get("code") == 0:
+                    return
+                if result.get("code") in UPLOAD_ID_EXPIRED_CODES:
+                    raise UploadIdExpired(f"上传分片 {seq} 失败: {result}")
+                error = Exception(f"上传分片 {seq} 失败: {result}")
+            except UploadIdExpired:
+                raise
+            except Exception as e:
+                error = e
+            if attempt < UPLOAD_PART_RETRIES:
+                time.sleep(2 ** attempt)
+        raise error
+
+    def _upload_finish(self, upload_id: str, block_num: int) -> str:
+        url = "https://open.feishu.cn/open-apis/drive/v1/files/upload_finish"
+
+        payload = {
+            "upload_id": upload_id,
+            "block_num": block_num
+        }
+
+        response = self._request("POST", url, json=payload)
+        result = response.json()
+
+        if result.get("code") == 0:
+            return result["data"]["file_token"]
+        elif result.get("code") in UPLOAD_ID_EXPIRED_CODES:
+            raise UploadIdExpired(f"分片上传完成失败: {result}")
+        else:
+            raise Exception(f"分片上传完成失败: {result}")
+
+    @staticmethod
+    def _save_upload_state(state_file: Path, state: Dict[str, Any]):
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = state_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        tmp.replace(state_file)
+
+    def iter_files(self, folder_id: str) -> Iterator[Dict[str, Any]]:
+        """逐条遍历文件夹内文件（按 page_token 翻页）"""
+        url = f"https://open.feishu.cn/open-apis/drive/v1/files"
+
+        params = {
+            "folder_token": folder_id,
+            "page_size": DRIVE_PAGE_SIZE
+        }
+
+        def fetch_page(page_token: Optional[str]):
+            page_params = {**params, "page_token": page_token} if page_token else params
+            response = self._request("GET", url, params=page_params)
+            result = response.json()
+
+            if result.get("code") != 0:
+                raise Exception(f"获取文件列表失败: {result}")
+            data = result["data"]
+            next_token = data.get("next_page_token") if data.get("has_more") else None
+            return data.get("files") or [], next_token
+
+        return iter_pages(fetch_page)
@@ -1,65 +1,131 @@
 """
 飞书机器人 - GEO 助手
-功能：接收飞书消息，调用 OpenAI API 执行 Prompt，返回结果
+功能：接收飞书消息，按项目名找到客户输入卡，用流水线的 Prompt 执行并返回结果
 
 部署方式：
 1. 在飞书开放平台创建应用，获取 App ID 和 App Secret
 2. 配置机器人，设置消息接收地址
 3. 部署此脚本到云函数（如阿里云 FC、腾讯云 SCF）或服务器
+
+飞书要求 3 秒内响应回调，超时会重推同一事件。webhook 只做解析和去重（按 event_id，TTL 缓存），
+立即返回；Prompt 执行交给有界线程池，同一会话同时只执行 PER_CHAT_CONCURRENCY 个任务，
+其余按顺序排队。队列深度等指标见 GET /metrics。
+
+结果以流式生成：先发一张卡片，生成过程中按 CARD_UPDATE_INTERVAL 节流原地更新；
+超过 CARD_MAX_CHARS 的部分按顺序续写到新卡片，结果很长时再附上完整的 markdown 文件。
+
+项目名经 project_index 解析为输入卡（output/<客户>/ 或平台项目表），Prompt 与调用（含重试）
+与 run_full_pipeline 相同，结果写入 output/<客户>/；输入卡未变时再次"跑D 品牌A"直接返回已有结果，
+命令末尾加"刷新"可强制重新生成。
 """
 import json
 import hashlib
+import tempfile
+import threading
 import time
-import requests
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 from flask import Flask, request, jsonify
-from openai import OpenAI
-from config import OPENAI_API_KEY, FEISHU_APP_ID, FEISHU_APP_SECRET
+from config import FEISHU_APP_ID, FEISHU_APP_SECRET
+from feishu_token import get_token_manager
+from http_session import get_session
+from job_queue import active_job_for_client
+from notification_aggregator import HIGH_PRIORITY_RESERVE, HIGH_PRIORITY_TIMEOUT, get_limiter
+from output_manifest import refresh_client
+from project_index import get_project_index
+from run_full_pipeline import OUTPUT_ROOT, cached_result, run_prompt, save_input_card, save_result
+from stage_stream import StageStream
 
 app = Flask(__name__)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+http = get_session("feishu")
 
 # 飞书 API 相关
-FEISHU_TENANT_ACCESS_TOKEN_URL = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
 FEISHU_SEND_MESSAGE_URL = "https://open.feishu.cn/open-apis/im/v1/messages"
+FEISHU_UPLOAD_FILE_URL = "https://open.feishu.cn/open-apis/im/v1/files"
+
+# 流式回复
+CARD_UPDATE_INTERVAL = 1.5       # 同一张卡片两次更新的最小间隔（秒）
+CARD_MAX_CHARS = 3000            # 每张卡片的正文字数，超出部分续写到下一张
+MAX_RESULT_CARDS = 5             # 一次回复最多发送的卡片数，其余内容只放在附件里
+ATTACH_FILE_CHARS = 8000         # 结果超过该字数时附上完整的 markdown 文件
 
-# Prompt 模板（简化版，完整版在 geo_prompt_runner.py）
-PROMPT_TEMPLATES = {
-    "D": "【语义矩阵提取】请基于以下输入，提取 5 类语义词表（各 10 条）：硬核实体词、对比短语、语义标签、热门提问、标准断言。\n输入：{input}",
-    "B": "【转化路径优化】请基于以下输入，设计信任锚点→对比决策位→最后一步动作的转化路径。\n输入：{input}",
-    "C": "【内容审计打分】请对以下内容进行 GEO 审计，输出总分、问题清单、整改方案。\n输入：{input}",
-    "A": "【商业提案生成】请基于以下输入，生成一份 PPT 级的 GEO 商业提案，包含现状审计、SEO vs GEO 对比、策略、KPI。\n输入：{input}",
-}
+# 事件处理
+BOT_WORKERS = 4                  # 同时执行的 Prompt 数
+MAX_PENDING_TASKS = 50           # 已接收但尚未开始执行的任务上限，超出时直接回复繁忙
+PER_CHAT_CONCURRENCY = 1         # 每个会话同时执行的任务数，其余按到达顺序排队
+EVENT_DEDUPE_TTL = 12 * 3600     # 飞书最长约 6 小时内会重推同一事件
+EVENT_DEDUPE_MAX = 10000         # 去重缓存最多保留的事件数
+
+FORCE_KEYWORD = "刷新"            # 命令末尾带该词时忽略已有结果，重新生成
 
 
 def get_tenant_access_token():
-    """获取飞书 tenant_access_token"""
-    resp = requests.post(FEISHU_TENANT_ACCESS_TOKEN_URL, json={
-        "app_id": FEISHU_APP_ID,
-        "app_secret": FEISHU_APP_SECRET
-    })
-    return resp.json().get("tenant_access_token")
+    """获取飞书 tenant_access_token（与平台适配器共享，过期前后台自动刷新）"""
+    return get_token_manager(FEISHU_APP_ID, FEISHU_APP_SECRET).get_token()
+
+
+def _request(method: str, url: str, **kwargs):
+    """带 token 请求飞书接口（token 被服务端判定失效时刷新后重试一次）"""
+    return get_token_manager(FEISHU_APP_ID, FEISHU_APP_SECRET).request(
+        lambda token: http.request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+    )
 
 
 def send_message(chat_id: str, content: str, msg_type: str = "text"):
     """发送消息到飞书群/个人"""
-    token = get_tenant_access_token()
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
     data = {
         "receive_id": chat_id,
         "msg_type": msg_type,
-        "content": json.dumps({"text": content})
+        "content": json.dumps({"text": content}) if msg_type == "text" else content
     }
-    resp = requests.post(
+    resp = _request(
+        "POST",
         f"{FEISHU_SEND_MESSAGE_URL}?receive_id_type=chat_id",
-        headers=headers,
         json=data
     )
     return resp.json()
 
 
+def send_card(chat_id: str, card: Dict[str, Any]) -> Optional[str]:
+    """发送卡片消息，返回 message_id（失败返回 None）"""
+    resp = _request(
+        "POST",
+        f"{FEISHU_SEND_MESSAGE_URL}?receive_id_type=chat_id",
+        json={"receive_id": chat_id, "msg_type": "interactive", "content": json.dumps(card, ensure_ascii=False)}
+    )
+    result = resp.json()
+    if result.get("code") == 0:
+        return result["data"]["message_id"]
+    print(f"⚠️ 卡片发送失败: {result}")
+    return None
+
+
+def update_card(message_id: str, card: Dict[str, Any]) -> bool:
+    """原地更新已发送的卡片（需要卡片 config.update_multi=true）"""
+    resp = _request(
+        "PATCH",
+        f"{FEISHU_SEND_MESSAGE_URL}/{message_id}",
+        json={"content": json.dumps(card, ensure_ascii=False)}
+    )
+    return resp.json().get("code") == 0
+
+
+def send_file(chat_id: str, file_name: str, content: bytes) -> bool:
+    """上传文件并作为文件消息发送"""
+    resp = _request(
+        "POST",
+        FEISHU_UPLOAD_FILE_URL,
+        data={"file_type": "stream", "file_name": file_name},
+        files={"file": (file_name, content)}
+    )
+    result = resp.json()
+    if result.get("code") != 0:
+        print(f"⚠️ 文件上传失败: {result}")
+        return False
+    return send_message(chat_id, json.dumps({"file_key": result["data"]["file_key"]}), msg_type="file").get("code") == 0
+
+
 def parse_command(text: str):
     """
     解析用户命令
@@ -79,36 +145,377 @@ def parse_command(text: str):
     return None, None
 
 
-def run_prompt(prompt_type: str, user_input: str) -> str:
-    """调用 OpenAI API 执行 Prompt"""
-    template = PROMPT_TEMPLATES.get(prompt_type)
-    if not template:
-        return f"未知的 Prompt 类型: {prompt_type}"
-    
-    full_prompt = template.format(input=user_input)
-    
-    response = openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "你是一名专业的 GEO（生成式引擎优化）专家。"},
-            {"role": "user", "content": full_prompt}
-        ],
-        temperature=0.7,
-        max_tokens=2000
-    )
+# ============ 流式回复卡片 ============
+
+def render_result_card(title: str, text: str, footer: str, done: bool) -> Dict[str, Any]:
+    """渲染结果卡片（markdown 正文 + 状态说明）"""
+    return {
+        "config": {"update_multi": True, "wide_screen_mode": True},
+        "header": {
+            "title": {"tag": "plain_text", "content": title},
+            "template": "green" if done else "blue"
+        },
+        "elements": [
+            {"tag": "markdown", "content": text or "……"},
+            {"tag": "note", "elements": [{"tag": "plain_text", "content": footer}]}
+        ]
+    }
+
+
+class StreamingReply:
+    """
+    把流式生成的结果写成一组按顺序发送的卡片
+
+    当前卡片按 CARD_UPDATE_INTERVAL 节流更新，且与该会话的通知共用限流额度（额度紧张时跳过本次更新，
+    内容留到下一次）；正文超过 CARD_MAX_CHARS 时在换行处切开，定稿当前卡片后发下一张。
+    """
+
+    def __init__(self, chat_id: str, title: str):
+        self.chat_id = chat_id
+        self.title = title
+        self.text = ""
+        self.limiter = get_limiter(chat_id)
+        self._start = 0                          # 当前卡片正文在 text 中的起点
+        self._message_ids: List[Optional[str]] = [None]
+        self._shown = ""                         # 当前卡片最近一次显示的正文
+        self._last_update = 0.0
+        self.truncated = False                   # 卡片数已达上限，剩余内容只在附件中
+
+    def _card_title(self) -> str:
+        part = len(self._message_ids)
+        return self.title if part <= 1 else f"{self.title}（续 {part}）"
+
+    def _publish(self, text: str, footer: str, done: bool = False, force: bool = False):
+        """发送或更新当前卡片；force 时等待限流额度，否则额度不足直接跳过"""
+        if text == self._shown and not force:
+            return
+        if force:
+            if not self.limiter.acquire(HIGH_PRIORITY_TIMEOUT):
+                return
+        elif not self.limiter.try_acquire(reserve=HIGH_PRIORITY_RESERVE):
+            return
+        card = render_result_card(self._card_title(), text, footer, done)
+        try:
+            message_id = self._message_ids[-1]
+            if message_id is None:
+                self._message_ids[-1] = send_card(self.chat_id, card)
+            elif not update_card(message_id, card):
+                return
+        except Exception as e:
+            print(f"⚠️ 结果卡片发送失败: {e}")
+            return
+        self._shown = text
+        self._last_update = time.monotonic()
+
+    def start(self):
+        self._publish("", "⏳ 正在生成...", force=True)
+
+    def restart(self):
+        """生成失败重试：当前卡片标记为已放弃，重新生成的内容从新卡片开始"""
+        if not self.text:
+            return
+        if not self.truncated:
+            self._publish(self.text[self._start:], "⚠️ 调用失败，正在重试（以下条为准）", force=True)
+        self.text = ""
+        self._start = 0
+        self._message_ids.append(None)
+        self._shown = ""
+        self.truncated = False
+
+    def feed(self, delta: str, publish: bool = True):
+        """追加增量文本；publish=False 时只在切分卡片时发送（一次性写入已有结果）"""
+        self.text += delta
+        if self.truncated:
+            return
+        while len(self.text) - self._start > CARD_MAX_CHARS:
+            cut = self.text.rfind("\n", self._start + CARD_MAX_CHARS // 2, self._start + CARD_MAX_CHARS)
+            cut = cut + 1 if cut > 0 else self._start + CARD_MAX_CHARS
+            if len(self._message_ids) >= MAX_RESULT_CARDS:
+                self._publish(self.text[self._start:cut], "内容较长，完整结果见附件", force=True)
+                self.truncated = True
+                return
+            self._publish(self.text[self._start:cut], "⬇️ 续下条", force=True)
+            self._start = cut
+            self._message_ids.append(None)
+            self._shown = ""
+        if publish and time.monotonic() - self._last_update >= CARD_UPDATE_INTERVAL:
+            self._publish(self.text[self._start:], "⏳ 正在生成...")
+
+    def finish(self, error: Optional[str] = None, note: str = ""):
+        """定稿最后一张卡片；结果很长时附上完整文件"""
+        attach = self.truncated or len(self.text) > ATTACH_FILE_CHARS
+        if error:
+            footer = f"❌ 生成中断：{error}"
+        else:
+            footer = f"✅ 已完成，共 {len(self.text)} 字" + ("，完整结果见附件" if attach else "") + note
+        if not self.truncated:
+            self._publish(self.text[self._start:], footer, done=not error, force=True)
+        if attach and self.text:
+            file_name = f"{self.title.replace(' ', '')}.md"
+            if not send_file(self.chat_id, file_name, self.text.encode("utf-8")):
+                send_message(self.chat_id, "⚠️ 完整结果文件发送失败")
+
+
+class ReplyStream(StageStream):
+    """
+    流水线的阶段流式写入器，同时把增量转发到回复卡片
+
+    机器人的执行写在临时目录里，不用客户目录下的 .stream/：
+    页面上的流水线任务会清空那里、写取消标记，不能影响机器人。
+    """
+
+    def __init__(self, client_folder, stage: str, reply: StreamingReply):
+        super().__init__(client_folder, stage)
+        self.reply = reply
+
+    def restart(self):
+        super().restart()
+        self.reply.restart()
+
+    def append(self, delta: str):
+        super().append(delta)
+        self.reply.feed(delta)
+
+
+# ============ 按项目执行 ============
+
+_stage_locks: Dict[str, threading.Lock] = {}
+_stage_locks_guard = threading.Lock()
+
+
+def _stage_lock(client_name: str, prompt_type: str) -> threading.Lock:
+    """同一项目同一阶段同时只生成一次，后到的请求等它完成后直接取结果"""
+    with _stage_locks_guard:
+        return _stage_locks.setdefault(f"{client_name}:{prompt_type}", threading.Lock())
+
+
+def run_for_project(chat_id: str, prompt_type: str, card: Dict[str, Any], force: bool = False):
+    """
+    对项目输入卡执行 Prompt；输入卡未变且已有结果时直接返回
+
+    页面上该客户的流水线任务排队或执行中时不生成，避免两边同时写结果文件
+    （_stage_lock 只在本进程内有效）。
+    """
+    client_name = card["client_name"]
+    client_input = card["client_input"]
+    output_dir = OUTPUT_ROOT / client_name
+    reply = StreamingReply(chat_id, f"Prompt {prompt_type} · {client_name}")
+
+    with _stage_lock(client_name, prompt_type):
+        cached = None if force else cached_result(output_dir, client_name, prompt_type, client_input)
+        if cached is not None:
+            reply.feed(cached, publish=False)
+            reply.finish(note=f"（已有结果，发送「跑{prompt_type} {client_name} {FORCE_KEYWORD}」重新生成）")
+            return
+
+        if active_job_for_client(client_name):
+            send_message(chat_id, f"⏳ 项目「{client_name}」正在页面上执行流水线，"
+                                  f"完成后再发送「跑{prompt_type} {client_name}」即可取到结果")
+            return
+
+        reply.start()
+        output_dir.mkdir(parents=True, exist_ok=True)
+        save_input_card(output_dir, client_name, client_input)
+        with tempfile.TemporaryDirectory() as stream_folder:
+            try:
+                result = run_prompt(prompt_type, client_input, ReplyStream(stream_folder, prompt_type, reply))
+            except Exception as e:
+                reply.finish(error=str(e))
+                raise
+        save_result(output_dir, client_name, prompt_type, result)
+        refresh_client(output_dir)
+        reply.finish()
+
+
+def run_for_content(chat_id: str, prompt_type: str, content: str):
+    """没有对应项目时把命令后的文字直接作为输入（跑C 审计一段内容），结果不保存"""
+    reply = StreamingReply(chat_id, f"Prompt {prompt_type} · 内容审计")
+    reply.start()
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            run_prompt(prompt_type, {"待审计内容": content}, ReplyStream(folder, prompt_type, reply))
+        except Exception as e:
+            reply.finish(error=str(e))
+            raise
+    reply.finish()
+
+
+# ============ 事件去重与任务分发 ============
+
+class EventDeduper:
+    """按事件ID去重（TTL + 容量上限的 LRU）"""
+
+    def __init__(self, ttl: float = EVENT_DEDUPE_TTL, max_size: int = EVENT_DEDUPE_MAX):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_seen(self, event_id: str) -> bool:
+        """第一次见到该事件返回 True 并记录；TTL 内重复到达返回 False"""
+        now = time.monotonic()
+        with self._lock:
+            while self._seen:
+                oldest, seen_at = next(iter(self._seen.items()))
+                if now - seen_at < self.ttl and len(self._seen) < self.max_size:
+                    break
+                self._seen.pop(oldest)
+            if event_id in self._seen:
+                return False
+            self._seen[event_id] = now
+            return True
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class ChatDispatcher:
+    """
+    有界线程池 + 会话级并发限制
+    会话内超出并发的任务留在该会话的队列里（不占线程），前一个任务结束时按顺序接上。
+    """
+
+    def __init__(self, workers: int = BOT_WORKERS, max_pending: int = MAX_PENDING_TASKS,
+                 per_chat: int = PER_CHAT_CONCURRENCY):
+        self.max_pending = max_pending
+        self.per_chat = per_chat
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bot")
+        self._lock = threading.Lock()
+        self._waiting: Dict[str, deque] = {}    # 会话 → 等待中的任务
+        self._active: Dict[str, int] = {}       # 会话 → 已提交到线程池的任务数
+        self._pending = 0                       # 已接收、尚未开始执行的任务数
+        self._running = 0
+        self._max_pending_seen = 0
+        self._wait_ms_total = 0.0
+        self.counters = {"accepted": 0, "rejected": 0, "duplicates": 0, "completed": 0, "failed": 0}
+
+    def submit(self, chat_id: str, fn: Callable, *args) -> bool:
+        """提交任务；排队已满时返回 False"""
+        task = (fn, args, time.monotonic())
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.counters["rejected"] += 1
+                return False
+            self.counters["accepted"] += 1
+            self._pending += 1
+            self._max_pending_seen = max(self._max_pending_seen, self._pending)
+            if self._active.get(chat_id, 0) < self.per_chat:
+                self._active[chat_id] = self._active.get(chat_id, 0) + 1
+            else:
+                self._waiting.setdefault(chat_id, deque()).append(task)
+                return True
+        self._executor.submit(self._run, chat_id, task)
+        return True
+
+    def record_duplicate(self):
+        with self._lock:
+            self.counters["duplicates"] += 1
+
+    def _run(self, chat_id: str, task):
+        fn, args, queued_at = task
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+            self._wait_ms_total += (time.monotonic() - queued_at) * 1000
+        ok = True
+        try:
+            fn(*args)
+        except Exception as e:
+            ok = False
+            print(f"❌ 机器人任务执行失败 [{chat_id}]: {e}")
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.counters["completed" if ok else "failed"] += 1
+                waiting = self._waiting.get(chat_id)
+                next_task = waiting.popleft() if waiting else None
+                if waiting is not None and not waiting:
+                    del self._waiting[chat_id]
+                if next_task is None:
+                    self._active[chat_id] -= 1
+                    if not self._active[chat_id]:
+                        del self._active[chat_id]
+            if next_task is not None:
+                self._executor.submit(self._run, chat_id, next_task)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Returns:
+            {"pending", "running", "max_pending", "waiting_by_chat", "avg_wait_ms", 以及各计数}
+        """
+        with self._lock:
+            started = self.counters["completed"] + self.counters["failed"] + self._running
+            return {
+                "pending": self._pending,
+                "running": self._running,
+                "max_pending": self._max_pending_seen,
+                "waiting_by_chat": {chat: len(tasks) for chat, tasks in self._waiting.items()},
+                "avg_wait_ms": round(self._wait_ms_total / started, 1) if started else 0.0,
+                **self.counters,
+            }
+
+
+deduper = EventDeduper()
+dispatcher = ChatDispatcher()
+
+
+def event_id_of(data: Dict[str, Any]) -> Optional[str]:
+    """事件唯一ID：2.0 协议为 header.event_id，1.0 协议为 uuid，兜底用消息ID"""
+    return ((data.get("header") or {}).get("event_id") or data.get("uuid")
+            or ((data.get("event") or {}).get("message") or {}).get("message_id"))
+
+
+def handle_message(chat_id: str, text: str):
+    """在工作线程中处理一条消息"""
+    # 解析命令
+    prompt_type, project_name = parse_command(text)
     
-    return response.choices[0].message.content
+    if prompt_type:
+        force = project_name.endswith(FORCE_KEYWORD)
+        if force:
+            project_name = project_name[:-len(FORCE_KEYWORD)].strip()
+        
+        # 从本地输出目录或平台项目表找到项目的输入卡
+        card = get_project_index().resolve(project_name) if project_name else None
+        if card and card["client_input"] is None:
+            # 平台项目表只有概要，没有输入卡，不能拿来跑完整流程
+            send_message(chat_id, f"📋 项目「{card['client_name']}」在平台项目表中，但本地没有它的输入卡，"
+                                  f"请先在页面上提交输入卡")
+        elif card:
+            run_for_project(chat_id, prompt_type, card, force)
+        elif prompt_type == "C" and project_name:
+            run_for_content(chat_id, prompt_type, project_name)
+        else:
+            send_message(chat_id, f"🔍 未找到项目「{project_name}」，请检查项目名（或先在页面上创建项目）"
+                         if project_name else f"请在命令后加上项目名，例如：跑{prompt_type} 品牌A")
+    else:
+        # 帮助信息
+        help_text = """👋 我是 GEO 助手，支持以下命令：
+
+• 跑D [项目名] - 执行语义矩阵提取
+• 跑B [项目名] - 执行转化路径优化
+• 跑C [内容] - 执行内容审计打分
+• 跑A [项目名] - 生成商业提案
+
+已生成过的结果会直接返回，命令末尾加"刷新"可重新生成。
+示例：@GEO助手 跑D 品牌A"""
+        send_message(chat_id, help_text)
 
 
 @app.route("/webhook", methods=["POST"])
 def webhook():
-    """飞书消息回调"""
+    """飞书消息回调：去重后交给工作线程，立即返回"""
     data = request.json
     
     # 验证请求（URL 验证）
     if "challenge" in data:
         return jsonify({"challenge": data["challenge"]})
     
+    event_id = event_id_of(data)
+    if event_id and not deduper.first_seen(event_id):
+        dispatcher.record_duplicate()
+        return jsonify({"code": 0})
+    
     # 处理消息事件
     event = data.get("event", {})
     message = event.get("message", {})
@@ -120,38 +527,16 @@ def webhook():
     except:
         text = ""
     
-    # 解析命令
-    prompt_type, project_name = parse_command(text)
+    if chat_id and not dispatcher.submit(chat_id, handle_message, chat_id, text):
+        threading.Thread(target=send_message, args=(chat_id, "🚦 当前排队任务较多，请稍后再试"), daemon=True).start()
     
-    if prompt_type:
-        # 发送"正在处理"消息
-        send_message(chat_id, f"⏳ 正在执行 Prompt {prompt_type}，请稍候...")
-        
-        # 这里应该从飞书多维表格读取项目的输入卡
-        # 简化版：直接使用 project_name 作为输入
-        user_input = f"项目：{project_name}" if project_name else "（未指定项目）"
-        
-        # 执行 Prompt
-        result = run_prompt(prompt_type, user_input)
-        
-        # 发送结果（截断以避免消息过长）
-        if len(result) > 2000:
-            result = result[:2000] + "\n\n... (结果过长，已截断)"
-        
-        send_message(chat_id, f"✅ Prompt {prompt_type} 执行完成：\n\n{result}")
-    else:
-        # 帮助信息
-        help_text = """👋 我是 GEO 助手，支持以下命令：
+    return jsonify({"code": 0})
 
-• 跑D [项目名] - 执行语义矩阵提取
-• 跑B [项目名] - 执行转化路径优化
-• 跑C [内容] - 执行内容审计打分
-• 跑A [项目名] - 生成商业提案
 
-示例：@GEO助手 跑D 品牌A"""
-        send_message(chat_id, help_text)
-    
-    return jsonify({"code": 0})
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """任务队列深度与处理计数"""
+    return jsonify({**dispatcher.metrics(), "dedupe_cache": len(deduper)})
 
 
 if __name__ == "__main__":
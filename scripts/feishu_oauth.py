@@ -1,14 +1,17 @@
 # feishu_oauth.py – Minimal Feishu OAuth helper for Streamlit
 
 import os
-import requests
 from urllib.parse import urlencode
 
+from http_session import get_session
+
 # Load required env vars (must be set in .env)
 FEISHU_APP_ID = os.getenv("FEISHU_APP_ID")
 FEISHU_APP_SECRET = os.getenv("FEISHU_APP_SECRET")
 FEISHU_REDIRECT_URI = os.getenv("FEISHU_REDIRECT_URI")
 
+http = get_session("feishu")
+
 def get_auth_url(state: str = "geo_tool") -> str:
     """Generate the Feishu authorization URL.
     `state` can be any string to identify the request – we use a constant.
@@ -34,7 +37,7 @@ def exchange_code_for_token(code: str) -> dict:
         "client_id": FEISHU_APP_ID,
         "client_secret": FEISHU_APP_SECRET,
     }
-    resp = requests.post(url, json=payload)
+    resp = http.post(url, json=payload)
     resp.raise_for_status()
     return resp.json()["data"]
 
@@ -44,7 +47,7 @@ def get_user_info(access_token: str) -> dict:
     """
     url = "https://open.feishu.cn/open-apis/contact/v3/users/me"
     headers = {"Authorization": f"Bearer {access_token}"}
-    resp = requests.get(url, headers=headers)
+    resp = http.get(url, headers=headers)
     resp.raise_for_status()
     return resp.json()["data"]
 
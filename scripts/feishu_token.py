@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+飞书 tenant_access_token 管理
+每个 app_id 共享一个 token 管理器：进程内所有适配器和机器人共用同一个 token，
+过期前由后台线程主动刷新，并发获取时加锁避免同时请求多次。
+服务端仍判定 token 无效（如在开放平台重置了密钥）时，request() 丢弃缓存的 token 并重试一次。
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
+from http_session import get_session
+
+
+TENANT_ACCESS_TOKEN_URL = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+
+REFRESH_MARGIN = 300       # 提前 5 分钟刷新
+RETRY_INTERVAL = 30        # 后台刷新失败后的重试间隔（秒）
+INVALID_TOKEN_CODES = {99991663, 99991668}  # tenant_access_token 无效 / 已过期
+
+
+class TenantTokenManager:
+    """单个飞书应用的 tenant_access_token 管理器"""
+
+    def __init__(self, app_id: str, app_secret: str):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self._token: Optional[str] = None
+        self._expires_at: float = 0
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+
+    def get_token(self) -> str:
+        """获取有效 token（缓存命中时不发请求）"""
+        token = self._token
+        if token and time.time() < self._expires_at - REFRESH_MARGIN:
+            return token
+
+        with self._lock:
+            # 双重检查：等锁期间其他线程可能已经刷新
+            if self._token and time.time() < self._expires_at - REFRESH_MARGIN:
+                return self._token
+            self._refresh_locked()
+            return self._token
+
+    def invalidate(self, token: Optional[str] = None):
+        """
+        token 被服务端判定无效时调用，下次获取会重新请求
+
+        Args:
+            token: 被拒绝的 token；已经换成新 token 时不再作废（并发请求同时失败只刷新一次）
+        """
+        with self._lock:
+            if token is not None and token != self._token:
+                return
+            self._token = None
+            self._expires_at = 0
+
+    def request(self, send: Callable[[str], requests.Response]) -> requests.Response:
+        """
+        带 token 发请求，服务端返回 token 无效时刷新 token 重试一次
+
+        Args:
+            send: send(token) 发出请求并返回响应（会被调用两次，请求体需可重复发送）
+        """
+        token = self.get_token()
+        response = send(token)
+        if _error_code(response) in INVALID_TOKEN_CODES:
+            print("⚠️  飞书 token 已失效，刷新后重试")
+            self.invalidate(token)
+            response = send(self.get_token())
+        return response
+
+    def _refresh_locked(self):
+        response = get_session("feishu").post(TENANT_ACCESS_TOKEN_URL, json={
+            "app_id": self.app_id,
+            "app_secret": self.app_secret
+        })
+        result = response.json()
+
+        if result.get("code") != 0:
+            raise Exception(f"获取access_token失败: {result}")
+
+        self._token = result["tenant_access_token"]
+        self._expires_at = time.time() + result.get("expire", 7200)
+        self._start_refresher()
+
+    def _start_refresher(self):
+        """启动后台刷新线程（每个管理器只启动一个）"""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name=f"feishu-token-{self.app_id}", daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            wait = self._expires_at - REFRESH_MARGIN - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                with self._lock:
+                    if time.time() >= self._expires_at - REFRESH_MARGIN:
+                        self._refresh_locked()
+            except Exception as e:
+                print(f"⚠️  飞书 token 后台刷新失败: {e}")
+                time.sleep(RETRY_INTERVAL)
+
+
+def _error_code(response: requests.Response) -> Optional[int]:
+    try:
+        return response.json().get("code")
+    except ValueError:
+        return None
+
+
+_managers: Dict[Tuple[str, str], TenantTokenManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(app_id: str, app_secret: str) -> TenantTokenManager:
+    """获取（或创建）app_id 对应的共享 token 管理器"""
+    key = (app_id, app_secret)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = TenantTokenManager(app_id, app_secret)
+            _managers[key] = manager
+        return manager
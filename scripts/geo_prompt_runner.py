@@ -160,6 +160,31 @@ AI侧/内容侧/转化侧
 }
 
 
+# ============================================================
+# 结构化输出 Prompt（D 阶段 JSON 模式，字段与 d_matrix_parser.SECTIONS 一致）
+# ============================================================
+
+PROMPTS_JSON = {
+    "D": PROMPTS["D"].split("## Output")[0] + """## Output
+只输出一个 JSON 对象，不要输出任何解释或 markdown，结构如下（每个数组固定 10 条字符串）：
+{{
+  "entities": ["硬核实体词", ...],
+  "comparisons": ["对比/评价短语", ...],
+  "tags": ["原创语义标签", ...],
+  "questions": ["预测 AI 热门提问（用户真实问法）", ...],
+  "assertions": ["可引用标准断言（≤60字）", ...],
+  "deployment": {{"小红书": ["建议", ...], "知乎": [...], "官网Meta": [...], "FAQ": [...]}}
+}}""",
+}
+
+JSON_REPAIR_PROMPT = """上一次输出的 JSON 不符合要求：{error}
+
+请修正后重新输出，只输出 JSON 对象本身。要求的结构：
+{schema}
+
+上一次的输出：
+{output}"""
+
 def load_client_input(input_path: str) -> dict:
     """加载客户输入卡 JSON"""
     with open(input_path, "r", encoding="utf-8") as f:
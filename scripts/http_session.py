@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+共享 HTTP 会话
+飞书/Notion 等平台调用统一走这里：连接池复用（keep-alive）、连接/读取超时、
+5xx/429 退避重试（遵守 Retry-After）、按接口熔断（circuit_breaker），以及按接口统计的延迟计数。
+在 circuit_breaker.deadline() 内发出的请求，超时会压缩到剩余预算内；下一次重试（含退避和
+Retry-After 等待）放不进剩余预算时不再重试，直接把最后一次的结果交给调用方。
+熔断器的慢调用按单次尝试的耗时判断，重试间的等待不计入。
+
+用法：
+    from http_session import get_session
+    http = get_session("feishu")
+    http.post(url, json=payload)          # 默认带超时与重试
+
+压测时可用 GEO_<平台>_API_BASE 把平台域名重定向到本地 fake_platform_server，
+例如 GEO_FEISHU_API_BASE=http://127.0.0.1:8765。
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from circuit_breaker import MIN_TIMEOUT, DeadlineExceeded, bounded_timeout, current_operation, get_breaker, remaining
+
+
+DEFAULT_TIMEOUT: Tuple[float, float] = (5, 30)   # (连接超时, 读取超时) 秒
+POOL_CONNECTIONS = 10                            # 缓存的主机连接池数量
+POOL_MAXSIZE = 20                                # 每个主机的最大连接数
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5                             # 0.5s, 1s, 2s ...
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+LATENCY_SAMPLES = 200                            # 每个接口保留的最近样本数
+
+# 各平台 API 域名，可用 GEO_<平台>_API_BASE 环境变量重定向
+API_ORIGINS = {
+    "feishu": "https://open.feishu.cn",
+    "notion": "https://api.notion.com",
+}
+
+# 路径中形如 ID/token 的片段归一化为 :id，避免每条记录各占一个统计桶
+_ID_SEGMENT_RE = re.compile(r"^(?=.*\d)[A-Za-z0-9_-]{12,}$")
+
+
+# 当前线程正在进行的请求：本次尝试的开始时间、最长一次尝试的耗时（秒），供熔断器判断慢调用
+_attempts = threading.local()
+
+
+def _end_attempt():
+    start = getattr(_attempts, "start", None)
+    if start is not None:
+        _attempts.longest = max(_attempts.longest, time.perf_counter() - start)
+        _attempts.start = None
+
+
+class PlatformRetry(Retry):
+    """
+    429 对任何方法都重试（请求未被处理）；5xx 只重试幂等方法，避免重复创建记录。
+    在截止时间内时，等待加下一次尝试放不进剩余预算就不再重试。
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if status_code == 429 and self.total:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        _end_attempt()
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        left = remaining()
+        if left is not None:
+            wait = retry.get_retry_after(response) if response is not None and self.respect_retry_after_header else None
+            wait = retry.get_backoff_time() if wait is None else wait
+            if wait + MIN_TIMEOUT >= left:
+                # 状态码重试时 urllib3 会把这次的响应原样返回；网络错误时由 requests 抛 ConnectionError
+                raise MaxRetryError(_pool, url, DeadlineExceeded(current_operation()))
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        _attempts.start = time.perf_counter()
+
+
+class LatencyStats:
+    """按接口统计请求次数、错误数与延迟分布"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def endpoint_key(method: str, url: str) -> str:
+        parts = urlsplit(url)
+        segments = [":id" if _ID_SEGMENT_RE.match(s) else s for s in parts.path.split("/")]
+        return f"{method.upper()} {parts.netloc}{'/'.join(segments)}"
+
+    def record(self, method: str, url: str, elapsed_ms: float, ok: bool):
+        key = self.endpoint_key(method, url)
+        with self._lock:
+            stat = self._stats.setdefault(key, {
+                "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "samples": deque(maxlen=LATENCY_SAMPLES),
+            })
+            stat["count"] += 1
+            stat["errors"] += 0 if ok else 1
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+            stat["samples"].append(elapsed_ms)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns:
+            {接口: {"count", "errors", "avg_ms", "p50_ms", "p99_ms", "max_ms"}}
+        """
+        result = {}
+        with self._lock:
+            for key, stat in self._stats.items():
+                samples = sorted(stat["samples"])
+                result[key] = {
+                    "count": stat["count"],
+                    "errors": stat["errors"],
+                    "avg_ms": round(stat["total_ms"] / stat["count"], 1),
+                    "p50_ms": round(samples[len(samples) // 2], 1),
+                    "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 1),
+                    "max_ms": round(stat["max_ms"], 1),
+                }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+latency_stats = LatencyStats()
+
+
+def api_base_override(name: str) -> Optional[str]:
+    """平台 API 域名的重定向地址（未设置时为 None）"""
+    base = os.getenv(f"GEO_{name.upper()}_API_BASE")
+    return base.rstrip("/") if base else None
+
+
+class PlatformSession(requests.Session):
+    """带默认超时、熔断与延迟统计的 Session"""
+
+    def __init__(self, timeout: Tuple[float, float] = DEFAULT_TIMEOUT, name: str = "default"):
+        super().__init__()
+        self.name = name
+        self.default_timeout = timeout
+        retry = PlatformRetry(
+            total=MAX_RETRIES,
+            backoff_factor=BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs["timeout"] = bounded_timeout(kwargs.get("timeout") or self.default_timeout)
+        origin = API_ORIGINS.get(self.name)
+        base = api_base_override(self.name) if origin else None
+        if base and url.startswith(origin):
+            url = base + url[len(origin):]
+        breaker = get_breaker(LatencyStats.endpoint_key(method, url))
+        breaker.before_call()
+        start = time.perf_counter()
+        _attempts.start, _attempts.longest = start, 0.0
+        status = None
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            _end_attempt()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            latency_stats.record(method, url, elapsed_ms, status is not None and status < 400)
+            # 4xx（含重试后仍 429）是请求本身的问题，只有网络错误和 5xx 计入熔断；
+            # 慢调用看最长的单次尝试，退避和 Retry-After 等待不算
+            breaker.record(status is not None and status < 500, _attempts.longest * 1000)
+
+
+_sessions: Dict[str, PlatformSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(name: str = "default", timeout: Optional[Tuple[float, float]] = None) -> PlatformSession:
+    """
+    获取共享会话（同名复用同一个连接池）
+
+    Args:
+        name: 会话名，一般按平台区分（feishu/notion）
+        timeout: 首次创建时的默认超时 (connect, read)
+
+    Returns:
+        PlatformSession
+    """
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = PlatformSession(timeout or DEFAULT_TIMEOUT, name)
+            _sessions[name] = session
+        return session
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+后台任务队列
+SQLite 持久化的本地任务队列 + 独立的 worker 进程池
+
+Streamlit 页面只负责入队和轮询状态，流水线/压力测试/对比报告在 worker 进程中执行，
+刷新页面或多人同时操作都不会中断或阻塞正在运行的任务。
+
+用法：
+    python job_queue.py worker --workers 2   # 启动 worker 进程池
+    python job_queue.py list                 # 查看最近任务
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlite_store import OUTPUT_ROOT, connect
+from stage_stream import PipelineCancelled, request_cancel, is_cancelled, clear_cancel, reset as reset_stream
+
+
+DB_PATH = Path(os.getenv("GEO_JOB_DB", str(OUTPUT_ROOT / ".jobs.sqlite")))
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+STATUS_LABELS = {
+    QUEUED: "⏳ 排队中",
+    RUNNING: "🏃 执行中",
+    SUCCEEDED: "✅ 已完成",
+    FAILED: "❌ 失败",
+    CANCELLED: "🛑 已取消",
+}
+
+POLL_INTERVAL = 1.0          # worker 空闲时的轮询间隔（秒）
+HEARTBEAT_TIMEOUT = 60       # worker 心跳超时（秒），超时视为进程已退出
+MAX_ATTEMPTS = 2             # 因 worker 崩溃被重新排队的最多次数
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+# ============ 数据库访问 ============
+
+def _connect():
+    """打开一个短连接（每次操作独立连接，跨进程安全）"""
+    return connect(DB_PATH, _SCHEMA)
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def enqueue(kind: str, params: Dict[str, Any]) -> str:
+    """
+    提交任务
+
+    Args:
+        kind: 任务类型，见 JOB_HANDLERS
+        params: 任务参数（需可 JSON 序列化）
+
+    Returns:
+        job_id: 任务ID
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"未知的任务类型: {kind}")
+    job_id = uuid.uuid4().hex[:12]
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, params, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(params, ensure_ascii=False), QUEUED, time.time())
+        )
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """获取单个任务"""
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(kind: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """按创建时间倒序列出任务"""
+    sql = "SELECT * FROM jobs"
+    args: List[Any] = []
+    if kind:
+        sql += " WHERE kind = ?"
+        args.append(kind)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    args.append(limit)
+    with _connect() as conn:
+        rows = conn.execute(sql, args).fetchall()
+    return [_row_to_job(r) for r in rows]
+
+
+def active_job_for_client(client_name: str, kind: str = "pipeline") -> Optional[Dict[str, Any]]:
+    """该客户排队中或执行中的任务（供其他进程判断客户目录是否正被流水线写入），没有时返回 None"""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE kind = ? AND status IN (?, ?)", (kind, QUEUED, RUNNING)
+        ).fetchall()
+    for row in rows:
+        job = _row_to_job(row)
+        if job["params"].get("client_name") == client_name:
+            return job
+    return None
+
+
+def update_progress(job_id: str, progress: float, message: str = ""):
+    """更新任务进度（0~1）"""
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET progress = ?, message = ? WHERE id = ?",
+            (max(0.0, min(1.0, progress)), message, job_id)
+        )
+
+
+def cancel_job(job_id: str) -> bool:
+    """
+    取消任务：排队中的直接取消；执行中的流水线写入取消标记，由流水线在下一个 token 处中止
+
+    Returns:
+        是否已发出取消
+    """
+    job = get_job(job_id)
+    if job is None:
+        return False
+    if job["status"] == QUEUED:
+        with _connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+        return True
+    if job["status"] == RUNNING and job["kind"] == "pipeline":
+        request_cancel(job["params"]["client_folder"])
+        update_progress(job_id, job["progress"], "正在取消...")
+        return True
+    return False
+
+
+def _finish(job_id: str, status: str, result: Any = None, error: str = None):
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, progress = MAX(progress, ?), result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (
+                status,
+                1.0 if status == SUCCEEDED else 0.0,
+                json.dumps(result, ensure_ascii=False) if result is not None else None,
+                error,
+                time.time(),
+                job_id,
+            )
+        )
+
+
+def _claim_next(worker_id: str) -> Optional[Dict[str, Any]]:
+    """原子地领取最早排队的任务"""
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, worker_id, time.time(), row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return _row_to_job(row)
+
+
+def _heartbeat(worker_id: str):
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO workers (id, pid, heartbeat) VALUES (?, ?, ?)",
+            (worker_id, os.getpid(), time.time())
+        )
+
+
+def _recover_orphans():
+    """把心跳超时的 worker 手上的任务重新排队（超过重试次数则标记失败）"""
+    deadline = time.time() - HEARTBEAT_TIMEOUT
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        dead = [r["id"] for r in conn.execute("SELECT id FROM workers WHERE heartbeat < ?", (deadline,))]
+        for worker_id in dead:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                "WHERE worker = ? AND status = ? AND attempts >= ?",
+                (FAILED, "worker 进程异常退出", time.time(), worker_id, RUNNING, MAX_ATTEMPTS)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE worker = ? AND status = ?",
+                (QUEUED, worker_id, RUNNING)
+            )
+            conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+        conn.execute("COMMIT")
+
+
+def active_worker_count() -> int:
+    """心跳正常的 worker 数量"""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (time.time() - HEARTBEAT_TIMEOUT,)
+        ).fetchone()
+    return row[0]
+
+
+def ensure_worker_running(workers: int = 2) -> bool:
+    """
+    确保后台 worker 已启动（没有存活 worker 时拉起一个独立进程池）
+
+    Returns:
+        是否新启动了 worker
+    """
+    if active_worker_count() > 0:
+        return False
+    subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "worker", "--workers", str(workers)],
+        cwd=str(Path(__file__).parent),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    # 先写一次占位心跳，避免连续点击时重复拉起
+    _heartbeat(f"launcher-{os.getpid()}")
+    return True
+
+
+# ============ 任务处理函数 ============
+# 每个处理函数签名：handler(params, progress) -> result(dict)
+# progress(fraction, message) 用于上报进度
+
+def _pipeline_job(params: Dict[str, Any], progress: Callable[[float, str], None]) -> Dict[str, Any]:
+    """新建项目：D→B→C→A 流水线 + PPT，平台同步事件写入发件箱（可通过 cancel_job 中途取消）"""
+    client_folder = Path(params["client_folder"])
+    reset_stream(client_folder)
+    try:
+        return _run_pipeline_job(params, progress, client_folder)
+    finally:
+        clear_cancel(client_folder)
+
+
+def _run_pipeline_job(params: Dict[str, Any], progress: Callable[[float, str], None],
+                      client_folder: Path) -> Dict[str, Any]:
+    from wrapper import run_pipeline
+    from ppt_generator import generate_ppt
+    from platform_adapter import StageStatus
+
+    warnings: List[str] = []
+    client_name = params["client_name"]
+    project_key = None
+    manager = None
+
+    # ===== 平台集成：登记项目（写入发件箱，由后台派发线程同步到平台，不阻塞流水线） =====
+    config_path = Path(__file__).parent.parent / "config" / "platform_config.yaml"
+    if params.get("project_data") and config_path.exists():
+        try:
+            from platform_integration_manager import get_platform_manager
+            from platform_outbox import start_dispatcher
+            manager = get_platform_manager()
+            project_key = manager.sync_new_project(params["project_data"], params.get("project_key"))
+            start_dispatcher()
+        except Exception as e:
+            warnings.append(f"平台同步登记失败: {e}（不影响流水线执行）")
+
+    if is_cancelled(client_folder):
+        raise PipelineCancelled("流水线已取消")
+    progress(0.1, "正在执行 D→B→C→A 流水线...")
+    run_pipeline(client_name, params["input_path"], structured_d=params.get("structured_d", False))
+    if is_cancelled(client_folder):
+        raise PipelineCancelled("流水线已取消")
+
+    progress(0.85, "正在生成 PPT...")
+    generate_ppt(client_name, str(client_folder))
+
+    if project_key and manager:
+        try:
+            manager.sync_stages_progress(project_key, ["D", "B", "C", "A"], StageStatus.COMPLETED,
+                                         duration_minutes=2, client_name=client_name)
+            results = {
+                "d_matrix": str(client_folder / f"{client_name}_D_矩阵提取.md"),
+                "b_conversion": str(client_folder / f"{client_name}_B_转化路径.md"),
+                "c_quality": str(client_folder / f"{client_name}_C_质检暴改.md"),
+                "a_proposal": str(client_folder / f"{client_name}_A_商业提案.md"),
+            }
+            manager.sync_complete_project(project_key, client_name, results)
+        except Exception as e:
+            warnings.append(f"平台同步登记失败: {e}")
+
+    return {
+        "client_folder": str(client_folder),
+        "project_key": project_key,
+        "warnings": warnings,
+    }
+
+
+def _pressure_test_job(params: Dict[str, Any], progress: Callable[[float, str], None]) -> Dict[str, Any]:
+    """多引擎压力测试"""
+    from wrapper import run_pressure_test
+
+    progress(0.1, "正在以多角色发起攻击...")
+    report = run_pressure_test(params["client_name"], params["client_folder"], params["engines"])
+    return {"report": report}
+
+
+def _comparison_job(params: Dict[str, Any], progress: Callable[[float, str], None]) -> Dict[str, Any]:
+    """前后对比报告"""
+    from wrapper import generate_comparison_report
+
+    progress(0.1, "正在进行语义差异分析...")
+    report = generate_comparison_report(params["before"], params["after"], params["client_name"])
+    return {"report": report}
+
+
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], Callable[[float, str], None]], Dict[str, Any]]] = {
+    "pipeline": _pipeline_job,
+    "pressure_test": _pressure_test_job,
+    "comparison": _comparison_job,
+}
+
+
+# ============ Worker ============
+
+def run_job(job: Dict[str, Any]):
+    """执行单个已领取的任务"""
+    job_id = job["id"]
+    handler = JOB_HANDLERS.get(job["kind"])
+    if handler is None:
+        _finish(job_id, FAILED, error=f"未知的任务类型: {job['kind']}")
+        return
+
+    try:
+        result = handler(job["params"], lambda p, m="": update_progress(job_id, p, m))
+        _finish(job_id, SUCCEEDED, result=result)
+        print(f"✅ 任务完成: {job['kind']} {job_id}")
+    except PipelineCancelled as e:
+        _finish(job_id, CANCELLED, error=str(e))
+        print(f"🛑 任务已取消: {job['kind']} {job_id}")
+    except Exception as e:
+        _finish(job_id, FAILED, error=f"{e}\n{traceback.format_exc(limit=5)}")
+        print(f"❌ 任务失败: {job['kind']} {job_id} - {e}")
+
+
+def worker_loop(worker_id: str = None):
+    """单个 worker：心跳 + 领取任务 + 执行"""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    print(f"🛠️  worker 已启动: {worker_id}")
+    if (Path(__file__).parent.parent / "config" / "platform_config.yaml").exists():
+        # 顺带投递积压的平台同步事件（上次进程退出前未投递完的）
+        from platform_outbox import start_dispatcher
+        start_dispatcher()
+    last_recover = 0.0
+    while True:
+        _heartbeat(worker_id)
+        if time.time() - last_recover > HEARTBEAT_TIMEOUT / 2:
+            _recover_orphans()
+            last_recover = time.time()
+        job = _claim_next(worker_id)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        print(f"▶️  开始任务: {job['kind']} {job['id']}")
+        # 执行期间单独的线程维持心跳，避免长任务被误判为崩溃
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(HEARTBEAT_TIMEOUT / 3):
+                _heartbeat(worker_id)
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        try:
+            run_job(job)
+        finally:
+            stop.set()
+
+
+def run_workers(workers: int = 2):
+    """启动 worker 进程池，阻塞直到所有 worker 退出"""
+    procs = [multiprocessing.Process(target=worker_loop, daemon=False) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GEO 后台任务队列")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker_parser = sub.add_parser("worker", help="启动 worker 进程池")
+    worker_parser.add_argument("--workers", "-w", type=int, default=2, help="worker 进程数")
+    sub.add_parser("list", help="查看最近任务")
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        run_workers(args.workers)
+    else:
+        for job in list_jobs(limit=20):
+            created = datetime.fromtimestamp(job["created_at"]).strftime("%m-%d %H:%M")
+            print(f"{job['id']}  {created}  {job['kind']:<14} {STATUS_LABELS[job['status']]}  {job['message']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+Markdown → 文档块转换
+把阶段结果 markdown 解析为节点列表（标题/段落/列表/表格/代码/引用/分割线），
+再分别渲染为 Notion blocks、飞书 docx blocks 与 PPT 页面片段，并按各自 API 的单次请求上限分批。
+
+同一份内容只解析一次：解析结果按内容哈希缓存在进程内和 output/.ast_cache/ 下，
+PPT 生成、Notion / 飞书交付文档即使在不同进程中也共用同一次解析。
+
+用法：
+    from markdown_blocks import load_markdown, render
+    nodes = load_markdown("output/品牌A/品牌A_D_矩阵提取.md")
+    render(nodes, "notion") / render(nodes, "feishu") / render(nodes, "slides")
+
+节点格式：
+    {"type": "heading", "level": 1~6, "text": str}
+    {"type": "paragraph" | "quote", "text": str}
+    {"type": "bullet" | "ordered", "text": str, "depth": int}
+    {"type": "code", "language": str, "text": str}
+    {"type": "table", "rows": [[str, ...], ...]}      # 第一行为表头
+    {"type": "divider"}
+"""
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+from urllib.parse import quote
+
+from output_manifest import OUTPUT_ROOT
+
+
+# Notion API 限制
+NOTION_CHILDREN_LIMIT = 100        # 单次请求的子块数
+NOTION_BLOCKS_PER_REQUEST = 1000   # 单次请求的块总数（含表格行）
+NOTION_TEXT_LIMIT = 2000           # 单个 rich_text 的字符数
+
+# 飞书 docx 创建嵌套块（descendant）接口限制
+FEISHU_CHILDREN_LIMIT = 50
+FEISHU_BLOCKS_PER_REQUEST = 1000
+
+# 解析缓存
+AST_VERSION = 1                    # 节点格式或解析规则变化时递增，旧缓存自动失效
+AST_CACHE_DIR = Path(os.getenv("GEO_AST_CACHE", str(OUTPUT_ROOT / ".ast_cache")))
+AST_MEMORY_ENTRIES = 128           # 进程内保留的解析结果数
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET_RE = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+_ORDERED_RE = re.compile(r"^(\s*)\d+[.)]\s+(.*)$")
+_DIVIDER_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_INLINE_RE = re.compile(r"\*\*(.+?)\*\*|`([^`]+)`|\[([^\]]+)\]\(([^)\s]+)\)|(?<!\*)\*([^*]+)\*(?!\*)")
+
+
+# ============ 解析 ============
+
+def _split_row(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def parse_markdown(text: str) -> List[Dict[str, Any]]:
+    """解析 markdown 为节点列表"""
+    nodes: List[Dict[str, Any]] = []
+    paragraph: List[str] = []
+    lines = text.splitlines()
+    i = 0
+
+    def flush_paragraph():
+        if paragraph:
+            nodes.append({"type": "paragraph", "text": "\n".join(paragraph)})
+            paragraph.clear()
+
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+
+        if stripped.startswith("```"):
+            flush_paragraph()
+            language = stripped[3:].strip()
+            code_lines = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith("```"):
+                code_lines.append(lines[i])
+                i += 1
+            nodes.append({"type": "code", "language": language, "text": "\n".join(code_lines)})
+            i += 1
+            continue
+
+        if not stripped:
+            flush_paragraph()
+        elif stripped.startswith("|") and i + 1 < len(lines) and _TABLE_SEPARATOR_RE.match(lines[i + 1]):
+            flush_paragraph()
+            rows = [_split_row(line)]
+            i += 2
+            while i < len(lines) and lines[i].strip().startswith("|"):
+                rows.append(_split_row(lines[i]))
+                i += 1
+            width = max(len(r) for r in rows)
+            nodes.append({"type": "table", "rows": [r + [""] * (width - len(r)) for r in rows]})
+            continue
+        elif _HEADING_RE.match(stripped):
+            flush_paragraph()
+            m = _HEADING_RE.match(stripped)
+            nodes.append({"type": "heading", "level": len(m.group(1)), "text": m.group(2)})
+        elif _DIVIDER_RE.match(line):
+            flush_paragraph()
+            nodes.append({"type": "divider"})
+        elif _BULLET_RE.match(line):
+            flush_paragraph()
+            m = _BULLET_RE.match(line)
+            nodes.append({"type": "bullet", "text": m.group(2), "depth": len(m.group(1).expandtabs(4)) // 2})
+        elif _ORDERED_RE.match(line):
+            flush_paragraph()
+            m = _ORDERED_RE.match(line)
+            nodes.append({"type": "ordered", "text": m.group(2), "depth": len(m.group(1).expandtabs(4)) // 2})
+        elif stripped.startswith(">"):
+            flush_paragraph()
+            nodes.append({"type": "quote", "text": stripped.lstrip(">").strip()})
+        else:
+            paragraph.append(stripped)
+        i += 1
+
+    flush_paragraph()
+    return nodes
+
+
+def parse_inline(text: str) -> List[Dict[str, Any]]:
+    """
+    解析行内格式（粗体/斜体/行内代码/链接）
+
+    Returns:
+        [{"text", "bold", "italic", "code", "link"}]
+    """
+    runs = []
+    pos = 0
+    for m in _INLINE_RE.finditer(text):
+        if m.start() > pos:
+            runs.append({"text": text[pos:m.start()]})
+        bold, code, link_text, link_url, italic = m.groups()
+        if bold is not None:
+            runs.append({"text": bold, "bold": True})
+        elif code is not None:
+            runs.append({"text": code, "code": True})
+        elif link_text is not None:
+            runs.append({"text": link_text, "link": link_url})
+        else:
+            runs.append({"text": italic, "italic": True})
+        pos = m.end()
+    if pos < len(text):
+        runs.append({"text": text[pos:]})
+    return runs or [{"text": ""}]
+
+
+def plain_text(text: str) -> str:
+    """去掉行内格式标记后的纯文本"""
+    return "".join(run["text"] for run in parse_inline(text))
+
+
+# ============ 解析缓存 ============
+
+_ast_memory: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+_ast_lock = threading.Lock()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _ast_file(key: str) -> Path:
+    return AST_CACHE_DIR / f"v{AST_VERSION}" / key[:2] / f"{key}.json"
+
+
+def _remember(key: str, nodes: List[Dict[str, Any]]):
+    with _ast_lock:
+        _ast_memory[key] = nodes
+        _ast_memory.move_to_end(key)
+        while len(_ast_memory) > AST_MEMORY_ENTRIES:
+            _ast_memory.popitem(last=False)
+
+
+def parse_markdown_cached(text: str) -> List[Dict[str, Any]]:
+    """
+    按内容哈希缓存的 parse_markdown（进程内 LRU → 磁盘 → 解析）
+
+    返回的节点列表在多个调用方之间共享，只读，不要修改。
+    """
+    key = content_hash(text)
+    with _ast_lock:
+        nodes = _ast_memory.get(key)
+        if nodes is not None:
+            _ast_memory.move_to_end(key)
+            return nodes
+
+    cache_file = _ast_file(key)
+    try:
+        nodes = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        nodes = None
+    if nodes is None:
+        nodes = parse_markdown(text)
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再替换，并发进程不会读到半个文件
+            tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(nodes, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, cache_file)
+        except OSError as e:
+            print(f"⚠️ 写入解析缓存失败: {e}")
+    _remember(key, nodes)
+    return nodes
+
+
+def load_markdown(file_path) -> List[Dict[str, Any]]:
+    """读取 markdown 文件并返回（缓存的）节点列表"""
+    return parse_markdown_cached(Path(file_path).read_text(encoding="utf-8"))
+
+
+# ============ Notion 渲染 ============
+
+def _notion_rich_text(text: str) -> List[Dict[str, Any]]:
+    rich_text = []
+    for run in parse_inline(text):
+        content = run["text"]
+        # 超长文本按 Notion 单段上限切分
+        for start in range(0, max(len(content), 1), NOTION_TEXT_LIMIT):
+            item: Dict[str, Any] = {"type": "text", "text": {"content": content[start:start + NOTION_TEXT_LIMIT]}}
+            if run.get("link", "").startswith("http"):
+                item["text"]["link"] = {"url": run["link"]}
+            annotations = {k: True for k in ("bold", "italic", "code") if run.get(k)}
+            if annotations:
+                item["annotations"] = annotations
+            rich_text.append(item)
+    return rich_text[:100]
+
+
+# Notion code 块只接受固定的语言枚举，其它值整个请求会被拒绝
+NOTION_CODE_LANGUAGES = {
+    "abap", "arduino", "bash", "basic", "c", "clojure", "coffeescript", "c++", "c#", "css", "dart",
+    "diff", "docker", "elixir", "elm", "erlang", "flow", "fortran", "f#", "gherkin", "glsl", "go",
+    "graphql", "groovy", "haskell", "html", "java", "javascript", "json", "julia", "kotlin", "latex",
+    "less", "lisp", "livescript", "lua", "makefile", "markdown", "markup", "matlab", "mermaid", "nix",
+    "objective-c", "ocaml", "pascal", "perl", "php", "plain text", "powershell", "prolog", "protobuf",
+    "python", "r", "reason", "ruby", "rust", "sass", "scala", "scheme", "scss", "shell", "sql",
+    "swift", "typescript", "vb.net", "verilog", "vhdl", "visual basic", "webassembly", "xml", "yaml",
+    "java/c/c++/c#",
+}
+
+# 常见的代码围栏语言写法 → Notion 枚举
+_NOTION_LANGUAGE_ALIASES = {
+    "text": "plain text", "txt": "plain text", "plain": "plain text", "plaintext": "plain text",
+    "py": "python", "python3": "python", "js": "javascript", "jsx": "javascript", "node": "javascript",
+    "ts": "typescript", "tsx": "typescript", "sh": "shell", "zsh": "shell", "console": "shell",
+    "shell-session": "shell", "ps1": "powershell", "pwsh": "powershell", "yml": "yaml", "md": "markdown",
+    "cpp": "c++", "cc": "c++", "cs": "c#", "csharp": "c#", "fsharp": "f#", "golang": "go",
+    "rb": "ruby", "rs": "rust", "kt": "kotlin", "hs": "haskell", "ex": "elixir", "exs": "elixir",
+    "jl": "julia", "objc": "objective-c", "tex": "latex", "make": "makefile", "dockerfile": "docker",
+    "proto": "protobuf", "patch": "diff", "jsonc": "json", "json5": "json", "htm": "html",
+    "vb": "visual basic", "wasm": "webassembly",
+}
+
+
+def _notion_language(tag: str) -> str:
+    """代码围栏语言标记 → Notion 语言枚举，未知语言按纯文本处理"""
+    parts = tag.split()
+    if not parts:
+        return "plain text"
+    language = parts[0].lower()
+    language = _NOTION_LANGUAGE_ALIASES.get(language, language)
+    return language if language in NOTION_CODE_LANGUAGES else "plain text"
+
+
+def _notion_block(block_type: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {"object": "block", "type": block_type, block_type: body}
+
+
+def to_notion_blocks(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """节点 → Notion blocks（嵌套列表展平；表格行作为 table 的 children）"""
+    blocks = []
+    for node in nodes:
+        kind = node["type"]
+        if kind == "heading":
+            # Notion 只有三级标题
+            heading = f"heading_{min(node['level'], 3)}"
+            blocks.append(_notion_block(heading, {"rich_text": _notion_rich_text(node["text"])}))
+        elif kind == "paragraph":
+            blocks.append(_notion_block("paragraph", {"rich_text": _notion_rich_text(node["text"])}))
+        elif kind == "quote":
+            blocks.append(_notion_block("quote", {"rich_text": _notion_rich_text(node["text"])}))
+        elif kind == "bullet":
+            blocks.append(_notion_block("bulleted_list_item", {"rich_text": _notion_rich_text(node["text"])}))
+        elif kind == "ordered":
+            blocks.append(_notion_block("numbered_list_item", {"rich_text": _notion_rich_text(node["text"])}))
+        elif kind == "code":
+            blocks.append(_notion_block("code", {
+                "rich_text": [{"type": "text", "text": {"content": node["text"][i:i + NOTION_TEXT_LIMIT]}}
+                              for i in range(0, max(len(node["text"]), 1), NOTION_TEXT_LIMIT)],
+                "language": _notion_language(node["language"])
+            }))
+        elif kind == "divider":
+            blocks.append(_notion_block("divider", {}))
+        elif kind == "table":
+            rows = [
+                _notion_block("table_row", {"cells": [_notion_rich_text(cell) for cell in row]})
+                for row in node["rows"]
+            ]
+            blocks.append(_notion_block("table", {
+                "table_width": len(node["rows"][0]),
+                "has_column_header": True,
+                "has_row_header": False,
+                "children": rows
+            }))
+    return blocks
+
+
+def _notion_weight(block: Dict[str, Any]) -> int:
+    return 1 + len(block.get(block["type"], {}).get("children", []))
+
+
+def notion_batches(blocks: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    """
+    按 Notion 单次请求上限分批（≤100 个子块且含表格行 ≤1000 块）
+
+    超过 100 行的表格只在首批带前 100 行，其余行放在 block["_overflow_rows"]，
+    由调用方在拿到表格块ID后追加。
+    """
+    batch: List[Dict[str, Any]] = []
+    weight = 0
+    for block in blocks:
+        if block["type"] == "table":
+            rows = block["table"]["children"]
+            if len(rows) > NOTION_CHILDREN_LIMIT:
+                block = {**block, "table": {**block["table"], "children": rows[:NOTION_CHILDREN_LIMIT]},
+                         "_overflow_rows": rows[NOTION_CHILDREN_LIMIT:]}
+        w = _notion_weight(block)
+        if batch and (len(batch) >= NOTION_CHILDREN_LIMIT or weight + w > NOTION_BLOCKS_PER_REQUEST):
+            yield batch
+            batch, weight = [], 0
+        batch.append(block)
+        weight += w
+    if batch:
+        yield batch
+
+
+# ============ 飞书 docx 渲染 ============
+
+# docx block_type
+_FEISHU_TEXT = 2
+_FEISHU_HEADING_BASE = 2          # heading1 = 3 ... heading9 = 11
+_FEISHU_BULLET = 12
+_FEISHU_ORDERED = 13
+_FEISHU_CODE = 14
+_FEISHU_QUOTE = 15
+_FEISHU_DIVIDER = 22
+_FEISHU_TABLE = 31
+_FEISHU_TABLE_CELL = 32
+_FEISHU_CODE_PLAIN_TEXT = 1
+
+
+def _feishu_elements(text: str) -> List[Dict[str, Any]]:
+    elements = []
+    for run in parse_inline(text):
+        style: Dict[str, Any] = {}
+        if run.get("bold"):
+            style["bold"] = True
+        if run.get("italic"):
+            style["italic"] = True
+        if run.get("code"):
+            style["inline_code"] = True
+        if run.get("link", "").startswith("http"):
+            style["link"] = {"url": quote(run["link"], safe="")}
+        element: Dict[str, Any] = {"text_run": {"content": run["text"]}}
+        if style:
+            element["text_run"]["text_element_style"] = style
+        elements.append(element)
+    return elements
+
+
+def to_feishu_blocks(nodes: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    节点 → 飞书 docx 块（descendant 接口格式）
+
+    Returns:
+        每个顶层块一组：[顶层块, 其全部后代块...]，块之间用临时 block_id / children 关联
+    """
+    ids = itertools.count()
+
+    def new_id() -> str:
+        return f"md_{next(ids)}"
+
+    def text_block(block_type: int, key: str, text: str, **extra) -> Dict[str, Any]:
+        return {"block_id": new_id(), "block_type": block_type,
+                key: {"elements": _feishu_elements(text), **extra}, "children": []}
+
+    units = []
+    for node in nodes:
+        kind = node["type"]
+        if kind == "heading":
+            level = min(node["level"], 9)
+            units.append([text_block(_FEISHU_HEADING_BASE + level, f"heading{level}", node["text"])])
+        elif kind == "paragraph":
+            units.append([text_block(_FEISHU_TEXT, "text", node["text"])])
+        elif kind == "quote":
+            units.append([text_block(_FEISHU_QUOTE, "quote", node["text"])])
+        elif kind == "bullet":
+            units.append([text_block(_FEISHU_BULLET, "bullet", node["text"])])
+        elif kind == "ordered":
+            units.append([text_block(_FEISHU_ORDERED, "ordered", node["text"])])
+        elif kind == "code":
+            units.append([{
+                "block_id": new_id(), "block_type": _FEISHU_CODE,
+                "code": {"elements": [{"text_run": {"content": node["text"]}}],
+                         "style": {"language": _FEISHU_CODE_PLAIN_TEXT}},
+                "children": []
+            }])
+        elif kind == "divider":
+            units.append([{"block_id": new_id(), "block_type": _FEISHU_DIVIDER, "divider": {}, "children": []}])
+        elif kind == "table":
+            rows = node["rows"]
+            table = {
+                "block_id": new_id(), "block_type": _FEISHU_TABLE,
+                "table": {"property": {"row_size": len(rows), "column_size": len(rows[0]), "header_row": True}},
+                "children": []
+            }
+            unit = [table]
+            for row in rows:
+                for cell in row:
+                    content = text_block(_FEISHU_TEXT, "text", cell)
+                    cell_block = {"block_id": new_id(), "block_type": _FEISHU_TABLE_CELL, "table_cell": {},
+                                  "children": [content["block_id"]]}
+                    table["children"].append(cell_block["block_id"])
+                    unit.extend([cell_block, content])
+            units.append(unit)
+    return units
+
+
+def feishu_batches(units: List[List[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """
+    按飞书 descendant 接口上限分批
+
+    Yields:
+        {"children_id": [顶层块ID...], "descendants": [全部块...]}，可直接作为请求体（再加 index）
+    """
+    children_id: List[str] = []
+    descendants: List[Dict[str, Any]] = []
+    for unit in units:
+        if children_id and (len(children_id) >= FEISHU_CHILDREN_LIMIT
+                            or len(descendants) + len(unit) > FEISHU_BLOCKS_PER_REQUEST):
+            yield {"children_id": children_id, "descendants": descendants}
+            children_id, descendants = [], []
+        children_id.append(unit[0]["block_id"])
+        descendants.extend(unit)
+    if children_id:
+        yield {"children_id": children_id, "descendants": descendants}
+
+
+# ============ PPT 页面片段 ============
+
+def to_slide_fragments(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    节点 → PPT 页面片段（不依赖 python-pptx，由 ppt_generator 排版）
+
+    一级标题为章节页，二级标题开始新的内容页，其余节点作为当前内容页的段落；
+    列表按缩进加一级，表格每行一段（单元格以 " | " 连接），分割线忽略。
+
+    Returns:
+        [{"kind": "section" | "content", "title": str, "paragraphs": [[text, level], ...]}]
+    """
+    slides: List[Dict[str, Any]] = []
+    current = None
+
+    def content_slide() -> Dict[str, Any]:
+        nonlocal current
+        if current is None or current["kind"] != "content":
+            # 标题前的内容放在概览页；章节页后的内容沿用章节标题
+            current = {"kind": "content", "title": current["title"] if current else "Overview", "paragraphs": []}
+            slides.append(current)
+        return current
+
+    for node in nodes:
+        kind = node["type"]
+        if kind == "heading" and node["level"] <= 2:
+            current = {"kind": "section" if node["level"] == 1 else "content",
+                       "title": plain_text(node["text"]), "paragraphs": []}
+            slides.append(current)
+        elif kind in ("heading", "quote"):
+            content_slide()["paragraphs"].append([plain_text(node["text"]), 0])
+        elif kind == "paragraph":
+            content_slide()["paragraphs"].extend([plain_text(line), 0] for line in node["text"].split("\n"))
+        elif kind in ("bullet", "ordered"):
+            content_slide()["paragraphs"].append([plain_text(node["text"]), min(node["depth"] + 1, 4)])
+        elif kind == "code":
+            content_slide()["paragraphs"].extend([line, 1] for line in node["text"].split("\n") if line.strip())
+        elif kind == "table":
+            content_slide()["paragraphs"].extend(
+                [" | ".join(plain_text(cell) for cell in row), 0 if i == 0 else 1]
+                for i, row in enumerate(node["rows"])
+            )
+    return slides
+
+
+# ============ 渲染器注册 ============
+
+RENDERERS: Dict[str, Callable[[List[Dict[str, Any]]], Any]] = {
+    "notion": to_notion_blocks,
+    "feishu": to_feishu_blocks,
+    "slides": to_slide_fragments,
+}
+
+
+def register_renderer(name: str, renderer: Callable[[List[Dict[str, Any]]], Any]):
+    """注册新的交付格式（renderer 接收节点列表，不得修改节点）"""
+    RENDERERS[name] = renderer
+
+
+def render(nodes: List[Dict[str, Any]], fmt: str) -> Any:
+    """用指定格式的渲染器渲染节点列表"""
+    if fmt not in RENDERERS:
+        raise ValueError(f"未知的渲染格式: {fmt}（可用: {', '.join(RENDERERS)}）")
+    return RENDERERS[fmt](nodes)
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+通知聚合
+同一项目在 window 秒内的进度事件合并成一张卡片（显示全部阶段的最新状态），
+支持更新已发送卡片的渠道会原地更新同一张卡片，而不是每个阶段刷一条新消息。
+
+每个 webhook/群共享一个滑动窗口限流器（飞书自定义机器人约 100 次/分钟）：
+额度不足时低优先级的进度卡片顺延到下一个窗口继续合并，完成通知和告警优先占用额度。
+
+限流记录和卡片状态（各阶段进度、已发送卡片的 message_id）都存放在本地 SQLite 中，
+所有 worker 进程、机器人进程共用同一份：额度按渠道全局计算，同一项目后续事件由哪个进程投递
+都更新同一张卡片。事件写入即落盘，由各进程的后台线程在窗口到期后发送，进程异常退出时
+未发出的卡片由其他进程（或重启后的进程）接着发送。
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from sqlite_store import OUTPUT_ROOT, connect
+
+
+DB_PATH = Path(os.getenv("GEO_NOTIFY_DB", str(OUTPUT_ROOT / ".notifications.sqlite")))
+
+DEFAULT_WINDOW = 5.0          # 同一项目进度事件的合并窗口（秒）
+DEFAULT_RATE_PER_MINUTE = 90  # 留一点余量，低于飞书自定义机器人 100 次/分钟
+HIGH_PRIORITY_RESERVE = 10    # 为完成通知/告警保留的额度，进度卡片不会用掉
+HIGH_PRIORITY_TIMEOUT = 60    # 高优先级消息等待额度的最长时间（秒）
+SEND_LEASE = HIGH_PRIORITY_TIMEOUT + 60   # 发送中的卡片超过该时间未完成视为发送进程已退出
+POLL_INTERVAL = 0.5           # 后台线程检查到期卡片的间隔（秒）
+SEND_WORKERS = 4              # 每个进程同时发送的卡片数
+
+# 事件优先级
+LOW = "low"
+HIGH = "high"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    channel TEXT NOT NULL,
+    sent_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sends_channel ON sends(channel, sent_at);
+CREATE TABLE IF NOT EXISTS cards (
+    channel TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    title TEXT,
+    stages TEXT NOT NULL DEFAULT '{}',
+    doc_url TEXT,
+    completed INTEGER NOT NULL DEFAULT 0,
+    message_id TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    sent_version INTEGER NOT NULL DEFAULT 0,
+    priority TEXT NOT NULL DEFAULT 'low',
+    due_at REAL,
+    lease_until REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (channel, project_id)
+);
+CREATE INDEX IF NOT EXISTS idx_cards_due ON cards(channel, due_at);
+"""
+
+
+def _connect():
+    return connect(DB_PATH, _SCHEMA)
+
+
+class SlidingWindowLimiter:
+    """滑动窗口限流：任意 60 秒内最多 rate 次（按渠道记录在 SQLite 中，跨进程共享）"""
+
+    def __init__(self, channel: str, rate: int, period: float = 60.0):
+        self.channel = channel
+        self.rate = rate
+        self.period = period
+
+    def try_acquire(self, reserve: int = 0) -> bool:
+        """尝试占用一次额度；reserve 为需要留给高优先级的额度"""
+        now = time.time()
+        with _connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM sends WHERE channel = ? AND sent_at <= ?", (self.channel, now - self.period))
+            used = conn.execute("SELECT COUNT(*) FROM sends WHERE channel = ?", (self.channel,)).fetchone()[0]
+            if used + reserve >= self.rate:
+                conn.execute("COMMIT")
+                return False
+            conn.execute("INSERT INTO sends (channel, sent_at) VALUES (?, ?)", (self.channel, now))
+            conn.execute("COMMIT")
+            return True
+
+    def wait_time(self) -> float:
+        """距离下一个额度释放的秒数"""
+        with _connect() as conn:
+            oldest = conn.execute("SELECT MIN(sent_at) FROM sends WHERE channel = ?", (self.channel,)).fetchone()[0]
+        if oldest is None:
+            return 0.0
+        return max(0.0, self.period - (time.time() - oldest))
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire():
+            wait = self.wait_time()
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(max(wait, 0.05))
+        return True
+
+
+_limiters: Dict[str, SlidingWindowLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(channel: str, rate_per_minute: int = DEFAULT_RATE_PER_MINUTE) -> SlidingWindowLimiter:
+    """每个 webhook/群共享一个限流器"""
+    with _limiters_lock:
+        limiter = _limiters.get(channel)
+        if limiter is None:
+            limiter = SlidingWindowLimiter(channel, rate_per_minute)
+            _limiters[channel] = limiter
+        return limiter
+
+
+# ============ 后台发送 ============
+
+_aggregators: Dict[str, "NotificationAggregator"] = {}   # 渠道 -> 本进程最近创建的聚合器
+_poller: Optional[threading.Thread] = None
+_poller_lock = threading.Lock()
+_send_executor = ThreadPoolExecutor(max_workers=SEND_WORKERS, thread_name_prefix="notify")
+
+
+def _register(aggregator: "NotificationAggregator"):
+    """登记聚合器并确保本进程的后台发送线程在运行"""
+    global _poller
+    with _poller_lock:
+        _aggregators[aggregator.channel] = aggregator
+        if _poller is None or not _poller.is_alive():
+            _poller = threading.Thread(target=_poll_loop, name="notify-poller", daemon=True)
+            _poller.start()
+
+
+def _poll_loop():
+    while True:
+        time.sleep(POLL_INTERVAL)
+        with _poller_lock:
+            aggregators = list(_aggregators.values())
+        for aggregator in aggregators:
+            try:
+                for project_id in aggregator.due_projects():
+                    _send_executor.submit(aggregator._flush_project, project_id)
+            except Exception as e:
+                print(f"⚠️ 检查待发送通知失败: {e}")
+
+
+class NotificationAggregator:
+    """
+    按项目合并进度通知
+
+    Args:
+        channel: 限流与卡片状态的维度（webhook URL 或群ID）
+        send_card: send_card(card) -> message_id；渠道不支持更新时成功返回 ""，失败返回 False
+        update_card: update_card(message_id, card) -> bool，可选
+        render_card: render_card(state_dict) -> card
+        window: 合并窗口（秒）
+    """
+
+    def __init__(self, channel: str, send_card: Callable[[Dict[str, Any]], Union[str, bool]],
+                 render_card: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 update_card: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
+                 window: float = DEFAULT_WINDOW, rate_per_minute: int = DEFAULT_RATE_PER_MINUTE):
+        self.channel = channel
+        self.send_card = send_card
+        self.update_card = update_card
+        self.render_card = render_card
+        self.window = window
+        self.limiter = get_limiter(channel, rate_per_minute)
+        self.dropped = 0    # 因限流等待超时而放弃的即时消息数（send_now）
+        self.deferred = 0   # 因限流等待超时而顺延重试的项目卡片数
+        _register(self)
+
+    def progress(self, project_id: str, stage: str, status: str, message: str = "", title: Optional[str] = None):
+        """记录阶段进度（低优先级，写入后立即落盘，合并窗口结束时发送）"""
+        now = time.time()
+        with _connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT stages FROM cards WHERE channel = ? AND project_id = ?", (self.channel, project_id)
+            ).fetchone()
+            stages = json.loads(row["stages"]) if row else {}   # 保持阶段首次出现的顺序
+            stages[stage] = {"status": status, "message": message}
+            conn.execute(
+                "INSERT INTO cards (channel, project_id, title, stages, version, due_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT(channel, project_id) DO UPDATE SET "
+                "title = COALESCE(excluded.title, title), stages = excluded.stages, version = version + 1, "
+                "due_at = COALESCE(due_at, excluded.due_at), updated_at = excluded.updated_at",
+                (self.channel, project_id, title, json.dumps(stages, ensure_ascii=False), now + self.window, now)
+            )
+            conn.execute("COMMIT")
+
+    def complete(self, project_id: str, title: str, doc_url: str):
+        """项目完成（高优先级，立即发送，与进度合并为同一张卡片）"""
+        now = time.time()
+        with _connect() as conn:
+            conn.execute(
+                "INSERT INTO cards (channel, project_id, title, doc_url, completed, version, priority, due_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 1, 1, ?, ?, ?) "
+                "ON CONFLICT(channel, project_id) DO UPDATE SET "
+                "title = excluded.title, doc_url = excluded.doc_url, completed = 1, version = version + 1, "
+                "priority = excluded.priority, due_at = excluded.due_at, updated_at = excluded.updated_at",
+                (self.channel, project_id, title, doc_url, HIGH, now, now)
+            )
+        self._flush_project(project_id, HIGH)
+
+    def send_now(self, card: Dict[str, Any]) -> bool:
+        """不参与合并的高优先级消息（告警等）"""
+        if not self.limiter.acquire(HIGH_PRIORITY_TIMEOUT):
+            self.dropped += 1
+            return False
+        try:
+            return self.send_card(card) is not False
+        except Exception as e:
+            print(f"⚠️ 通知发送失败: {e}")
+            return False
+
+    def flush(self):
+        """立即发送该渠道所有待合并的卡片（进程退出前调用）"""
+        with _connect() as conn:
+            rows = conn.execute(
+                "SELECT project_id FROM cards WHERE channel = ? AND version > sent_version", (self.channel,)
+            ).fetchall()
+        for row in rows:
+            self._flush_project(row["project_id"], HIGH)
+
+    def due_projects(self) -> List[str]:
+        """合并窗口已到期、等待发送的项目"""
+        now = time.time()
+        with _connect() as conn:
+            rows = conn.execute(
+                "SELECT project_id FROM cards WHERE channel = ? AND version > sent_version AND due_at <= ? "
+                "AND (lease_until IS NULL OR lease_until < ?)",
+                (self.channel, now, now)
+            ).fetchall()
+        return [row["project_id"] for row in rows]
+
+    def _claim(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """领取一张待发送的卡片（其他进程正在发送时返回 None）"""
+        now = time.time()
+        with _connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM cards WHERE channel = ? AND project_id = ? AND version > sent_version "
+                "AND (lease_until IS NULL OR lease_until < ?)",
+                (self.channel, project_id, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE cards SET lease_until = ? WHERE channel = ? AND project_id = ?",
+                    (now + SEND_LEASE, self.channel, project_id)
+                )
+            conn.execute("COMMIT")
+        return dict(row) if row else None
+
+    def _release(self, project_id: str, delay: float):
+        """发送失败或等不到额度：delay 秒后连同新事件一起重试"""
+        with _connect() as conn:
+            conn.execute(
+                "UPDATE cards SET lease_until = NULL, due_at = ? WHERE channel = ? AND project_id = ?",
+                (time.time() + delay, self.channel, project_id)
+            )
+
+    def _flush_project(self, project_id: str, priority: Optional[str] = None):
+        state = self._claim(project_id)
+        if state is None:
+            return
+        priority = priority or state["priority"]
+        if priority == LOW and not self.limiter.try_acquire(reserve=HIGH_PRIORITY_RESERVE):
+            # 额度紧张：顺延，期间到达的事件继续合并进同一张卡片
+            self._release(project_id, max(self.limiter.wait_time(), self.window))
+            return
+        if priority == HIGH and not self.limiter.acquire(HIGH_PRIORITY_TIMEOUT):
+            print(f"⚠️ 通知额度等待超时，稍后重试: {project_id}")
+            self.deferred += 1
+            self._release(project_id, self.window)
+            return
+
+        card = self.render_card({
+            "project_id": project_id,
+            "title": state["title"],
+            "stages": json.loads(state["stages"]),
+            "doc_url": state["doc_url"],
+            "completed": bool(state["completed"]),
+        })
+        message_id = state["message_id"]
+        try:
+            if message_id and self.update_card and self.update_card(message_id, card):
+                new_id: Union[str, bool] = message_id
+            else:
+                new_id = self.send_card(card)
+        except Exception as e:
+            # 网络错误或接口熔断中，与返回 False 一样按失败处理
+            print(f"⚠️ 进度卡片发送失败: {e}")
+            new_id = False
+        if new_id is False:
+            self._release(project_id, self.window)
+            return
+
+        now = time.time()
+        with _connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # 发送期间到达的新事件（version 已变大）在下个窗口再发一次
+            conn.execute(
+                "UPDATE cards SET sent_version = ?, message_id = COALESCE(?, message_id), lease_until = NULL, "
+                "due_at = CASE WHEN version > ? THEN ? ELSE NULL END WHERE channel = ? AND project_id = ?",
+                (state["version"], new_id or None, state["version"], now + self.window, self.channel, project_id)
+            )
+            # 已完成且已发出的项目不会再有进度，释放状态
+            conn.execute(
+                "DELETE FROM cards WHERE channel = ? AND project_id = ? AND completed = 1 AND version = sent_version",
+                (self.channel, project_id)
+            )
+            conn.execute("COMMIT")
+
+
+def render_progress_card(state: Dict[str, Any]) -> Dict[str, Any]:
+    """渲染合并后的项目进度卡片（飞书 interactive card）"""
+    lines: List[str] = []
+    for stage, info in state["stages"].items():
+        line = f"**{stage}**：{info['status']}"
+        if info.get("message"):
+            line += f"　{info['message']}"
+        lines.append(line)
+
+    completed = state["completed"]
+    if completed:
+        lines.append("\n所有阶段已完成，请查看交付文档。")
+    elements: List[Dict[str, Any]] = [{
+        "tag": "div",
+        "text": {"tag": "lark_md", "content": "\n".join(lines).strip() or "项目已创建"}
+    }]
+    if completed and state.get("doc_url"):
+        elements.append({
+            "tag": "action",
+            "actions": [{
+                "tag": "button",
+                "text": {"tag": "plain_text", "content": "查看详细结果"},
+                "url": state["doc_url"],
+                "type": "primary"
+            }]
+        })
+
+    title = state.get("title") or state["project_id"]
+    return {
+        "config": {"update_multi": True, "wide_screen_mode": True},
+        "header": {
+            "title": {"tag": "plain_text", "content": f"✅ 项目已完成 · {title}" if completed else f"📢 项目进度 · {title}"},
+            "template": "green" if completed else "blue"
+        },
+        "elements": elements
+    }
@@ -3,16 +3,24 @@
 Notion平台适配器实现
 实现ProjectManager、DocumentGenerator、Notifier、FileManager接口
 """
-from notion_client import Client
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Any
+from datetime import datetime, timezone
 import time
 from pathlib import Path
 
 from platform_adapter import (
     ProjectManager, DocumentGenerator, Notifier, FileManager,
-    ProjectStatus, StageStatus
+    ProjectStatus, StageStatus, DOCUMENT_SECTIONS, iter_pages
 )
+from markdown_blocks import parse_markdown_cached, render, notion_batches, NOTION_CHILDREN_LIMIT
+from notion_scheduler import get_notion_client
+from circuit_breaker import submit_with_context
+from platform_outbox import load_checkpoint, save_checkpoint
+
+
+# databases.query 单页条数上限
+NOTION_PAGE_SIZE = 100
 
 
 # ============ Notion ProjectManager实现 ============
@@ -21,7 +29,7 @@ class NotionProjectManager(ProjectManager):
     """Notion数据库项目管理器"""
 
     def __init__(self, config: Dict[str, Any]):
-        self.client = Client(auth=config["api_key"])
+        self.client = get_notion_client(config["api_key"])
         self.clients_db_id = config["databases"]["clients"]
         self.projects_db_id = config["databases"]["projects"]
         self.pressure_tests_db_id = config["databases"]["pressure_tests"]
@@ -154,35 +162,59 @@ class NotionProjectManager(ProjectManager):
             print(f"❌ 获取项目信息失败: {e}")
             return None
 
-    def list_projects(self, status: Optional[ProjectStatus] = None) -> List[Dict[str, Any]]:
-        """获取项目列表"""
-        filter_params = {}
+    def iter_projects(self, status: Optional[ProjectStatus] = None,
+                      field_names: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """逐条遍历项目（按 next_cursor 翻页）"""
+        query: Dict[str, Any] = {"database_id": self.projects_db_id, "page_size": NOTION_PAGE_SIZE}
         if status:
-            filter_params = {
+            query["filter"] = {
                 "property": "项目状态",
                 "select": {
                     "equals": status.value
                 }
             }
+        if field_names:
+            query["filter_properties"] = field_names
 
-        try:
-            response = self.client.databases.query(
-                database_id=self.projects_db_id,
-                filter=filter_params if status else None
-            )
+        def fetch_page(cursor: Optional[str]):
+            response = self.client.databases.query(**query, **({"start_cursor": cursor} if cursor else {}))
+            projects = [
+                {"id": page["id"], **self._parse_properties(page["properties"])}
+                for page in response["results"]
+            ]
+            return projects, response.get("next_cursor") if response.get("has_more") else None
+
+        return iter_pages(fetch_page)
+
+    def mirror_tables(self) -> Dict[str, str]:
+        return {
+            "clients": self.clients_db_id,
+            "projects": self.projects_db_id,
+            "pressure_tests": self.pressure_tests_db_id
+        }
 
-            projects = []
-            for page in response["results"]:
-                project = {
+    def iter_table_records(self, table_id: str, modified_since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """遍历数据库页面（按 last_edited_time 在服务端过滤增量）"""
+        query: Dict[str, Any] = {"database_id": table_id, "page_size": NOTION_PAGE_SIZE}
+        if modified_since:
+            query["filter"] = {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"after": datetime.fromtimestamp(modified_since, tz=timezone.utc).isoformat()}
+            }
+
+        def fetch_page(cursor: Optional[str]):
+            response = self.client.databases.query(**query, **({"start_cursor": cursor} if cursor else {}))
+            records = [
+                {
                     "id": page["id"],
-                    **self._parse_properties(page["properties"])
+                    "modified_at": datetime.fromisoformat(page["last_edited_time"].replace("Z", "+00:00")).timestamp(),
+                    "fields": self._parse_properties(page["properties"])
                 }
-                projects.append(project)
+                for page in response["results"]
+            ]
+            return records, response.get("next_cursor") if response.get("has_more") else None
 
-            return projects
-        except Exception as e:
-            print(f"❌ 获取项目列表失败: {e}")
-            return []
+        return iter_pages(fetch_page)
 
     def _parse_properties(self, properties: Dict) -> Dict[str, Any]:
         """解析Notion属性为简单字典"""
@@ -210,52 +242,95 @@ class NotionDocumentGenerator(DocumentGenerator):
     """Notion页面生成器"""
 
     def __init__(self, config: Dict[str, Any]):
-        self.client = Client(auth=config["api_key"])
+        self.client = get_notion_client(config["api_key"])
         self.workspace_id = config["pages"].get("workspace_id", "")
         self.template_page_id = config["pages"].get("template_page_id", "")
 
     def create_project_document(self, project_id: str, client_name: str, results: Dict[str, str]) -> str:
-        """创建项目交付文档"""
-        # 创建页面
-        title = f"【{client_name}】GEO项目交付文档"
+        """
+        创建项目交付文档
 
-        # 构建页面内容块
-        children = [
-            self._create_heading_block("📋 项目概览", 1),
-            self._create_paragraph_block(f"客户名称：{client_name}"),
-            self._create_heading_block("🎯 D - 矩阵提取结果", 2),
-            self._create_file_block(results.get("d_matrix", "")),
-            self._create_heading_block("🔄 B - 转化路径设计", 2),
-            self._create_file_block(results.get("b_conversion", "")),
-            self._create_heading_block("✅ C - 质检改进方案", 2),
-            self._create_file_block(results.get("c_quality", "")),
-            self._create_heading_block("💼 A - 商业提案", 2),
-            self._create_file_block(results.get("a_proposal", "")),
-            self._create_heading_block("📈 压力测试报告", 2),
-            self._create_file_block(results.get("pressure_test", "")),
-        ]
+        经发件箱投递时，页面、章节标题和每批正文写入后都记下进度，重试时继续写入同一页面
+        （Notion 没有请求幂等标识，只有写入成功但来不及记录的那一批可能重复）。
+        """
+        title = f"【{client_name}】GEO项目交付文档"
+        sections = [(t, results.get(key)) for t, key in DOCUMENT_SECTIONS]
 
-        response = self.client.pages.create(
-            parent={"page_id": self.workspace_id} if self.workspace_id else {"workspace": True},
-            properties={
-                "title": [{"text": {"content": title}}]
-            },
-            children=children
-        )
+        page = load_checkpoint("notion:page")
+        if page:
+            print(f"♻️  继续写入上次创建的页面: {title}")
+        else:
+            # 页面先只带概览和各章节的可折叠标题，章节正文随后并行追加到各自标题下
+            children = [
+                self._create_heading_block("📋 项目概览", 1),
+                self._create_paragraph_block(f"客户名称：{client_name}"),
+            ]
+
+            response = self.client.pages.create(
+                parent={"page_id": self.workspace_id} if self.workspace_id else {"workspace": True},
+                properties={
+                    "title": [{"text": {"content": title}}]
+                },
+                children=children
+            )
+            page = {"id": response["id"], "url": response["url"]}
+            save_checkpoint("notion:page", page)
+
+        page_id = page["id"]
+        page_url = page["url"]
+
+        heading_ids = load_checkpoint(f"notion:{page_id}:headings")
+        if heading_ids is None:
+            headings = self.client.blocks.children.append(
+                block_id=page_id,
+                children=[self._create_heading_block(t, 2, toggleable=True) for t, _ in sections]
+            )["results"]
+            heading_ids = [heading["id"] for heading in headings]
+            save_checkpoint(f"notion:{page_id}:headings", heading_ids)
+
+        with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+            futures = [
+                submit_with_context(executor, self._append_markdown, heading_id, self._read_section(file_path))
+                for heading_id, (_, file_path) in zip(heading_ids, sections)
+            ]
+            for future in futures:
+                future.result()
 
-        page_id = response["id"]
-        page_url = response["url"]
         print(f"✅ Notion文档创建成功: {title}")
         return page_url
 
-    def _create_heading_block(self, text: str, level: int) -> Dict:
+    @staticmethod
+    def _read_section(file_path: Optional[str]) -> str:
+        if file_path and Path(file_path).exists():
+            return Path(file_path).read_text(encoding="utf-8")
+        return f"📎 附件：{Path(file_path).name if file_path else '无'}"
+
+    def _append_markdown(self, block_id: str, content: str):
+        """把 markdown 按 Notion 单次请求上限分批追加到块下（同一父块内按顺序提交，跳过已记录完成的批次）"""
+        step = f"notion:{block_id}:batches"
+        done = load_checkpoint(step) or 0
+        for index, batch in enumerate(notion_batches(render(parse_markdown_cached(content), "notion"))):
+            if index < done:
+                continue
+            overflow = [block.pop("_overflow_rows", None) for block in batch]
+            created = self.client.blocks.children.append(block_id=block_id, children=batch)["results"]
+            # 超过 100 行的表格：拿到表格块ID后追加剩余行
+            for block, rows in zip(created, overflow):
+                for start in range(0, len(rows or []), NOTION_CHILDREN_LIMIT):
+                    self.client.blocks.children.append(
+                        block_id=block["id"], children=rows[start:start + NOTION_CHILDREN_LIMIT]
+                    )
+            save_checkpoint(step, index + 1)
+
+    def _create_heading_block(self, text: str, level: int, toggleable: bool = False) -> Dict:
         """创建标题块"""
         heading_type = f"heading_{level}"
         return {
             "object": "block",
             "type": heading_type,
             heading_type: {
-                "rich_text": [{"text": {"content": text}}]
+                "rich_text": [{"text": {"content": text}}],
+                "is_toggleable": toggleable
             }
         }
 
@@ -269,20 +344,10 @@ class NotionDocumentGenerator(DocumentGenerator):
             }
         }
 
-    def _create_file_block(self, file_path: str) -> Dict:
-        """创建文件块（显示文件名）"""
-        return {
-            "object": "block",
-            "type": "paragraph",
-            "paragraph": {
-                "rich_text": [{"text": {"content": f"📎 附件：{Path(file_path).name if file_path else '无'}"}}]
-            }
-        }
-
     def update_document(self, doc_id: str, content: str) -> bool:
-        """更新文档内容"""
+        """更新文档内容（把 markdown 追加到页面末尾）"""
         try:
-            # Notion更新需要添加新块
+            self._append_markdown(doc_id, content)
             print(f"📝 更新Notion文档: {doc_id}")
             return True
         except Exception as e:
@@ -314,10 +379,11 @@ class NotionNotifier(Notifier):
         # Notion本身没有通知功能，需要集成第三方服务
         self.email_config = config.get("email", {})
 
-    def send_progress_notification(self, project_id: str, stage: str, status: StageStatus, message: str) -> bool:
+    def send_progress_notification(self, project_id: str, stage: str, status: StageStatus, message: str,
+                                   client_name: Optional[str] = None) -> bool:
         """发送进度通知"""
         # 这里可以集成邮件或Slack等
-        print(f"📧 [Notion通知] 项目 {project_id} - {stage} - {status.value}")
+        print(f"📧 [Notion通知] 项目 {client_name or project_id} - {stage} - {status.value}")
         print(f"   {message}")
         return True
 
@@ -339,9 +405,8 @@ class NotionFileManager(FileManager):
     """Notion文件管理器"""
 
     def __init__(self, config: Dict[str, Any]):
-        self.client = Client(auth=config["api_key"])
-        # Notion不直接管理文件，文件通常上传到外部存储
-        print("⚠️  Notion不支持文件存储，建议使用云存储服务")
+        # Notion不直接管理文件，文件通常上传到外部存储（upload_file 时再提示）
+        self.client = get_notion_client(config["api_key"])
 
     def create_client_folder(self, client_name: str) -> str:
         """创建客户文件夹（Notion中创建页面）"""
@@ -359,6 +424,6 @@ class NotionFileManager(FileManager):
         print(f"⚠️  Notion不支持文件上传，文件位于: {file_path}")
         return file_path
 
-    def list_files(self, folder_id: str) -> List[Dict[str, Any]]:
-        """列出文件（占位实现）"""
-        return []
+    def iter_files(self, folder_id: str) -> Iterator[Dict[str, Any]]:
+        """遍历文件（占位实现）"""
+        return iter(())
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Notion 请求调度
+Notion 对每个 integration 限流约 3 次/秒。同一 api_key 的所有适配器和清理脚本共用
+一个 notion_client.Client，所有调用经令牌桶放行；排队时按优先级出队，
+页面上的交互请求排在批量清理之前。遇到 429 按 Retry-After 暂停整个桶后重试。
+每个方法（pages.create、databases.query ...）各有一个熔断器；在 circuit_breaker.deadline() 内调用时，
+排队加执行超过剩余预算会抛 DeadlineExceeded（尚未放行的请求直接取消）。
+
+用法：
+    from notion_scheduler import get_notion_client, BULK
+    client = get_notion_client(api_key)                 # 交互优先级
+    client.pages.create(parent=..., properties=...)
+    bulk = get_notion_client(api_key, priority=BULK)    # 批量任务
+    bulk.pages.update(page_id=..., archived=True)
+"""
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict
+
+from notion_client import Client
+
+from circuit_breaker import CircuitBreaker, DeadlineExceeded, check_deadline, get_breaker, remaining
+from http_session import api_base_override
+
+
+REQUESTS_PER_SECOND = 3
+BURST = 3                  # 令牌桶容量
+MAX_CONCURRENCY = 3        # 同时在途的请求数
+MAX_429_RETRIES = 5
+DEFAULT_RETRY_AFTER = 1.0  # 429 未带 Retry-After 时的等待秒数
+NOTION_TIMEOUT_MS = 30_000
+
+# 优先级（数值越小越先执行）
+INTERACTIVE = 0
+NORMAL = 5
+BULK = 10
+
+
+class TokenBucket:
+    """令牌桶：平均 rate 次/秒，允许 capacity 次突发"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """服务端限流时暂停发放令牌，并清空已积攒的令牌"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class NotionScheduler:
+    """优先级队列 + 令牌桶，单个派发线程按优先级放行请求"""
+
+    def __init__(self, rate: float = REQUESTS_PER_SECOND, burst: int = BURST,
+                 max_concurrency: int = MAX_CONCURRENCY):
+        self.bucket = TokenBucket(rate, burst)
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()  # 同优先级按提交顺序
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="notion")
+        self._slots = threading.Semaphore(max_concurrency)
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="notion-scheduler", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, fn: Callable, *args, priority: int = NORMAL, **kwargs) -> Future:
+        """提交一次调用，返回 Future"""
+        future: Future = Future()
+        self._queue.put((priority, next(self._seq), fn, args, kwargs, future, 0))
+        return future
+
+    def call(self, fn: Callable, *args, priority: int = NORMAL, **kwargs) -> Any:
+        """提交并等待结果；设置了截止时间时最多等到截止"""
+        check_deadline()
+        future = self.submit(fn, *args, priority=priority, **kwargs)
+        try:
+            return future.result(timeout=remaining())
+        except FutureTimeout:
+            if future.done():   # 调用本身抛出的超时
+                raise
+            future.cancel()
+            check_deadline()
+            raise DeadlineExceeded()
+
+    def queue_depth(self) -> int:
+        """排队中（尚未放行）的请求数"""
+        return self._queue.qsize()
+
+    def _dispatch_loop(self):
+        while True:
+            # 先拿到并发名额和令牌再出队，保证放行的是此刻优先级最高的请求
+            self._slots.acquire()
+            self.bucket.acquire()
+            item = self._queue.get()
+            self._executor.submit(self._execute, item)
+
+    def _execute(self, item):
+        priority, _, fn, args, kwargs, future, attempt = item
+        try:
+            # 429 重新排队的请求已处于运行态，只有首次执行需要检查是否被取消
+            if attempt == 0 and not future.set_running_or_notify_cancel():
+                return
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            if _is_rate_limited(e) and attempt < MAX_429_RETRIES:
+                self.bucket.pause(_retry_after(e))
+                # 保持原优先级和序号重新排队，不会被后提交的同级请求插队
+                self._queue.put((priority, item[1], fn, args, kwargs, future, attempt + 1))
+            else:
+                future.set_exception(e)
+        finally:
+            self._slots.release()
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status", None) == 429 or getattr(error, "code", None) == "rate_limited"
+
+
+def _is_server_error(error: Exception) -> bool:
+    """网络错误、超时与 5xx 计入熔断；4xx（含 429）是请求本身的问题，不计入"""
+    status = getattr(error, "status", None)
+    return status is None or status >= 500
+
+
+def _retry_after(error: Exception) -> float:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", DEFAULT_RETRY_AFTER))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class ScheduledClient:
+    """
+    notion_client.Client 的代理：client.pages.create(...) 等调用经熔断器检查后由调度器执行，
+    属性链（client.blocks.children.append）原样透传。
+    """
+
+    def __init__(self, target: Any, scheduler: NotionScheduler, priority: int, path: str = ""):
+        self._target = target
+        self._scheduler = scheduler
+        self._priority = priority
+        self._path = path
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        path = f"{self._path}.{name}" if self._path else name
+        if callable(attr):
+            breaker = get_breaker(f"notion {path}")
+
+            def scheduled(*args, **kwargs):
+                breaker.before_call()
+                started = []
+                try:
+                    return self._scheduler.call(_guarded, breaker, started, attr, *args,
+                                                priority=self._priority, **kwargs)
+                except DeadlineExceeded:
+                    if not started:
+                        breaker.release()
+                    raise
+            return scheduled
+        return ScheduledClient(attr, self._scheduler, self._priority, path)
+
+    def with_priority(self, priority: int) -> "ScheduledClient":
+        """同一客户端的另一优先级视图"""
+        return ScheduledClient(self._target, self._scheduler, priority, self._path)
+
+    def queue_depth(self) -> int:
+        return self._scheduler.queue_depth()
+
+
+def _guarded(breaker: CircuitBreaker, started: list, fn: Callable, *args, **kwargs) -> Any:
+    """在调度线程中执行一次调用，并把结果与耗时记入熔断器（429 由调度器重试，不计入）"""
+    started.append(True)
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        if _is_rate_limited(e):
+            breaker.release()
+        else:
+            breaker.record(not _is_server_error(e), (time.perf_counter() - start) * 1000)
+        raise
+    breaker.record(True, (time.perf_counter() - start) * 1000)
+    return result
+
+
+_clients: Dict[str, Client] = {}
+_schedulers: Dict[str, NotionScheduler] = {}
+_registry_lock = threading.Lock()
+
+
+def get_scheduler(api_key: str) -> NotionScheduler:
+    """获取 api_key 对应的共享调度器"""
+    with _registry_lock:
+        scheduler = _schedulers.get(api_key)
+        if scheduler is None:
+            scheduler = NotionScheduler()
+            _schedulers[api_key] = scheduler
+        return scheduler
+
+
+def get_notion_client(api_key: str, priority: int = INTERACTIVE) -> ScheduledClient:
+    """
+    获取共享的 Notion 客户端（同一 api_key 共用底层 Client 与调度器）
+
+    Args:
+        api_key: Notion integration token
+        priority: 该视图发出请求的优先级（INTERACTIVE/NORMAL/BULK）
+    """
+    scheduler = get_scheduler(api_key)
+    with _registry_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            base_url = api_base_override("notion")
+            client = Client(auth=api_key, timeout_ms=NOTION_TIMEOUT_MS, **({"base_url": base_url} if base_url else {}))
+            _clients[api_key] = client
+    return ScheduledClient(client, scheduler, priority)
+
+
+def queue_depth(api_key: str) -> int:
+    """api_key 对应调度器的排队请求数"""
+    return get_scheduler(api_key).queue_depth()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+输出目录清单（manifest）
+记录 output/ 下每个客户文件夹的文件名、大小、修改时间，写文件时同步更新
+
+仪表盘等页面只查清单，不再每次 rerun 都 iterdir 全部客户目录；
+清单带递增版本号，页面可用它作为 st.cache_data 的缓存键。
+"""
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlite_store import OUTPUT_ROOT, connect
+
+
+DB_PATH = Path(os.getenv("GEO_MANIFEST_DB", str(OUTPUT_ROOT / ".manifest.sqlite")))
+
+# 仪表盘展示的文件类型
+TRACKED_SUFFIXES = {".md", ".json", ".png", ".jpg", ".pptx"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    client TEXT NOT NULL,
+    name TEXT NOT NULL,
+    suffix TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (client, name)
+);
+CREATE TABLE IF NOT EXISTS clients (
+    client TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+# ============ 数据库访问 ============
+
+def _connect():
+    return connect(DB_PATH, _SCHEMA)
+
+
+def _bump_version(conn: sqlite3.Connection):
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('version', 1) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+    )
+
+
+def _scan_folder(conn: sqlite3.Connection, folder: Path):
+    client = folder.name
+    conn.execute("DELETE FROM files WHERE client = ?", (client,))
+    for f in folder.iterdir():
+        if f.is_file() and f.suffix in TRACKED_SUFFIXES:
+            stat = f.stat()
+            conn.execute(
+                "INSERT INTO files (client, name, suffix, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                (client, f.name, f.suffix, stat.st_size, stat.st_mtime)
+            )
+    conn.execute("INSERT OR REPLACE INTO clients (client, updated_at) VALUES (?, ?)", (client, time.time()))
+
+
+# ============ 写入（在生成/删除文件后调用） ============
+
+def record_file(file_path):
+    """登记单个文件（新建或覆盖后调用）"""
+    path = Path(file_path)
+    if path.parent.parent.resolve() != OUTPUT_ROOT.resolve() or path.suffix not in TRACKED_SUFFIXES:
+        return
+    stat = path.stat()
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT OR REPLACE INTO files (client, name, suffix, size, mtime) VALUES (?, ?, ?, ?, ?)",
+            (path.parent.name, path.name, path.suffix, stat.st_size, stat.st_mtime)
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO clients (client, updated_at) VALUES (?, ?)", (path.parent.name, time.time())
+        )
+        _bump_version(conn)
+        conn.execute("COMMIT")
+
+
+def refresh_client(client_folder):
+    """重新扫描单个客户目录（批量写入文件后调用）"""
+    folder = Path(client_folder)
+    if folder.parent.resolve() != OUTPUT_ROOT.resolve():
+        return
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if folder.is_dir():
+            _scan_folder(conn, folder)
+        else:
+            conn.execute("DELETE FROM files WHERE client = ?", (folder.name,))
+            conn.execute("DELETE FROM clients WHERE client = ?", (folder.name,))
+        _bump_version(conn)
+        conn.execute("COMMIT")
+
+
+def remove_client(client_name: str):
+    """删除客户目录并从清单移除"""
+    folder = OUTPUT_ROOT / client_name
+    if folder.exists():
+        shutil.rmtree(folder)
+    refresh_client(folder)
+
+
+def rebuild() -> int:
+    """全量重建清单（首次使用或手动修复时调用），返回客户数"""
+    OUTPUT_ROOT.mkdir(parents=True, exist_ok=True)
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM files")
+        conn.execute("DELETE FROM clients")
+        # 以 . 开头的是缓存目录（如 .ast_cache），不是客户
+        folders = [p for p in OUTPUT_ROOT.iterdir() if p.is_dir() and not p.name.startswith(".")]
+        for folder in folders:
+            _scan_folder(conn, folder)
+        _bump_version(conn)
+        conn.execute("COMMIT")
+    return len(folders)
+
+
+# ============ 查询 ============
+
+def manifest_version() -> int:
+    """清单版本号（每次写入递增），首次访问时自动全量建立清单"""
+    with _connect() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if row is None:
+        rebuild()
+        return manifest_version()
+    return row["value"]
+
+
+def count_clients(search: str = "") -> int:
+    """客户数量（支持名称模糊搜索）"""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT COUNT(*) FROM clients WHERE client LIKE ?", (f"%{search}%",)
+        ).fetchone()
+    return row[0]
+
+
+def list_clients(search: str = "", offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    分页列出客户
+
+    Returns:
+        [{"client", "updated_at", "file_count", "total_size"}]，按最近更新倒序
+    """
+    with _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT c.client, c.updated_at, COUNT(f.name) AS file_count, COALESCE(SUM(f.size), 0) AS total_size
+            FROM clients c LEFT JOIN files f ON f.client = c.client
+            WHERE c.client LIKE ?
+            GROUP BY c.client
+            ORDER BY c.updated_at DESC
+            LIMIT ? OFFSET ?
+            """,
+            (f"%{search}%", -1 if limit is None else limit, offset)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def list_files(client_name: str, suffix: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    列出客户的文件
+
+    Returns:
+        [{"name", "suffix", "size", "mtime", "path"}]
+    """
+    sql = "SELECT name, suffix, size, mtime FROM files WHERE client = ?"
+    args: List[Any] = [client_name]
+    if suffix:
+        sql += " AND suffix = ?"
+        args.append(suffix)
+    with _connect() as conn:
+        rows = conn.execute(sql + " ORDER BY name", args).fetchall()
+    return [{**dict(r), "path": str(OUTPUT_ROOT / client_name / r["name"])} for r in rows]
+
+
+if __name__ == "__main__":
+    print(f"✅ 清单已重建，共 {rebuild()} 个客户")
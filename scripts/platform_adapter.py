@@ -4,7 +4,8 @@
 支持飞书和Notion的统一接口
 """
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple
 from datetime import datetime
 from enum import Enum
 
@@ -31,6 +32,40 @@ class StageStatus(Enum):
     FAILED = "失败"
 
 
+# 交付文档章节：(标题, results 中的键)
+DOCUMENT_SECTIONS = [
+    ("🎯 D - 矩阵提取结果", "d_matrix"),
+    ("🔄 B - 转化路径设计", "b_conversion"),
+    ("✅ C - 质检改进方案", "c_quality"),
+    ("💼 A - 商业提案", "a_proposal"),
+    ("📈 压力测试报告", "pressure_test"),
+]
+
+
+# ============ 分页工具 ============
+
+def iter_pages(fetch_page: Callable[[Optional[str]], Tuple[List[Any], Optional[str]]]) -> Iterator[Any]:
+    """
+    按游标逐页拉取并逐条产出；调用方处理当前页时后台预取下一页
+
+    Args:
+        fetch_page: 接收游标（首页为 None），返回 (本页条目, 下一页游标)，没有下一页时游标为 None；
+                    拉取失败时应抛出异常，而不是返回空页
+
+    Yields:
+        条目
+
+    Raises:
+        任一页拉取失败时原样抛出，不会静默结束遍历（调用方不会拿到不完整的列表）
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(fetch_page, None)
+        while pending is not None:
+            items, cursor = pending.result()
+            pending = executor.submit(fetch_page, cursor) if cursor else None
+            yield from items
+
+
 # ============ 抽象接口定义 ============
 
 class ProjectManager(ABC):
@@ -90,6 +125,18 @@ class ProjectManager(ABC):
         """
         pass
 
+    def add_stage_records(self, stage_data_list: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量添加阶段执行记录（平台支持批量接口时应覆盖此方法）
+
+        Args:
+            stage_data_list: 阶段数据列表，字段同 add_stage_record
+
+        Returns:
+            记录ID列表
+        """
+        return [self.add_stage_record(stage_data) for stage_data in stage_data_list]
+
     @abstractmethod
     def add_pressure_test_record(self, test_data: Dict[str, Any]) -> str:
         """
@@ -111,6 +158,18 @@ class ProjectManager(ABC):
         """
         pass
 
+    def add_pressure_test_records(self, test_data_list: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量添加压力测试记录（平台支持批量接口时应覆盖此方法）
+
+        Args:
+            test_data_list: 测试数据列表，字段同 add_pressure_test_record
+
+        Returns:
+            记录ID列表
+        """
+        return [self.add_pressure_test_record(test_data) for test_data in test_data_list]
+
     @abstractmethod
     def get_project_info(self, project_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -125,17 +184,58 @@ class ProjectManager(ABC):
         pass
 
     @abstractmethod
-    def list_projects(self, status: Optional[ProjectStatus] = None) -> List[Dict[str, Any]]:
+    def iter_projects(self, status: Optional[ProjectStatus] = None,
+                      field_names: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
         """
-        获取项目列表
+        逐条遍历项目（自动翻页，处理当前页时预取下一页）
 
         Args:
             status: 筛选状态（可选）
+            field_names: 只返回这些字段（可选，减小响应体积）
+
+        Yields:
+            项目信息，含 id 字段
+
+        Raises:
+            任一页拉取失败时抛出异常
+        """
+        pass
+
+    def list_projects(self, status: Optional[ProjectStatus] = None,
+                      field_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        获取项目列表（全部页）
+
+        Args:
+            status: 筛选状态（可选）
+            field_names: 只返回这些字段（可选）
 
         Returns:
             项目列表
         """
-        pass
+        return list(self.iter_projects(status, field_names))
+
+    def mirror_tables(self) -> Dict[str, str]:
+        """
+        本地镜像需要同步的表（平台不支持增量遍历时返回空字典）
+
+        Returns:
+            {逻辑表名（projects/stages/pressure_tests 等）: 平台表ID}
+        """
+        return {}
+
+    def iter_table_records(self, table_id: str, modified_since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        遍历表中记录（供本地镜像同步；不支持镜像的平台没有可遍历的表，默认为空）
+
+        Args:
+            table_id: mirror_tables 返回的平台表ID
+            modified_since: 只返回该时间（epoch 秒）之后修改的记录，None 表示全部
+
+        Yields:
+            {"id": 记录ID, "modified_at": 最后修改时间（epoch 秒）, "fields": 字段字典}
+        """
+        return iter(())
 
 
 class DocumentGenerator(ABC):
@@ -208,7 +308,8 @@ class Notifier(ABC):
     """通知推送抽象接口"""
 
     @abstractmethod
-    def send_progress_notification(self, project_id: str, stage: str, status: StageStatus, message: str) -> bool:
+    def send_progress_notification(self, project_id: str, stage: str, status: StageStatus, message: str,
+                                   client_name: Optional[str] = None) -> bool:
         """
         发送进度通知
 
@@ -217,6 +318,7 @@ class Notifier(ABC):
             stage: 当前阶段
             status: 阶段状态
             message: 通知消息
+            client_name: 客户名称（可选，用作通知标题）
 
         Returns:
             是否成功
@@ -252,6 +354,10 @@ class Notifier(ABC):
         """
         pass
 
+    def flush(self):
+        """立即发送缓冲中的通知（默认实现不做缓冲）"""
+        pass
+
 
 class FileManager(ABC):
     """文件管理抽象接口"""
@@ -284,9 +390,24 @@ class FileManager(ABC):
         pass
 
     @abstractmethod
+    def iter_files(self, folder_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        逐条遍历文件夹内文件（自动翻页，处理当前页时预取下一页）
+
+        Args:
+            folder_id: 文件夹ID
+
+        Yields:
+            文件信息
+
+        Raises:
+            任一页拉取失败时抛出异常
+        """
+        pass
+
     def list_files(self, folder_id: str) -> List[Dict[str, Any]]:
         """
-        列出文件夹内文件
+        列出文件夹内文件（全部页）
 
         Args:
             folder_id: 文件夹ID
@@ -294,7 +415,7 @@ class FileManager(ABC):
         Returns:
             文件列表
         """
-        pass
+        return list(self.iter_files(folder_id))
 
 
 # ============ 平台适配器工厂 ============
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+多平台同步（fan-out）
+配置 sync_platforms: [feishu, notion] 后，PlatformIntegrationManager 的四类适配器换成这里的组合适配器：
+每个写操作并发发往所有平台，返回的ID把各平台ID编码在一起（"feishu:recxxx|notion:xxxx"），
+后续操作再按平台拆开。某个平台失败不影响其他平台，失败记录写入本地 SQLite，
+可跨进程用 recent_failures() 查看（发件箱投递时记下所属 project_key）；
+所有平台都失败时抛出 FanoutError。
+
+读操作（项目信息、列表、本地镜像）只走主平台（sync_platforms 中的 default_platform）。
+主平台返回的记录ID按本地保存的对应关系换回组合ID，列表里拿到的ID再用于写入时仍能发往所有平台。
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from circuit_breaker import submit_with_context
+from platform_outbox import current_project_key
+from sqlite_store import OUTPUT_ROOT, connect
+from platform_adapter import (
+    Platform, ProjectManager, DocumentGenerator, Notifier, FileManager,
+    ProjectStatus, StageStatus
+)
+
+
+FANOUT_WORKERS = 8          # 所有组合适配器共用的线程数
+FAILURE_HISTORY = 200       # recent_failures() 保留的条数
+DOCUMENT_URL_CACHE = 1000   # 记住最近项目在各平台的文档链接，供完成通知使用
+
+ID_SEPARATOR = "|"
+
+DB_PATH = Path(os.getenv("GEO_FANOUT_DB", str(OUTPUT_ROOT / ".fanout_ids.sqlite")))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS id_links (
+    platform TEXT NOT NULL,
+    remote_id TEXT NOT NULL,
+    composite_id TEXT NOT NULL,
+    PRIMARY KEY (platform, remote_id)
+);
+CREATE TABLE IF NOT EXISTS failures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    error TEXT NOT NULL,
+    project_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_failures_project ON failures(project_key, id);
+"""
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+_document_urls: "OrderedDict[str, Dict[Platform, str]]" = OrderedDict()
+_known_links: Dict[tuple, str] = {}   # 已写入 id_links 的对应关系，避免重复写库
+_state_lock = threading.Lock()
+
+
+class FanoutError(Exception):
+    """所有平台都执行失败"""
+
+    def __init__(self, operation: str, errors: Dict[Platform, Exception]):
+        self.operation = operation
+        self.errors = errors
+        detail = "；".join(f"{p.value}: {e}" for p, e in errors.items())
+        super().__init__(f"{operation} 在所有平台均失败: {detail}")
+
+
+def encode_ids(ids: Dict[Platform, str]) -> str:
+    """各平台ID编码成一个字符串（只有一个平台成功时也带平台前缀，便于识别）"""
+    return ID_SEPARATOR.join(f"{platform.value}:{remote_id}" for platform, remote_id in ids.items())
+
+
+def decode_ids(composite_id: str) -> Dict[Platform, str]:
+    """拆开 encode_ids 的结果；不是组合ID时返回空字典"""
+    ids = {}
+    for part in (composite_id or "").split(ID_SEPARATOR):
+        name, sep, remote_id = part.partition(":")
+        if not sep or name not in Platform._value2member_map_:
+            return {}
+        ids[Platform(name)] = remote_id
+    return ids
+
+
+def _connect():
+    return connect(DB_PATH, _SCHEMA)
+
+
+def remember_composite(composite_id: str, primary: Platform):
+    """记录主平台ID对应的组合ID（只有主平台成功时不用记）"""
+    ids = decode_ids(composite_id)
+    if len(ids) < 2 or primary not in ids:
+        return
+    key = (primary.value, ids[primary])
+    with _state_lock:
+        if _known_links.get(key) == composite_id:
+            return
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO id_links (platform, remote_id, composite_id) VALUES (?, ?, ?)",
+            (*key, composite_id)
+        )
+    with _state_lock:
+        _known_links[key] = composite_id
+
+
+def composite_ids(primary: Platform, remote_ids: List[str]) -> Dict[str, str]:
+    """主平台ID → 组合ID（没有记录的ID不在结果中）"""
+    links = {}
+    for start in range(0, len(remote_ids), 500):
+        chunk = remote_ids[start:start + 500]
+        with _connect() as conn:
+            rows = conn.execute(
+                "SELECT remote_id, composite_id FROM id_links WHERE platform = ? AND remote_id IN (%s)"
+                % ",".join("?" * len(chunk)), (primary.value, *chunk)
+            ).fetchall()
+        links.update((row["remote_id"], row["composite_id"]) for row in rows)
+    return links
+
+
+def recent_failures(limit: int = 50, project_key: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    最近的单平台失败（新的在前，包括其他进程记录的）
+
+    Args:
+        project_key: 只看该项目的发件箱事件投递时的失败
+    """
+    sql = "SELECT time, operation, platform, error, project_key FROM failures"
+    args: List[Any] = []
+    if project_key:
+        sql += " WHERE project_key = ?"
+        args.append(project_key)
+    with _connect() as conn:
+        rows = conn.execute(sql + " ORDER BY id DESC LIMIT ?", (*args, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _record_failure(operation: str, platform: Platform, error: Exception):
+    print(f"⚠️  [{platform.value}] {operation} 失败（其他平台不受影响）: {error}")
+    with _connect() as conn:
+        cursor = conn.execute(
+            "INSERT INTO failures (time, operation, platform, error, project_key) VALUES (?, ?, ?, ?, ?)",
+            (datetime.now().isoformat(timespec="seconds"), operation, platform.value, str(error),
+             current_project_key())
+        )
+        conn.execute("DELETE FROM failures WHERE id <= ?", (cursor.lastrowid - FAILURE_HISTORY,))
+
+
+class _Fanout:
+    """组合适配器公共逻辑"""
+
+    def __init__(self, adapters: Dict[Platform, Any]):
+        self.adapters = adapters                # 有序，第一个为主平台
+        self.primary = next(iter(adapters))
+
+    def _ids(self, composite_id: str) -> Dict[Platform, str]:
+        """组合ID按平台拆开；普通ID视为主平台的ID（有对应组合ID时用组合ID）"""
+        ids = decode_ids(composite_id)
+        if ids:
+            # 本地对应关系建立之前创建的记录，第一次带组合ID写入时补记
+            remember_composite(composite_id, self.primary)
+            return ids
+        linked = composite_ids(self.primary, [composite_id]).get(composite_id) if composite_id else None
+        return decode_ids(linked) if linked else {self.primary: composite_id}
+
+    def _encode(self, ids: Dict[Platform, str]) -> str:
+        composite_id = encode_ids(ids)
+        remember_composite(composite_id, self.primary)
+        return composite_id
+
+    def _run(self, operation: str, calls: Dict[Platform, Callable[[Any], Any]]) -> Dict[Platform, Any]:
+        """
+        并发执行各平台调用
+
+        Args:
+            calls: {平台: fn(adapter)}，不在其中的平台视为跳过
+
+        Returns:
+            成功平台的结果 {平台: 返回值}
+        """
+        futures = {platform: submit_with_context(_executor, fn, self.adapters[platform]) for platform, fn in calls.items()}
+        results, errors = {}, {}
+        for platform, future in futures.items():
+            try:
+                results[platform] = future.result()
+            except Exception as e:
+                errors[platform] = e
+                _record_failure(operation, platform, e)
+        if errors and not results:
+            raise FanoutError(operation, errors)
+        return results
+
+    def _run_all(self, operation: str, fn: Callable[[Any], Any]) -> Dict[Platform, Any]:
+        return self._run(operation, {platform: fn for platform in self.adapters})
+
+    def _run_mapped(self, operation: str, composite_id: str,
+                    fn: Callable[[Any, str], Any]) -> Dict[Platform, Any]:
+        """按平台拆开 composite_id 后各自调用 fn(adapter, 该平台ID)；缺少ID的平台记为失败"""
+        ids = self._ids(composite_id)
+        for platform in self.adapters:
+            if platform not in ids:
+                _record_failure(operation, platform, KeyError(f"{composite_id} 未在该平台创建"))
+        calls = {p: (lambda adapter, rid=rid: fn(adapter, rid)) for p, rid in ids.items() if p in self.adapters}
+        if not calls:
+            raise FanoutError(operation, {})
+        return self._run(operation, calls)
+
+
+# ============ ProjectManager ============
+
+class FanoutProjectManager(_Fanout, ProjectManager):
+    """同时写入多个平台的项目管理器"""
+
+    # 镜像里存的是组合ID，与早先按主平台ID缓存的记录分开
+    MIRROR_NAMESPACE = "FanoutProjectManager.composite"
+
+    def create_project(self, project_data: Dict[str, Any]) -> str:
+        return self._encode(self._run_all("创建项目", lambda pm: pm.create_project(project_data)))
+
+    def update_project_status(self, project_id: str, status: ProjectStatus) -> bool:
+        results = self._run_mapped("更新项目状态", project_id, lambda pm, rid: pm.update_project_status(rid, status))
+        return all(results.values()) and len(results) == len(self.adapters)
+
+    def _with_project(self, data: Dict[str, Any]) -> Dict[Platform, Dict[str, Any]]:
+        """把数据里的 project_id 换成各平台自己的ID"""
+        ids = self._ids(data.get("project_id", ""))
+        return {p: {**data, "project_id": rid} for p, rid in ids.items() if p in self.adapters}
+
+    def add_stage_record(self, stage_data: Dict[str, Any]) -> str:
+        per_platform = self._with_project(stage_data)
+        results = self._run("添加阶段记录", {
+            p: (lambda pm, data=data: pm.add_stage_record(data)) for p, data in per_platform.items()
+        })
+        return self._encode(results)
+
+    def add_stage_records(self, stage_data_list: List[Dict[str, Any]]) -> List[str]:
+        per_platform: Dict[Platform, List[Dict[str, Any]]] = {}
+        for stage_data in stage_data_list:
+            for platform, data in self._with_project(stage_data).items():
+                per_platform.setdefault(platform, []).append(data)
+        results = self._run("批量添加阶段记录", {
+            p: (lambda pm, items=items: pm.add_stage_records(items)) for p, items in per_platform.items()
+        })
+        return [
+            self._encode({p: record_ids[i] for p, record_ids in results.items() if i < len(record_ids)})
+            for i in range(len(stage_data_list))
+        ]
+
+    def add_pressure_test_record(self, test_data: Dict[str, Any]) -> str:
+        per_platform = self._with_project(test_data)
+        results = self._run("添加压力测试记录", {
+            p: (lambda pm, data=data: pm.add_pressure_test_record(data)) for p, data in per_platform.items()
+        })
+        return self._encode(results)
+
+    def add_pressure_test_records(self, test_data_list: List[Dict[str, Any]]) -> List[str]:
+        per_platform: Dict[Platform, List[Dict[str, Any]]] = {}
+        for test_data in test_data_list:
+            for platform, data in self._with_project(test_data).items():
+                per_platform.setdefault(platform, []).append(data)
+        results = self._run("批量添加压力测试记录", {
+            p: (lambda pm, items=items: pm.add_pressure_test_records(items)) for p, items in per_platform.items()
+        })
+        return [
+            self._encode({p: record_ids[i] for p, record_ids in results.items() if i < len(record_ids)})
+            for i in range(len(test_data_list))
+        ]
+
+    def get_project_info(self, project_id: str) -> Optional[Dict[str, Any]]:
+        ids = self._ids(project_id)
+        platform = self.primary if self.primary in ids else next(iter(ids))
+        return self.adapters[platform].get_project_info(ids[platform])
+
+    def _with_composite_ids(self, records: Iterator[Dict[str, Any]], batch: int = 200) -> Iterator[Dict[str, Any]]:
+        """主平台返回的记录按批换回组合ID"""
+        pending: List[Dict[str, Any]] = []
+        for record in records:
+            pending.append(record)
+            if len(pending) >= batch:
+                yield from self._relink(pending)
+                pending = []
+        yield from self._relink(pending)
+
+    def _relink(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not records:
+            return records
+        links = composite_ids(self.primary, [r["id"] for r in records])
+        return [{**r, "id": links[r["id"]]} if r["id"] in links else r for r in records]
+
+    def iter_projects(self, status: Optional[ProjectStatus] = None,
+                      field_names: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        return self._with_composite_ids(self.adapters[self.primary].iter_projects(status, field_names))
+
+    def mirror_tables(self) -> Dict[str, str]:
+        return self.adapters[self.primary].mirror_tables()
+
+    def iter_table_records(self, table_id: str, modified_since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        return self._with_composite_ids(self.adapters[self.primary].iter_table_records(table_id, modified_since))
+
+
+# ============ DocumentGenerator ============
+
+class FanoutDocumentGenerator(_Fanout, DocumentGenerator):
+    """同时在多个平台生成交付文档，返回主平台（失败时为其他平台）的链接"""
+
+    def create_project_document(self, project_id: str, client_name: str, results: Dict[str, str]) -> str:
+        urls = self._run_mapped(
+            "生成交付文档", project_id, lambda gen, rid: gen.create_project_document(rid, client_name, results)
+        )
+        with _state_lock:
+            _document_urls[project_id] = urls
+            while len(_document_urls) > DOCUMENT_URL_CACHE:
+                _document_urls.popitem(last=False)
+        return urls.get(self.primary) or next(iter(urls.values()))
+
+    def update_document(self, doc_id: str, content: str) -> bool:
+        results = self._run_mapped("更新文档", doc_id, lambda gen, rid: gen.update_document(rid, content))
+        return all(results.values())
+
+    def set_document_permission(self, doc_id: str, user_ids: List[str], permission: str = 'view') -> bool:
+        results = self._run_mapped(
+            "设置文档权限", doc_id, lambda gen, rid: gen.set_document_permission(rid, user_ids, permission)
+        )
+        return all(results.values())
+
+    def generate_share_link(self, doc_id: str) -> str:
+        links = self._run_mapped("生成分享链接", doc_id, lambda gen, rid: gen.generate_share_link(rid))
+        return links.get(self.primary) or next(iter(links.values()))
+
+
+# ============ Notifier ============
+
+class FanoutNotifier(_Fanout, Notifier):
+    """各平台通知渠道都发送"""
+
+    def _project_ids(self, project_id: str) -> Dict[Platform, str]:
+        # 通知对ID只做展示，没有该平台ID时仍然发送
+        ids = decode_ids(project_id)
+        return {p: ids.get(p, project_id) for p in self.adapters}
+
+    def send_progress_notification(self, project_id: str, stage: str, status: StageStatus, message: str,
+                                   client_name: Optional[str] = None) -> bool:
+        ids = self._project_ids(project_id)
+        results = self._run("发送进度通知", {
+            p: (lambda n, rid=rid: n.send_progress_notification(rid, stage, status, message, client_name))
+            for p, rid in ids.items()
+        })
+        return any(results.values())
+
+    def send_completion_notification(self, project_id: str, client_name: str, doc_url: str) -> bool:
+        ids = self._project_ids(project_id)
+        with _state_lock:
+            urls = dict(_document_urls.get(project_id, {}))
+        # 每个平台的通知附上该平台自己的文档链接
+        results = self._run("发送完成通知", {
+            p: (lambda n, rid=rid, url=urls.get(p, doc_url): n.send_completion_notification(rid, client_name, url))
+            for p, rid in ids.items()
+        })
+        return any(results.values())
+
+    def send_alert(self, alert_type: str, message: str) -> bool:
+        return any(self._run_all("发送告警", lambda n: n.send_alert(alert_type, message)).values())
+
+    def flush(self):
+        self._run_all("发送缓冲通知", lambda n: n.flush())
+
+
+# ============ FileManager ============
+
+class FanoutFileManager(_Fanout, FileManager):
+    """文件夹与文件同时写入各平台"""
+
+    def create_client_folder(self, client_name: str) -> str:
+        return encode_ids(self._run_all("创建客户文件夹", lambda fm: fm.create_client_folder(client_name)))
+
+    def upload_file(self, folder_id: str, file_path: str) -> str:
+        return encode_ids(self._run_mapped("上传文件", folder_id, lambda fm, rid: fm.upload_file(rid, file_path)))
+
+    def iter_files(self, folder_id: str) -> Iterator[Dict[str, Any]]:
+        ids = self._ids(folder_id)
+        platform = self.primary if self.primary in ids else next(iter(ids))
+        return self.adapters[platform].iter_files(ids[platform])
+
+
+FANOUT_ADAPTERS = {
+    "project_manager": FanoutProjectManager,
+    "document_generator": FanoutDocumentGenerator,
+    "notifier": FanoutNotifier,
+    "file_manager": FanoutFileManager,
+}
@@ -3,9 +3,13 @@
 平台集成管理器
 统一管理飞书和Notion平台的集成
 """
+import functools
+import os
+import threading
 import yaml
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
 
 from platform_adapter import (
@@ -13,11 +17,120 @@ from platform_adapter import (
     ProjectManager, DocumentGenerator, Notifier, FileManager,
     ProjectStatus, StageStatus
 )
+import platform_outbox as outbox
+from circuit_breaker import breaker_states, deadline, submit_with_context
+from platform_mirror import PlatformMirror, DEFAULT_MAX_STALENESS
+
+try:
+    import streamlit as st  # 部署在 Streamlit Cloud 时配置放在 Secrets 中
+except ImportError:
+    st = None
+
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "config" / "platform_config.yaml"
+
+# complete_project 同时上传的文件数
+UPLOAD_CONCURRENCY = 4
+
+# 高层操作的总时间预算（秒），可用配置项 deadlines 覆盖，0 表示不限制
+OPERATION_DEADLINES = {
+    "create_new_project": 30,
+    "update_stage_progress": 20,
+    "update_stages_progress": 20,
+    "complete_project": 180,
+    "add_pressure_test_result": 20,
+    "add_pressure_test_results": 20,
+}
+
+# 阶段显示名称
+STAGE_NAMES = {
+    "D": "D - 矩阵提取",
+    "B": "B - 转化路径设计",
+    "C": "C - 质检暴改",
+    "A": "A - 商业提案"
+}
+
+
+# ============ 配置缓存 ============
+
+_config_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_config_lock = threading.Lock()
+
+
+def load_platform_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    读取平台配置（优先 Streamlit Secrets；配置文件按 mtime 缓存，文件修改后自动重新解析）
+
+    Returns:
+        配置字典；文件未变化时返回同一个对象
+    """
+    try:
+        if st is None:
+            raise ImportError
+        if hasattr(st, 'secrets') and 'platform_config' in st.secrets:
+            config = dict(st.secrets['platform_config'])
+            with _config_lock:
+                cached = _config_cache.get("<secrets>")
+                if cached and cached[1] == config:
+                    return cached[1]
+                print("📦 从 Streamlit Secrets 加载配置")
+                _config_cache["<secrets>"] = (0.0, config)
+                return config
+    except (ImportError, KeyError, FileNotFoundError):
+        pass
+
+    path = str(config_path or DEFAULT_CONFIG_PATH)
+    mtime = os.stat(path).st_mtime
+    with _config_lock:
+        cached = _config_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        print(f"📦 从文件加载配置: {path}")
+        with open(path) as f:
+            config = yaml.safe_load(f)
+        _config_cache[path] = (mtime, config)
+        return config
+
+
+def _with_deadline(method):
+    """按 OPERATION_DEADLINES 给高层操作设置总时间预算，超时抛 circuit_breaker.DeadlineExceeded"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with deadline(self.operation_deadline(method.__name__), method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class _LazyAdapter:
+    """首次访问时才创建适配器（create(manager)），结果缓存在实例 __dict__ 中，之后的访问不再经过描述符"""
+
+    def __init__(self, create):
+        self.create = create
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        with instance._adapter_lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.create(instance)
+            return instance.__dict__[self.name]
 
 
 class PlatformIntegrationManager:
     """平台集成管理器 - 简化平台操作"""
 
+    # 适配器按需创建：只用到项目管理的调用方不会初始化文档、通知、文件适配器
+    project_manager: ProjectManager = _LazyAdapter(lambda m: m._create_adapter("project_manager"))
+    document_generator: DocumentGenerator = _LazyAdapter(lambda m: m._create_adapter("document_generator"))
+    notifier: Notifier = _LazyAdapter(lambda m: m._create_adapter("notifier"))
+    file_manager: FileManager = _LazyAdapter(lambda m: m._create_adapter("file_manager"))
+    mirror: PlatformMirror = _LazyAdapter(lambda m: PlatformMirror(m.project_manager, m._mirror_staleness()))
+
+    _ADAPTERS = ("project_manager", "document_generator", "notifier", "file_manager", "mirror")
+
     def __init__(self, config_path: str = None):
         """
         初始化平台集成管理器
@@ -25,43 +138,35 @@ class PlatformIntegrationManager:
         Args:
             config_path: 配置文件路径，默认为 config/platform_config.yaml
         """
-        # 优先从 Streamlit Secrets 读取配置
-        try:
-            import streamlit as st
-            if hasattr(st, 'secrets') and 'platform_config' in st.secrets:
-                print("📦 从 Streamlit Secrets 加载配置")
-                self.config = dict(st.secrets['platform_config'])
-            else:
-                raise KeyError("No secrets found")
-        except (ImportError, KeyError):
-            # 从文件读取配置
-            if config_path is None:
-                config_path = Path(__file__).parent.parent / "config" / "platform_config.yaml"
-
-            print(f"📦 从文件加载配置: {config_path}")
-            with open(config_path) as f:
-                self.config = yaml.safe_load(f)
+        self.config_path = config_path
+        self._adapter_lock = threading.RLock()
+        self.config = load_platform_config(config_path)
 
         # 获取默认平台
         platform_name = self.config.get("default_platform", "feishu")
         self.platform = Platform.FEISHU if platform_name == "feishu" else Platform.NOTION
 
-        # 初始化适配器
-        platform_config = self.config.get(platform_name, {})
-        self.project_manager: ProjectManager = PlatformAdapterFactory.create_project_manager(
-            self.platform, platform_config
-        )
-        self.document_generator: DocumentGenerator = PlatformAdapterFactory.create_document_generator(
-            self.platform, platform_config
-        )
-        self.notifier: Notifier = PlatformAdapterFactory.create_notifier(
-            self.platform, platform_config
-        )
-        self.file_manager: FileManager = PlatformAdapterFactory.create_file_manager(
-            self.platform, platform_config
-        )
+    @property
+    def platform_config(self) -> Dict[str, Any]:
+        return self.config.get(self.platform.value, {})
 
-        print(f"✅ 平台集成管理器已初始化 - 使用平台: {platform_name.upper()}")
+    @property
+    def sync_platforms(self) -> List[Platform]:
+        """
+        需要同步的平台（配置项 sync_platforms，如 [feishu, notion]），当前平台排在第一位作为主平台
+        未配置时只同步当前平台
+        """
+        others = [Platform(name) for name in self.config.get("sync_platforms") or [] if name != self.platform.value]
+        return [self.platform] + others
+
+    def _create_adapter(self, kind: str):
+        """创建当前平台的适配器；同步多个平台时创建并发写入各平台的组合适配器"""
+        factory = getattr(PlatformAdapterFactory, f"create_{kind}")
+        platforms = self.sync_platforms
+        if len(platforms) == 1:
+            return factory(self.platform, self.platform_config)
+        from platform_fanout import FANOUT_ADAPTERS
+        return FANOUT_ADAPTERS[kind]({p: factory(p, self.config.get(p.value, {})) for p in platforms})
 
     def switch_platform(self, platform_name: str):
         """
@@ -71,25 +176,41 @@ class PlatformIntegrationManager:
             platform_name: 平台名称 (feishu/notion)
         """
         self.platform = Platform.FEISHU if platform_name == "feishu" else Platform.NOTION
-        platform_config = self.config.get(platform_name, {})
+        self._reset_adapters()
+        print(f"✅ 已切换到平台: {platform_name.upper()}")
 
-        self.project_manager = PlatformAdapterFactory.create_project_manager(
-            self.platform, platform_config
-        )
-        self.document_generator = PlatformAdapterFactory.create_document_generator(
-            self.platform, platform_config
-        )
-        self.notifier = PlatformAdapterFactory.create_notifier(
-            self.platform, platform_config
-        )
-        self.file_manager = PlatformAdapterFactory.create_file_manager(
-            self.platform, platform_config
-        )
+    def reload_config(self) -> bool:
+        """
+        配置文件有修改时重新加载，并按新配置重建适配器
 
-        print(f"✅ 已切换到平台: {platform_name.upper()}")
+        Returns:
+            配置是否有变化
+        """
+        config = load_platform_config(self.config_path)
+        if config is self.config:
+            return False
+        self.config = config
+        platform_name = config.get("default_platform", "feishu")
+        self.platform = Platform.FEISHU if platform_name == "feishu" else Platform.NOTION
+        self._reset_adapters()
+        return True
+
+    def _reset_adapters(self):
+        with self._adapter_lock:
+            for name in self._ADAPTERS:
+                self.__dict__.pop(name, None)
+
+    def operation_deadline(self, operation: str) -> float:
+        """高层操作的时间预算（秒），配置项 deadlines.<操作名> 优先"""
+        return float(self.config.get("deadlines", {}).get(operation, OPERATION_DEADLINES.get(operation, 0)))
+
+    def _mirror_staleness(self) -> float:
+        """本地镜像允许的最大陈旧时间（配置项 mirror.max_staleness_seconds）"""
+        return float(self.config.get("mirror", {}).get("max_staleness_seconds", DEFAULT_MAX_STALENESS))
 
     # ============ 高级封装方法 ============
 
+    @_with_deadline
     def create_new_project(self, client_data: Dict[str, Any]) -> str:
         """
         创建新项目并自动同步到平台
@@ -102,8 +223,9 @@ class PlatformIntegrationManager:
         """
         print(f"\n🚀 开始创建项目: {client_data.get('client_name')}")
 
-        # 1. 创建项目记录
+        # 1. 创建项目记录（经发件箱投递时立即记下，之后的步骤失败重试也不会重复创建）
         project_id = self.project_manager.create_project(client_data)
+        outbox.save_checkpoint("remote_id", project_id)
 
         # 2. 创建文件夹（如果支持）
         try:
@@ -112,23 +234,28 @@ class PlatformIntegrationManager:
         except Exception as e:
             print(f"⚠️  创建文件夹失败: {e}")
 
+        self.mirror.invalidate("projects")
+
         # 3. 发送通知
         self.notifier.send_progress_notification(
             project_id=project_id,
             stage="项目创建",
             status=StageStatus.COMPLETED,
-            message=f"客户【{client_data.get('client_name')}】的项目已成功创建！"
+            message=f"客户【{client_data.get('client_name')}】的项目已成功创建！",
+            client_name=client_data.get("client_name")
         )
 
         return project_id
 
+    @_with_deadline
     def update_stage_progress(
         self,
         project_id: str,
         stage: str,
         status: StageStatus,
         duration_minutes: int = 0,
-        result_file: str = None
+        result_file: str = None,
+        client_name: Optional[str] = None
     ):
         """
         更新阶段进度
@@ -139,7 +266,10 @@ class PlatformIntegrationManager:
             status: 阶段状态
             duration_minutes: 耗时（分钟）
             result_file: 结果文件路径
+            client_name: 客户名称（通知标题用，不传时从本地镜像查）
         """
+        client_name = client_name or self._client_name(project_id)
+
         # 1. 添加阶段记录
         stage_data = {
             "project_id": project_id,
@@ -154,22 +284,68 @@ class PlatformIntegrationManager:
             stage_data["end_time"] = datetime.now().timestamp()
 
         self.project_manager.add_stage_record(stage_data)
+        self.mirror.invalidate()
 
         # 2. 发送进度通知
-        stage_names = {
-            "D": "D - 矩阵提取",
-            "B": "B - 转化路径设计",
-            "C": "C - 质检暴改",
-            "A": "A - 商业提案"
-        }
+        self.notifier.send_progress_notification(
+            project_id=project_id,
+            stage=STAGE_NAMES.get(stage, stage),
+            status=status,
+            message=f"耗时: {duration_minutes}分钟" if duration_minutes else "正在执行中...",
+            client_name=client_name
+        )
+
+    @_with_deadline
+    def update_stages_progress(
+        self,
+        project_id: str,
+        stages: List[str],
+        status: StageStatus,
+        duration_minutes: int = 0,
+        client_name: Optional[str] = None
+    ) -> List[str]:
+        """
+        批量更新多个阶段进度（一次批量写入 + 一条合并通知）
+
+        Args:
+            project_id: 项目ID
+            stages: 阶段列表，如 ["D", "B", "C", "A"]
+            status: 阶段状态
+            duration_minutes: 每个阶段的耗时（分钟）
+            client_name: 客户名称（通知标题用，不传时从本地镜像查）
+
+        Returns:
+            阶段记录ID列表
+        """
+        client_name = client_name or self._client_name(project_id)
+        now = datetime.now().timestamp()
+        stage_data_list = []
+        for stage in stages:
+            stage_data = {
+                "project_id": project_id,
+                "stage": stage,
+                "status": status.value,
+                "start_time": now,
+                "duration_minutes": duration_minutes,
+                "notes": f"{stage}阶段执行完成" if status == StageStatus.COMPLETED else f"{stage}阶段执行中"
+            }
+            if status == StageStatus.COMPLETED:
+                stage_data["end_time"] = now
+            stage_data_list.append(stage_data)
+
+        record_ids = self.project_manager.add_stage_records(stage_data_list)
+        self.mirror.invalidate()
 
         self.notifier.send_progress_notification(
             project_id=project_id,
-            stage=stage_names.get(stage, stage),
+            stage=" → ".join(STAGE_NAMES.get(stage, stage) for stage in stages),
             status=status,
-            message=f"耗时: {duration_minutes}分钟" if duration_minutes else "正在执行中..."
+            message=f"每阶段耗时: {duration_minutes}分钟" if duration_minutes else "正在执行中...",
+            client_name=client_name
         )
+        return record_ids
 
+    @_with_deadline
     def complete_project(
         self,
         project_id: str,
@@ -196,21 +372,36 @@ class PlatformIntegrationManager:
 
         # 1. 更新项目状态
         self.project_manager.update_project_status(project_id, ProjectStatus.COMPLETED)
-
-        # 2. 生成交付文档
-        doc_url = self.document_generator.create_project_document(
-            project_id=project_id,
-            client_name=client_name,
-            results=results
-        )
-
-        # 3. 上传结果文件（如果支持）
+        self.mirror.invalidate("projects")
+
+        # 2. 生成交付文档（经发件箱投递时，已生成的文档和已上传的文件在重试时跳过）
+        doc_url = outbox.load_checkpoint("doc_url")
+        if doc_url is None:
+            doc_url = self.document_generator.create_project_document(
+                project_id=project_id,
+                client_name=client_name,
+                results=results
+            )
+            outbox.save_checkpoint("doc_url", doc_url)
+
+        # 3. 上传结果文件（如果支持），多个文件并行上传
         try:
-            folder_id = self.file_manager.create_client_folder(client_name)
-            for stage, file_path in results.items():
-                if file_path and Path(file_path).exists():
-                    self.file_manager.upload_file(folder_id, file_path)
-                    print(f"📤 已上传: {Path(file_path).name}")
+            folder_id = outbox.load_checkpoint("folder_id")
+            if folder_id is None:
+                folder_id = self.file_manager.create_client_folder(client_name)
+                outbox.save_checkpoint("folder_id", folder_id)
+            file_paths = [p for p in results.values()
+                          if p and Path(p).exists() and outbox.load_checkpoint(f"upload:{p}") is None]
+            with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as executor:
+                futures = {submit_with_context(executor, self.file_manager.upload_file, folder_id, p): p
+                           for p in file_paths}
+                for future in as_completed(futures):
+                    name = Path(futures[future]).name
+                    try:
+                        outbox.save_checkpoint(f"upload:{futures[future]}", future.result())
+                        print(f"📤 已上传: {name}")
+                    except Exception as e:
+                        print(f"⚠️  上传文件失败: {name} - {e}")
         except Exception as e:
             print(f"⚠️  上传文件失败: {e}")
 
@@ -223,6 +414,7 @@ class PlatformIntegrationManager:
 
         return doc_url
 
+    @_with_deadline
     def add_pressure_test_result(
         self,
         project_id: str,
@@ -243,26 +435,146 @@ class PlatformIntegrationManager:
             mention_rate: 提及率
             trend: 趋势 (↑/→/↓)
         """
-        test_data = {
-            "project_id": project_id,
-            "test_time": datetime.now().timestamp(),
+        self.add_pressure_test_results(project_id, [{
             "engines": engines,
             "keyword_count": keyword_count,
             "avg_score": avg_score,
             "mention_rate": mention_rate,
             "trend": trend
-        }
+        }])
+
+    @_with_deadline
+    def add_pressure_test_results(self, project_id: str, results: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量添加压力测试结果（如每个引擎一条，一次批量写入）
+
+        Args:
+            project_id: 项目ID
+            results: [{"engines", "keyword_count", "avg_score", "mention_rate", "trend"}]
+
+        Returns:
+            测试记录ID列表
+        """
+        now = datetime.now().timestamp()
+        test_data_list = [
+            {"project_id": project_id, "test_time": now, "trend": "→", **result}
+            for result in results
+        ]
+        record_ids = self.project_manager.add_pressure_test_records(test_data_list)
+        self.mirror.invalidate("pressure_tests")
+        for result in results:
+            print(f"📊 压力测试结果已记录: {'/'.join(result.get('engines', []))} "
+                  f"平均分 {result.get('avg_score')}, 提及率 {result.get('mention_rate')}%")
+        return record_ids
+
+    # ============ 异步同步（写入发件箱，由后台派发线程投递） ============
+
+    def sync_new_project(self, client_data: Dict[str, Any], project_key: Optional[str] = None) -> str:
+        """
+        登记「创建项目」事件，立即返回本地 project_key（平台项目ID在投递成功后产生）
+
+        Args:
+            client_data: 客户数据字典
+            project_key: 本地项目标识，任务重试时传入同一个值可避免重复创建
+
+        Returns:
+            project_key
+        """
+        project_key = project_key or outbox.new_project_key()
+        outbox.enqueue(project_key, outbox.CREATE_PROJECT, {"project_data": client_data},
+                       idempotency_key=f"{project_key}:{outbox.CREATE_PROJECT}")
+        return project_key
+
+    def sync_stages_progress(
+        self,
+        project_key: str,
+        stages: List[str],
+        status: StageStatus,
+        duration_minutes: int = 0,
+        client_name: Optional[str] = None
+    ) -> int:
+        """登记阶段进度事件（投递时调用 update_stages_progress），返回事件ID"""
+        return outbox.enqueue(project_key, outbox.STAGES_PROGRESS, {
+            "stages": stages,
+            "status": status.value,
+            "duration_minutes": duration_minutes,
+            "client_name": client_name
+        })
+
+    def sync_complete_project(self, project_key: str, client_name: str, results: Dict[str, str]) -> int:
+        """登记完成交付事件（投递时调用 complete_project），返回事件ID"""
+        return outbox.enqueue(project_key, outbox.COMPLETE_PROJECT, {
+            "client_name": client_name,
+            "results": results
+        })
+
+    def sync_pressure_test_result(
+        self,
+        project_key: str,
+        engines: list,
+        keyword_count: int,
+        avg_score: float,
+        mention_rate: float,
+        trend: str = "→"
+    ) -> int:
+        """登记压力测试结果事件（投递时调用 add_pressure_test_result），返回事件ID；同一结果重复登记只投递一次"""
+        return outbox.enqueue(project_key, outbox.PRESSURE_TEST, {
+            "engines": engines,
+            "keyword_count": keyword_count,
+            "avg_score": avg_score,
+            "mention_rate": mention_rate,
+            "trend": trend
+        })
 
-        self.project_manager.add_pressure_test_record(test_data)
-        print(f"📊 压力测试结果已记录: 平均分 {avg_score}, 提及率 {mention_rate}%")
+    def get_sync_status(self, project_key: str) -> Dict[str, Any]:
+        """项目同步状态，见 platform_outbox.get_project"""
+        return outbox.get_project(project_key)
 
     def get_current_platform(self) -> str:
-        """获取当前平台名称"""
-        return "飞书" if self.platform == Platform.FEISHU else "Notion"
+        """获取当前平台名称（多平台同步时用 + 连接，主平台在前）"""
+        return " + ".join("飞书" if p == Platform.FEISHU else "Notion" for p in self.sync_platforms)
+
+    def get_sync_failures(self, limit: int = 50, project_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """多平台同步时最近的单平台失败记录（单平台模式下为空），project_key 为发件箱中的项目标识"""
+        if len(self.sync_platforms) == 1:
+            return []
+        from platform_fanout import recent_failures
+        return recent_failures(limit, project_key)
+
+    def get_circuit_states(self) -> Dict[str, Dict[str, Any]]:
+        """各接口熔断器状态，见 circuit_breaker.breaker_states"""
+        return breaker_states()
+
+    def get_project_info(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """获取项目信息（读本地镜像）"""
+        return self.mirror.get_project(project_id)
+
+    def _client_name(self, project_id: str) -> Optional[str]:
+        """项目的客户名称（用作通知标题；只读本地镜像，不在写入路径上同步或回源，查不到时返回 None）"""
+        try:
+            info = self.mirror.get_cached_project(project_id)
+        except Exception as e:
+            print(f"⚠️  读取项目信息失败: {e}")
+            return None
+        return (info or {}).get("客户名称") or None
+
+    def get_all_projects(self, status: Optional[ProjectStatus] = None,
+                         field_names: Optional[List[str]] = None) -> list:
+        """获取所有项目列表（读本地镜像，超过陈旧上限时先增量同步）"""
+        return self.mirror.list_projects(status, field_names)
+
+    def iter_projects(self, status: Optional[ProjectStatus] = None,
+                      field_names: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """逐条遍历项目，处理当前页时后台预取下一页"""
+        return self.project_manager.iter_projects(status, field_names)
+
+    def count_projects(self, status: Optional[ProjectStatus] = None) -> int:
+        """项目总数（读本地镜像）"""
+        return self.mirror.count_projects(status)
 
-    def get_all_projects(self, status: Optional[ProjectStatus] = None) -> list:
-        """获取所有项目列表"""
-        return self.project_manager.list_projects(status)
+    def sync_mirror(self, full: bool = False) -> int:
+        """立即同步本地镜像，返回写入的记录数"""
+        return self.mirror.sync(full)
 
 
 # ============ 便捷函数 ============
@@ -279,6 +591,9 @@ def get_platform_manager(config_path: str = None) -> PlatformIntegrationManager:
     """
     if not hasattr(get_platform_manager, "_instance"):
         get_platform_manager._instance = PlatformIntegrationManager(config_path)
+    else:
+        # 配置文件被修改（如设置页切换了默认平台）时按新配置重建适配器
+        get_platform_manager._instance.reload_config()
     return get_platform_manager._instance
 
 
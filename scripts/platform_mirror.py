@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+平台数据本地镜像
+把飞书多维表格 / Notion 数据库中的项目、阶段、压力测试记录镜像到本地 SQLite，
+按最后修改时间增量同步；读取直接查本地，超过 max_staleness 秒才先做一次增量同步。
+增量同步发现不了平台侧删除的记录，因此每隔 FULL_SYNC_INTERVAL 做一次全量同步。
+
+用法：
+    mirror = PlatformMirror(project_manager, max_staleness=300)
+    mirror.list_projects()            # 本地读取（必要时先增量同步）
+    mirror.get_project(project_id)
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from platform_adapter import ProjectManager, ProjectStatus
+from sqlite_store import OUTPUT_ROOT, connect
+
+
+DB_PATH = Path(os.getenv("GEO_MIRROR_DB", str(OUTPUT_ROOT / ".platform_mirror.sqlite")))
+
+DEFAULT_MAX_STALENESS = 300       # 读取时允许的最大陈旧时间（秒）
+FULL_SYNC_INTERVAL = 24 * 3600    # 全量同步间隔（清理平台侧已删除的记录）
+CLOCK_SKEW = 60                   # 增量水位回退秒数，容忍平台与本地的时钟误差
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    tbl TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    modified_at REAL NOT NULL,
+    PRIMARY KEY (tbl, record_id)
+);
+CREATE INDEX IF NOT EXISTS idx_records_id ON records(record_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    tbl TEXT PRIMARY KEY,
+    watermark REAL NOT NULL DEFAULT 0,
+    synced_at REAL NOT NULL DEFAULT 0,
+    full_synced_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+def _connect():
+    return connect(DB_PATH, _SCHEMA)
+
+
+class PlatformMirror:
+    """单个平台 ProjectManager 的本地只读镜像"""
+
+    def __init__(self, project_manager: ProjectManager, max_staleness: float = DEFAULT_MAX_STALENESS):
+        self.project_manager = project_manager
+        self.max_staleness = max_staleness
+        # 不同平台/不同表格各自独立的镜像命名空间
+        namespace = getattr(project_manager, "MIRROR_NAMESPACE", type(project_manager).__name__)
+        self.tables = {name: f"{namespace}:{table_id}"
+                       for name, table_id in project_manager.mirror_tables().items()}
+        self._sync_lock = threading.Lock()
+
+    # ============ 同步 ============
+
+    def sync(self, full: bool = False) -> int:
+        """
+        同步全部镜像表
+
+        Args:
+            full: 是否全量同步（否则只拉取上次水位之后修改的记录）
+
+        Returns:
+            写入的记录数
+        """
+        with self._sync_lock:
+            return sum(self._sync_table(name, full) for name in self.tables)
+
+    def _sync_table(self, name: str, full: bool) -> int:
+        tbl = self.tables[name]
+        state = self._state(tbl)
+        now = time.time()
+        full = full or now - state["full_synced_at"] > FULL_SYNC_INTERVAL
+        since = None if full else max(0.0, state["watermark"] - CLOCK_SKEW)
+        table_id = self.project_manager.mirror_tables()[name]
+
+        rows = []
+        watermark = 0.0 if full else state["watermark"]
+        for record in self.project_manager.iter_table_records(table_id, modified_since=since):
+            rows.append((tbl, record["id"], json.dumps(record["fields"], ensure_ascii=False), record["modified_at"]))
+            watermark = max(watermark, record["modified_at"])
+
+        with _connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if full:
+                conn.execute("DELETE FROM records WHERE tbl = ?", (tbl,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (tbl, record_id, fields, modified_at) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.execute(
+                "INSERT INTO sync_state (tbl, watermark, synced_at, full_synced_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(tbl) DO UPDATE SET watermark = excluded.watermark, synced_at = excluded.synced_at, "
+                "full_synced_at = CASE WHEN ? THEN excluded.full_synced_at ELSE full_synced_at END",
+                (tbl, watermark, now, now if full else state["full_synced_at"], full)
+            )
+            conn.execute("COMMIT")
+        return len(rows)
+
+    def _state(self, tbl: str) -> Dict[str, float]:
+        with _connect() as conn:
+            row = conn.execute("SELECT * FROM sync_state WHERE tbl = ?", (tbl,)).fetchone()
+        return dict(row) if row else {"watermark": 0.0, "synced_at": 0.0, "full_synced_at": 0.0}
+
+    def _ensure_fresh(self, name: str):
+        if name not in self.tables:
+            return
+        if time.time() - self._state(self.tables[name])["synced_at"] <= self.max_staleness:
+            return
+        with self._sync_lock:
+            # 等锁期间其他线程可能已经同步过
+            if time.time() - self._state(self.tables[name])["synced_at"] > self.max_staleness:
+                self._sync_table(name, full=False)
+
+    def invalidate(self, name: Optional[str] = None):
+        """平台侧有写入后调用：下次读取前先做一次增量同步"""
+        tbls = [self.tables[name]] if name else list(self.tables.values())
+        with _connect() as conn:
+            conn.executemany("UPDATE sync_state SET synced_at = 0 WHERE tbl = ?", [(t,) for t in tbls])
+
+    # ============ 读取 ============
+
+    def get_project(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """项目信息（本地未命中时直接回源查询，不写入镜像，由下次增量同步补上）"""
+        for name in self.tables:
+            self._ensure_fresh(name)
+        return self.get_cached_project(project_id) or self.project_manager.get_project_info(project_id)
+
+    def get_cached_project(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """只查本地镜像中的项目信息（不同步、不回源，未命中返回 None）"""
+        with _connect() as conn:
+            row = conn.execute(
+                "SELECT fields FROM records WHERE record_id = ? AND tbl IN (%s)" % ",".join("?" * len(self.tables)),
+                (project_id, *self.tables.values())
+            ).fetchone()
+        return json.loads(row["fields"]) if row else None
+
+    def list_projects(self, status: Optional[ProjectStatus] = None,
+                      field_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """项目列表（与 ProjectManager.list_projects 返回格式一致）"""
+        if "projects" not in self.tables:
+            return self.project_manager.list_projects(status, field_names)
+        self._ensure_fresh("projects")
+        with _connect() as conn:
+            rows = conn.execute(
+                "SELECT record_id, fields FROM records WHERE tbl = ? ORDER BY modified_at DESC",
+                (self.tables["projects"],)
+            ).fetchall()
+        projects = []
+        for row in rows:
+            fields = json.loads(row["fields"])
+            # 飞书的阶段记录也写在项目表中，不算项目
+            if "执行阶段" in fields or "项目ID" in fields:
+                continue
+            if status and fields.get("项目状态") != status.value:
+                continue
+            if field_names:
+                fields = {k: v for k, v in fields.items() if k in field_names}
+            projects.append({"id": row["record_id"], **fields})
+        return projects
+
+    def count_projects(self, status: Optional[ProjectStatus] = None) -> int:
+        return len(self.list_projects(status, field_names=["项目状态"]))
+
+    def list_records(self, name: str) -> List[Dict[str, Any]]:
+        """某个镜像表（projects/stages/pressure_tests）的全部记录"""
+        if name not in self.tables:
+            return []
+        self._ensure_fresh(name)
+        with _connect() as conn:
+            rows = conn.execute(
+                "SELECT record_id, fields FROM records WHERE tbl = ? ORDER BY modified_at DESC", (self.tables[name],)
+            ).fetchall()
+        return [{"id": r["record_id"], **json.loads(r["fields"])} for r in rows]
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+平台同步发件箱（outbox）
+流水线只把「创建项目 / 阶段进度 / 完成交付 / 压力测试」等事件写入本地 SQLite，
+由后台派发线程投递到飞书/Notion：失败按指数退避重试，同一项目的事件严格按写入顺序投递，
+幂等键保证任务重试或重复提交时同一事件只写入一次。
+某条事件重试耗尽被放弃后，该项目之后的事件暂停投递，直到 `python platform_outbox.py retry` 重新排队后再按顺序继续。
+
+一个事件在平台上可能分多步完成（创建记录、创建文档、逐批写入内容、上传文件），每完成一步用
+save_checkpoint 记下结果，重试时从断点继续而不是重新创建；飞书的创建接口还带上由幂等键派生的
+client_token，请求发出后进程崩溃来不及记断点时，平台也不会重复创建。
+
+项目在本地用 project_key 标识，平台侧的项目ID在「创建项目」事件投递成功后才产生，
+后续事件在投递时再解析为平台项目ID。
+
+用法：
+    python platform_outbox.py dispatch    # 前台运行派发循环
+    python platform_outbox.py status      # 查看积压与失败事件
+"""
+import argparse
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlite_store import OUTPUT_ROOT, connect
+
+
+DB_PATH = Path(os.getenv("GEO_OUTBOX_DB", str(OUTPUT_ROOT / ".outbox.sqlite")))
+
+# 事件状态
+PENDING = "pending"
+DELIVERING = "delivering"
+DELIVERED = "delivered"
+DEAD = "dead"
+
+STATUS_LABELS = {
+    PENDING: "⏳ 待投递",
+    DELIVERING: "📤 投递中",
+    DELIVERED: "✅ 已投递",
+    DEAD: "❌ 已放弃",
+}
+
+# 事件类型
+CREATE_PROJECT = "create_project"
+STAGES_PROGRESS = "stages_progress"
+COMPLETE_PROJECT = "complete_project"
+PRESSURE_TEST = "pressure_test"
+
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 5             # 第 n 次失败后等待 BACKOFF_BASE * 2^(n-1) 秒
+BACKOFF_MAX = 600
+LEASE_SECONDS = 600          # 投递中的事件超过该时间未完成视为派发进程已退出
+POLL_INTERVAL = 1.0
+DISPATCH_CONCURRENCY = 4     # 不同项目的事件并行投递
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_events_project ON events(project_key, id);
+CREATE INDEX IF NOT EXISTS idx_events_status ON events(status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS projects (
+    project_key TEXT PRIMARY KEY,
+    remote_id TEXT,
+    doc_url TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    idempotency_key TEXT NOT NULL,
+    step TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (idempotency_key, step)
+);
+"""
+
+# 正在投递的事件（投递期间设置，submit_with_context 会把它带到工作线程）
+_current_event: contextvars.ContextVar = contextvars.ContextVar("outbox_event", default=None)
+
+
+# ============ 数据库访问 ============
+
+def _connect():
+    return connect(DB_PATH, _SCHEMA)
+
+
+def _row_to_event(row: sqlite3.Row) -> Dict[str, Any]:
+    event = dict(row)
+    event["payload"] = json.loads(event["payload"])
+    event["result"] = json.loads(event["result"]) if event["result"] else None
+    return event
+
+
+# ============ 写入 ============
+
+def new_project_key() -> str:
+    """生成本地项目标识"""
+    return uuid.uuid4().hex[:16]
+
+
+def enqueue(project_key: str, kind: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> int:
+    """
+    写入一条待投递事件
+
+    Args:
+        project_key: 本地项目标识（同一项目的事件按写入顺序投递）
+        kind: 事件类型
+        payload: 事件内容（需可 JSON 序列化）
+        idempotency_key: 幂等键，默认由项目、类型和内容计算；重复写入同一幂等键时忽略
+
+    Returns:
+        事件ID
+    """
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    if idempotency_key is None:
+        digest = hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+        idempotency_key = f"{project_key}:{kind}:{digest}"
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO events (project_key, kind, payload, idempotency_key, status, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (project_key, kind, body, idempotency_key, PENDING, time.time(), time.time())
+        )
+        row = conn.execute("SELECT id FROM events WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+    return row["id"]
+
+
+# ============ 查询 ============
+
+def get_project(project_key: str) -> Dict[str, Any]:
+    """
+    项目同步状态
+
+    Returns:
+        {"remote_id", "doc_url", "pending", "dead", "last_error"}
+    """
+    with _connect() as conn:
+        row = conn.execute("SELECT remote_id, doc_url FROM projects WHERE project_key = ?", (project_key,)).fetchone()
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM events WHERE project_key = ? GROUP BY status", (project_key,)
+        ).fetchall())
+        error = conn.execute(
+            "SELECT last_error FROM events WHERE project_key = ? AND last_error IS NOT NULL "
+            "AND status != ? ORDER BY id DESC LIMIT 1",
+            (project_key, DELIVERED)
+        ).fetchone()
+    return {
+        "remote_id": row["remote_id"] if row else None,
+        "doc_url": row["doc_url"] if row else None,
+        "pending": counts.get(PENDING, 0) + counts.get(DELIVERING, 0),
+        "dead": counts.get(DEAD, 0),
+        "last_error": error["last_error"] if error else None,
+    }
+
+
+def backlog() -> Dict[str, int]:
+    """各状态事件数"""
+    with _connect() as conn:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM events GROUP BY status").fetchall())
+
+
+def list_events(status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """按ID倒序列出事件"""
+    sql = "SELECT * FROM events"
+    args: List[Any] = []
+    if status:
+        sql += " WHERE status = ?"
+        args.append(status)
+    sql += " ORDER BY id DESC LIMIT ?"
+    args.append(limit)
+    with _connect() as conn:
+        rows = conn.execute(sql, args).fetchall()
+    return [_row_to_event(r) for r in rows]
+
+
+def retry_dead(project_key: Optional[str] = None) -> int:
+    """把已放弃的事件重新置为待投递，返回条数"""
+    sql = "UPDATE events SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ?"
+    args: List[Any] = [PENDING, time.time(), DEAD]
+    if project_key:
+        sql += " AND project_key = ?"
+        args.append(project_key)
+    with _connect() as conn:
+        return conn.execute(sql, args).rowcount
+
+
+# ============ 投递断点 ============
+
+def _current_key() -> Optional[str]:
+    event = _current_event.get()
+    return event["idempotency_key"] if event else None
+
+
+def current_project_key() -> Optional[str]:
+    """正在投递的事件所属的 project_key（不在投递中时返回 None）"""
+    event = _current_event.get()
+    return event["project_key"] if event else None
+
+
+def load_checkpoint(step: str) -> Any:
+    """当前事件某一步上次投递时记下的结果（不在投递中或该步未完成时返回 None）"""
+    key = _current_key()
+    if key is None:
+        return None
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT value FROM checkpoints WHERE idempotency_key = ? AND step = ?", (key, step)
+        ).fetchone()
+    return json.loads(row["value"]) if row else None
+
+
+def save_checkpoint(step: str, value: Any):
+    """记下当前事件某一步的结果（平台侧写入成功后立即调用；不在投递中时忽略）"""
+    key = _current_key()
+    if key is None:
+        return
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoints (idempotency_key, step, value) VALUES (?, ?, ?)",
+            (key, step, json.dumps(value, ensure_ascii=False))
+        )
+
+
+def client_token(*parts: Any) -> Optional[str]:
+    """
+    由当前事件的幂等键派生的请求幂等标识（UUIDv4 格式，飞书 client_token 要求）；不在投递中时返回 None
+
+    Args:
+        parts: 区分同一事件内不同请求的部分（如表ID、分批序号）
+    """
+    key = _current_key()
+    if key is None:
+        return None
+    digest = hashlib.sha256("|".join(map(str, (key, *parts))).encode("utf-8")).digest()
+    return str(uuid.UUID(bytes=digest[:16], version=4))
+
+
+# ============ 派发 ============
+
+def _claim_next(exclude_projects: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    原子地领取一条可投递事件：该项目更早的事件都已投递（有已放弃的事件时整个项目暂停），且不在本进程投递中的项目里
+    """
+    now = time.time()
+    placeholders = ",".join("?" * len(exclude_projects))
+    exclude_sql = f"AND e.project_key NOT IN ({placeholders})" if exclude_projects else ""
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 派发进程退出后遗留的投递中事件重新放回队列
+            conn.execute(
+                "UPDATE events SET status = ? WHERE status = ? AND lease_until < ?",
+                (PENDING, DELIVERING, now)
+            )
+            row = conn.execute(
+                f"""
+                SELECT * FROM events e
+                WHERE e.status = ? AND e.next_attempt_at <= ? {exclude_sql}
+                  AND NOT EXISTS (
+                      SELECT 1 FROM events p
+                      WHERE p.project_key = e.project_key AND p.id < e.id AND p.status IN (?, ?, ?)
+                  )
+                ORDER BY e.id LIMIT 1
+                """,
+                (PENDING, now, *exclude_projects, PENDING, DELIVERING, DEAD)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE events SET status = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (DELIVERING, now + LEASE_SECONDS, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    event = _row_to_event(row)
+    event["attempts"] += 1
+    return event
+
+
+def _mark_delivered(event: Dict[str, Any], result: Dict[str, Any]):
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE events SET status = ?, result = ?, last_error = NULL, lease_until = NULL, delivered_at = ? WHERE id = ?",
+            (DELIVERED, json.dumps(result, ensure_ascii=False), time.time(), event["id"])
+        )
+        conn.execute("DELETE FROM checkpoints WHERE idempotency_key = ?", (event["idempotency_key"],))
+        if result.get("remote_id") or result.get("doc_url"):
+            conn.execute(
+                "INSERT INTO projects (project_key, remote_id, doc_url, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(project_key) DO UPDATE SET "
+                "remote_id = COALESCE(excluded.remote_id, remote_id), "
+                "doc_url = COALESCE(excluded.doc_url, doc_url), updated_at = excluded.updated_at",
+                (event["project_key"], result.get("remote_id"), result.get("doc_url"), time.time())
+            )
+        conn.execute("COMMIT")
+
+
+def _mark_failed(event: Dict[str, Any], error: str):
+    attempts = event["attempts"]
+    if attempts >= MAX_ATTEMPTS:
+        status, next_at = DEAD, time.time()
+    else:
+        status, next_at = PENDING, time.time() + min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE events SET status = ?, next_attempt_at = ?, last_error = ?, lease_until = NULL WHERE id = ?",
+            (status, next_at, error, event["id"])
+        )
+
+
+def _remote_id(project_key: str) -> Optional[str]:
+    with _connect() as conn:
+        row = conn.execute("SELECT remote_id FROM projects WHERE project_key = ?", (project_key,)).fetchone()
+    return row["remote_id"] if row else None
+
+
+def deliver(manager, event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把一条事件投递到平台（失败时抛异常，由派发循环重试）
+
+    Returns:
+        投递结果，{"remote_id"} 或 {"doc_url"} 会写回 projects 表
+    """
+    token = _current_event.set(event)
+    try:
+        return _deliver(manager, event)
+    finally:
+        _current_event.reset(token)
+
+
+def _deliver(manager, event: Dict[str, Any]) -> Dict[str, Any]:
+    from platform_adapter import StageStatus
+
+    kind = event["kind"]
+    payload = event["payload"]
+    remote_id = _remote_id(event["project_key"])
+
+    if kind == CREATE_PROJECT:
+        remote_id = remote_id or load_checkpoint("remote_id")
+        if remote_id:
+            # 上次已创建成功但未来得及标记投递，不重复创建
+            return {"remote_id": remote_id}
+        return {"remote_id": manager.create_new_project(payload["project_data"])}
+
+    if remote_id is None:
+        raise RuntimeError("项目尚未同步到平台，等待创建项目事件投递")
+
+    if kind == STAGES_PROGRESS:
+        record_ids = manager.update_stages_progress(
+            project_id=remote_id,
+            stages=payload["stages"],
+            status=StageStatus(payload["status"]),
+            duration_minutes=payload.get("duration_minutes", 0),
+            client_name=payload.get("client_name")
+        )
+        return {"record_ids": record_ids}
+    if kind == COMPLETE_PROJECT:
+        doc_url = manager.complete_project(remote_id, payload["client_name"], payload["results"])
+        return {"doc_url": doc_url}
+    if kind == PRESSURE_TEST:
+        manager.add_pressure_test_result(project_id=remote_id, **payload)
+        return {}
+    raise ValueError(f"未知的事件类型: {kind}")
+
+
+class OutboxDispatcher:
+    """后台派发：每个项目同一时刻只有一条事件在投递，不同项目并行"""
+
+    def __init__(self, manager_factory=None, concurrency: int = DISPATCH_CONCURRENCY):
+        self._manager_factory = manager_factory
+        self._manager = None
+        self._manager_lock = threading.Lock()
+        self._concurrency = concurrency
+        self._inflight: Dict[str, Any] = {}
+        self._inflight_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()   # 有事件投递完成时立即唤醒派发循环，认领该项目的下一条
+
+    def _get_manager(self):
+        with self._manager_lock:
+            if self._manager is None:
+                if self._manager_factory is None:
+                    from platform_integration_manager import get_platform_manager
+                    self._manager = get_platform_manager()
+                else:
+                    self._manager = self._manager_factory()
+            return self._manager
+
+    def _deliver(self, event: Dict[str, Any]):
+        try:
+            result = deliver(self._get_manager(), event)
+            _mark_delivered(event, result)
+            print(f"📤 已投递平台事件: {event['kind']} #{event['id']}")
+        except Exception as e:
+            _mark_failed(event, f"{e}\n{traceback.format_exc(limit=3)}")
+            print(f"⚠️  平台事件投递失败（第 {event['attempts']} 次）: {event['kind']} #{event['id']} - {e}")
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(event["project_key"], None)
+            self._wake.set()
+
+    def run(self):
+        """阻塞运行派发循环，直到 stop()"""
+        with ThreadPoolExecutor(max_workers=self._concurrency, thread_name_prefix="outbox") as executor:
+            while not self._stop.is_set():
+                with self._inflight_lock:
+                    busy = list(self._inflight)
+                event = _claim_next(busy) if len(busy) < self._concurrency else None
+                if event is None:
+                    self._wake.wait(POLL_INTERVAL)
+                    self._wake.clear()
+                    continue
+                with self._inflight_lock:
+                    self._inflight[event["project_key"]] = event["id"]
+                executor.submit(self._deliver, event)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+_dispatcher_thread: Optional[threading.Thread] = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_dispatcher() -> bool:
+    """
+    在当前进程启动后台派发线程（每个进程最多一个；多个进程同时派发也安全）
+
+    Returns:
+        是否新启动
+    """
+    global _dispatcher_thread
+    with _dispatcher_lock:
+        if _dispatcher_thread is not None and _dispatcher_thread.is_alive():
+            return False
+        _dispatcher_thread = threading.Thread(target=OutboxDispatcher().run, name="outbox-dispatcher", daemon=True)
+        _dispatcher_thread.start()
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GEO 平台同步发件箱")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("dispatch", help="前台运行派发循环")
+    sub.add_parser("status", help="查看积压与失败事件")
+    retry_parser = sub.add_parser("retry", help="重新投递已放弃的事件")
+    retry_parser.add_argument("--project", help="只重试该 project_key")
+
+    args = parser.parse_args()
+    if args.command == "dispatch":
+        try:
+            OutboxDispatcher().run()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "retry":
+        print(f"♻️  已重新排队 {retry_dead(args.project)} 条事件")
+    else:
+        counts = backlog()
+        print("  ".join(f"{STATUS_LABELS[s]}: {counts.get(s, 0)}" for s in STATUS_LABELS))
+        for event in list_events(DEAD, limit=20):
+            error = (event["last_error"] or "").splitlines()[0] if event["last_error"] else ""
+            print(f"#{event['id']}  {event['project_key']}  {event['kind']:<16} {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,207 @@
 
+import argparse
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
 from pptx import Presentation
 from pptx.util import Inches, Pt
 
-def parse_markdown_to_slides(md_content: str, prs):
+from markdown_blocks import AST_VERSION, content_hash, parse_markdown_cached, render
+from output_manifest import OUTPUT_ROOT, list_clients, record_file
+
+# Pipeline order and the stage names used in result file names ({client}_{stage}_{name}.md)
+STAGES = ["D", "B", "C", "A"]
+SUMMARY_FILE = "执行摘要.json"
+
+# The deck cache key lives next to the results; bump FRAGMENT_VERSION when the
+# slide layout changes so existing decks are rebuilt.
+CACHE_DIR_NAME = ".ppt_cache"
+FRAGMENT_VERSION = 2
+
+# Layout indices (common in default template):
+# 0: Title Slide
+# 1: Title and Content
+# 2: Section Header
+TITLE_LAYOUT = 0
+CONTENT_LAYOUT = 1
+SECTION_LAYOUT = 2
+
+
+def parse_markdown_to_fragments(md_content: str) -> List[Dict[str, Any]]:
     """
-    Parse a Markdown string and add slides to the Presentation object.
-    Simplistic parser:
-    - # Header 1 -> Title Slide
-    - ## Header 2 -> Title and Content Slide
-    - Other text -> Appended to current content
+    Slide fragments for a Markdown string, built from the shared (hash-cached) markdown AST:
+    [{"kind": "section" | "content", "title": str, "paragraphs": [[text, level], ...]}]
+
+    - # Header 1 -> Section Header slide
+    - ## Header 2 -> Title and Content slide
+    - Other blocks -> Appended to current content (list items indented by depth, table rows as text)
     """
-    lines = md_content.split('\n')
-    current_slide = None
-    text_frame = None
-
-    # Layout indices (common in default template):
-    # 0: Title Slide
-    # 1: Title and Content
-    # 2: Section Header
-    
-    for line in lines:
-        stripped = line.strip()
-        if not stripped:
+    return render(parse_markdown_cached(md_content), "slides")
+
+
+def render_fragments(fragments: List[Dict[str, Any]], prs):
+    """Add the slides described by fragments to the Presentation object."""
+    for fragment in fragments:
+        layout = SECTION_LAYOUT if fragment["kind"] == "section" else CONTENT_LAYOUT
+        slide = prs.slides.add_slide(prs.slide_layouts[layout])
+        slide.shapes.title.text = fragment["title"]
+        if layout != CONTENT_LAYOUT:
             continue
-            
-        if stripped.startswith('# '):
-            # Title Slide (or Section Header if in middle)
-            # Use Section Header for H1
-            layout = prs.slide_layouts[2] 
-            current_slide = prs.slides.add_slide(layout)
-            title = current_slide.shapes.title
-            title.text = stripped[2:].strip()
-            # Reset text frame
-            text_frame = None
-            
-        elif stripped.startswith('## '):
-            # Content Slide
-            layout = prs.slide_layouts[1]
-            current_slide = prs.slides.add_slide(layout)
-            title = current_slide.shapes.title
-            title.text = stripped[3:].strip()
-            # Get output placeholder
-            body_shape = current_slide.placeholders[1]
-            text_frame = body_shape.text_frame
-            text_frame.word_wrap = True
-            
-        else:
-            # Content body
-            if text_frame:
-                p = text_frame.add_paragraph()
-                p.text = stripped
-                p.level = 0
-                if stripped.startswith('- '):
-                    p.text = stripped[2:]
-                    p.level = 1
-            else:
-                # If no slide created yet, create a generic one
-                if current_slide is None:
-                    layout = prs.slide_layouts[1]
-                    current_slide = prs.slides.add_slide(layout)
-                    title = current_slide.shapes.title
-                    title.text = "Overview"
-                    body_shape = current_slide.placeholders[1]
-                    text_frame = body_shape.text_frame
-                
-                p = text_frame.add_paragraph()
-                p.text = stripped
-
-def generate_ppt(client_name: str, output_dir: str):
+        text_frame = slide.placeholders[1].text_frame
+        text_frame.word_wrap = True
+        for text, level in fragment["paragraphs"]:
+            p = text_frame.add_paragraph()
+            p.text = text
+            p.level = level
+
+
+def parse_markdown_to_slides(md_content: str, prs):
+    """Parse a Markdown string and add slides to the Presentation object."""
+    render_fragments(parse_markdown_to_fragments(md_content), prs)
+
+
+def find_stage_files(client_name: str, output_dir: str) -> List[Tuple[str, Path]]:
+    """
+    Stage result files in pipeline order (D -> B -> C -> A).
+
+    Uses the pipeline's execution summary (执行摘要.json) first; stages missing there
+    (e.g. generated by the bot) fall back to the {client}_{stage}_*.md naming.
+    """
+    output_path = Path(output_dir)
+    from_summary: Dict[str, Path] = {}
+    summary_path = output_path / SUMMARY_FILE
+    if summary_path.exists():
+        try:
+            results = json.loads(summary_path.read_text(encoding='utf-8')).get("results", {})
+        except ValueError:
+            results = {}
+        for stage, result in results.items():
+            if result.get("status") != "success" or not result.get("file"):
+                continue
+            # The summary may hold absolute paths from another machine; resolve by name
+            path = Path(result["file"])
+            if not path.exists():
+                path = output_path / path.name
+            if path.exists():
+                from_summary[stage] = path
+
+    files = []
+    for stage in STAGES:
+        path = from_summary.get(stage)
+        if path is None:
+            matches = sorted(output_path.glob(f"{client_name}_{stage}_*.md"))
+            path = matches[0] if matches else None
+        if path is not None:
+            files.append((stage, path))
+    return files
+
+
+def _stage_label(client_name: str, stage: str, path: Path) -> str:
+    # {client}_{stage}_{name}.md -> "D · 矩阵提取"
+    name = path.stem[len(f"{client_name}_{stage}_"):] if path.stem.startswith(f"{client_name}_{stage}_") else ""
+    return f"{stage} · {name}" if name else f"Module: {stage}"
+
+
+def generate_ppt(client_name: str, output_dir: str, force: bool = False) -> str:
     """
-    Generate a PPTX file from the Markdown results in the output_dir.
+    Generate a PPTX file from the stage results in the output_dir.
+
+    Each stage's markdown goes through the shared markdown AST cache (markdown_blocks), so a
+    file already parsed for the Notion / Feishu documents is not parsed again; when no stage
+    changed and the deck exists it is returned as is (force=True always rebuilds).
     """
     output_path = Path(output_dir)
+    if not output_path.is_dir():
+        raise FileNotFoundError(f"输出目录不存在: {output_dir}")
+    ppt_path = output_path / f"GEO_Report_{client_name}.pptx"
+    cache_dir = output_path / CACHE_DIR_NAME
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    stages = []
+    for stage, md_file in find_stage_files(client_name, output_dir):
+        content = md_file.read_text(encoding='utf-8')
+        stages.append((stage, md_file, content, content_hash(content)))
+    if not stages:
+        print(f"⚠️ {client_name}: 未找到阶段结果文件，PPT 只有封面")
+
+    deck_key = hashlib.sha256(json.dumps(
+        [FRAGMENT_VERSION, AST_VERSION, client_name, [(stage, md_file.name, h) for stage, md_file, _, h in stages]]
+    ).encode('utf-8')).hexdigest()
+    deck_file = cache_dir / "deck.json"
+    if not force and ppt_path.exists() and deck_file.exists():
+        try:
+            if json.loads(deck_file.read_text(encoding='utf-8')).get("key") == deck_key:
+                return str(ppt_path)
+        except ValueError:
+            pass
+
     prs = Presentation()
-    
+
     # Title Slide
-    title_slide_layout = prs.slide_layouts[0]
-    slide = prs.slides.add_slide(title_slide_layout)
-    title = slide.shapes.title
-    subtitle = slide.placeholders[1]
-    title.text = f"GEO Report: {client_name}"
-    subtitle.text = "Generated by GEO Business Tool"
-    
-    # Helper to find and parse files
-    files = list(output_path.glob("Result_Prompt_*.md"))
-    # Sort files to ensure D -> B -> C -> A or alphabetical
-    # Usually: Result_Prompt_A.md, Result_Prompt_B.md ...
-    # Pipeline order is D, B, C, A.
-    # We can try to respect that or just alphabetical.
-    # Let's define a priority map
-    priority = {'D': 0, 'B': 1, 'C': 2, 'A': 3}
-    
-    files.sort(key=lambda p: priority.get(p.stem.split('_')[-1], 99))
-    
-    for md_file in files:
+    slide = prs.slides.add_slide(prs.slide_layouts[TITLE_LAYOUT])
+    slide.shapes.title.text = f"GEO Report: {client_name}"
+    slide.placeholders[1].text = "Generated by GEO Business Tool"
+
+    for stage, md_file, content, _ in stages:
         # Add a section separator for the file
-        layout = prs.slide_layouts[2] # Section Header
-        slide = prs.slides.add_slide(layout)
-        title = slide.shapes.title
-        title.text = f"Module: {md_file.stem.replace('Result_Prompt_', '')}"
-        
-        content = md_file.read_text(encoding='utf-8')
-        parse_markdown_to_slides(content, prs)
-        
-    ppt_path = output_path / f"GEO_Report_{client_name}.pptx"
+        slide = prs.slides.add_slide(prs.slide_layouts[SECTION_LAYOUT])
+        slide.shapes.title.text = _stage_label(client_name, stage, md_file)
+        render_fragments(parse_markdown_to_fragments(content), prs)
+
     prs.save(str(ppt_path))
+    deck_file.write_text(json.dumps({"key": deck_key}), encoding='utf-8')
+    record_file(ppt_path)
     return str(ppt_path)
 
+
+def generate_ppts(client_names: List[str], workers: Optional[int] = None,
+                  force: bool = False) -> Dict[str, Dict[str, str]]:
+    """
+    Generate decks for several clients (output/<client>/) in a process pool.
+
+    Returns:
+        {client: {"path": pptx path} or {"error": message}}
+    """
+    results: Dict[str, Dict[str, str]] = {}
+    if not client_names:
+        return results
+    workers = workers or min(len(client_names), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(generate_ppt, name, str(OUTPUT_ROOT / name), force): name
+            for name in client_names
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = {"path": future.result()}
+                print(f"✅ {name}: {Path(results[name]['path']).name}")
+            except Exception as e:
+                results[name] = {"error": str(e)}
+                print(f"❌ {name}: {e}")
+    return results
+
+
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) > 2:
-        generate_ppt(sys.argv[1], sys.argv[2])
+    parser = argparse.ArgumentParser(description="Generate GEO report decks from pipeline results")
+    parser.add_argument("client_name", nargs="?", help="客户名称")
+    parser.add_argument("output_dir", nargs="?", help="客户输出目录")
+    parser.add_argument("--clients", nargs="+", help="批量生成这些客户（output/<客户>/）")
+    parser.add_argument("--all", action="store_true", help="批量生成所有有阶段结果的客户")
+    parser.add_argument("--workers", type=int, help="进程数（默认 CPU 核数）")
+    parser.add_argument("--force", action="store_true", help="忽略缓存，全部重新生成")
+    args = parser.parse_args()
+
+    if args.all or args.clients:
+        names = args.clients or [
+            c["client"] for c in list_clients() if find_stage_files(c["client"], str(OUTPUT_ROOT / c["client"]))
+        ]
+        generate_ppts(names, args.workers, args.force)
+    elif args.client_name and args.output_dir:
+        print(generate_ppt(args.client_name, args.output_dir, args.force))
     else:
-        print("Usage: python ppt_generator.py <client_name> <output_dir>")
+        parser.print_usage()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+项目输入卡索引
+把"品牌A"这样的项目名解析成客户输入卡：
+
+1. 本地 output/<客户>/ 下的输入卡（流水线写入的 <客户>_输入卡.json，或其他含 client_name 的 JSON）；
+2. 平台项目表（飞书多维表格 / Notion，经 PlatformIntegrationManager 的本地镜像读取）。
+   平台记录只有客户名称、行业、联系人等概要，不是输入卡：只在平台上找到时 client_input 为 None，
+   调用方应提示先提交输入卡，而不是拿概要去跑完整的 D/B/C/A。
+
+本地部分以 output_manifest 的版本号为缓存键，清单不变就不重建；平台部分每 PLATFORM_REFRESH_SECONDS
+刷新一次。名称先精确匹配（忽略大小写和空格），再按唯一的包含关系匹配。
+
+用法：
+    from project_index import get_project_index
+    card = get_project_index().resolve("品牌A")
+    if card:
+        card["client_name"], card["client_input"], card["source"]   # client_input 为 None：只有平台记录
+"""
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import output_manifest
+
+
+INPUT_CARD_SUFFIX = "_输入卡.json"
+PLATFORM_REFRESH_SECONDS = 300        # 平台项目列表的刷新间隔
+PLATFORM_NAME_FIELD = "客户名称"
+# output/<客户>/ 下不是输入卡的 JSON
+NON_INPUT_JSON = {"执行摘要.json"}
+
+
+def _normalize(name: str) -> str:
+    return "".join(name.split()).lower()
+
+
+class ProjectIndex:
+    """项目名 → 输入卡来源的缓存索引（线程安全）"""
+
+    def __init__(self, manager_factory=None):
+        self._manager_factory = manager_factory
+        self._lock = threading.Lock()
+        self._platform_lock = threading.Lock()            # 同一时间只有一个线程拉取平台列表
+        self._local: Dict[str, str] = {}                  # 规范化名称 → 客户目录名
+        self._local_version: Optional[int] = None
+        self._platform: Dict[str, Dict[str, Any]] = {}    # 规范化名称 → 平台项目记录
+        self._platform_loaded_at = 0.0
+
+    def _refresh_local(self):
+        version = output_manifest.manifest_version()
+        if version == self._local_version:
+            return
+        self._local = {_normalize(c["client"]): c["client"] for c in output_manifest.list_clients()}
+        self._local_version = version
+
+    def _refresh_platform(self):
+        """平台列表过期时重新拉取：请求平台（可能触发镜像同步）时不持有 self._lock，拉完再换入"""
+        if time.monotonic() - self._platform_loaded_at < PLATFORM_REFRESH_SECONDS:
+            return
+        with self._platform_lock:
+            # 等锁期间其他线程可能已经拉取过
+            if time.monotonic() - self._platform_loaded_at < PLATFORM_REFRESH_SECONDS:
+                return
+            self._load_platform()
+            # 拉取失败也记下时间，避免每次查询都重试
+            self._platform_loaded_at = time.monotonic()
+
+    def _load_platform(self):
+        try:
+            manager = self._get_manager()
+            projects = manager.get_all_projects() if manager else []
+        except Exception as e:
+            print(f"⚠️ 读取平台项目列表失败: {e}")
+            return
+        platform = {}
+        for project in projects:
+            name = project.get(PLATFORM_NAME_FIELD)
+            if isinstance(name, str) and name.strip():
+                # 列表按修改时间倒序，同名项目取最近的一条
+                platform.setdefault(_normalize(name), project)
+        with self._lock:
+            self._platform = platform
+
+    def _get_manager(self):
+        if self._manager_factory:
+            return self._manager_factory()
+        from platform_integration_manager import get_platform_manager
+        return get_platform_manager()
+
+    @staticmethod
+    def _match(name: str, names: List[str]) -> Optional[str]:
+        """精确匹配优先，否则取唯一的包含匹配"""
+        key = _normalize(name)
+        if key in names:
+            return key
+        candidates = [n for n in names if key in n or n in key]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def resolve(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        解析项目名
+
+        Returns:
+            {"client_name", "client_input", "source"}，source 为输入卡文件路径或 "platform:<记录ID>"
+            （此时 client_input 为 None，平台上没有输入卡）；找不到或匹配到多个项目时返回 None
+        """
+        if not name.strip():
+            return None
+        with self._lock:
+            self._refresh_local()
+            key = self._match(name, list(self._local))
+            client = self._local.get(key) if key else None
+        if client:
+            card = load_local_card(client)
+            if card:
+                return card
+
+        self._refresh_platform()
+        with self._lock:
+            key = self._match(name, list(self._platform))
+            project = self._platform.get(key) if key else None
+        if project:
+            return {"client_name": project[PLATFORM_NAME_FIELD], "client_input": None,
+                    "source": f"platform:{project.get('id')}"}
+        return None
+
+    def invalidate(self):
+        """下次查询时重建索引"""
+        with self._lock:
+            self._local_version = None
+            self._platform_loaded_at = 0.0
+
+
+def load_local_card(client: str) -> Optional[Dict[str, Any]]:
+    """读取 output/<客户>/ 下的输入卡：优先 <客户>_输入卡.json，其次第一个含 client_name 的 JSON"""
+    files = output_manifest.list_files(client, ".json")
+    files.sort(key=lambda f: not f["name"].endswith(INPUT_CARD_SUFFIX))
+    for f in files:
+        if f["name"] in NON_INPUT_JSON:
+            continue
+        try:
+            data = json.loads(Path(f["path"]).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, dict) and (f["name"].endswith(INPUT_CARD_SUFFIX) or "client_name" in data):
+            return {"client_name": client, "client_input": data, "source": f["path"]}
+    return None
+
+
+_index: Optional[ProjectIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_project_index() -> ProjectIndex:
+    """进程内共享的项目索引"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ProjectIndex()
+        return _index
@@ -11,40 +11,169 @@ import os
 from pathlib import Path
 from datetime import datetime
 from openai import OpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_not_exception_type
 from config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, DEFAULT_MODEL
 
 client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
 
 # Prompt 定义（从 geo_prompt_runner.py 导入）
-from geo_prompt_runner import PROMPTS, format_client_input
+from geo_prompt_runner import PROMPTS, PROMPTS_JSON, JSON_REPAIR_PROMPT, format_client_input
+from d_matrix_parser import D_JSON_SCHEMA, validate_d_json, render_d_markdown, d_json_path
+from output_manifest import refresh_client
+from sqlite_store import OUTPUT_ROOT
+from stage_stream import StageStream, PipelineCancelled, DONE, ERROR, CANCELLED, reset as reset_stream
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-def call_api_with_retry(prompt: str) -> str:
-    """带重试机制的 API 调用"""
+# 按顺序执行 D→B→C→A：(Prompt 类型, 结果文件名中的阶段名)
+PIPELINE = [
+    ("D", "矩阵提取"),
+    ("B", "转化路径"),
+    ("C", "质检暴改"),
+    ("A", "商业提案"),
+]
+STAGE_FILE_NAMES = dict(PIPELINE)
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10),
+       retry=retry_if_not_exception_type(PipelineCancelled))
+def call_api_with_retry(prompt: str, json_mode: bool = False, stream: StageStream = None) -> str:
+    """带重试机制的 API 调用
+
+    json_mode=True 时要求模型输出 JSON 对象；传入 stream 时以流式方式调用，
+    增量写入阶段流式文件，页面取消时抛出 PipelineCancelled（不重试）。
+    """
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+    messages = [
+        {"role": "system", "content": "你是一名专业的 GEO（生成式引擎优化）专家，擅长医美行业的语义优化与内容策略。"},
+        {"role": "user", "content": prompt}
+    ]
+    if stream is None:
+        response = client.chat.completions.create(
+            model=DEFAULT_MODEL,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=4000,
+            **extra
+        )
+        return response.choices[0].message.content
+
+    stream.restart()
     response = client.chat.completions.create(
         model=DEFAULT_MODEL,
-        messages=[
-            {"role": "system", "content": "你是一名专业的 GEO（生成式引擎优化）专家，擅长医美行业的语义优化与内容策略。"},
-            {"role": "user", "content": prompt}
-        ],
+        messages=messages,
         temperature=0.7,
-        max_tokens=4000
+        max_tokens=4000,
+        stream=True,
+        stream_options={"include_usage": True},
+        **extra
     )
-    return response.choices[0].message.content
+    completion_tokens = None
+    try:
+        for chunk in response:
+            if chunk.usage:
+                completion_tokens = chunk.usage.completion_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                stream.append(chunk.choices[0].delta.content)
+    finally:
+        response.close()
+    stream.finish(DONE, tokens=completion_tokens)
+    return "".join(stream.text_parts)
 
 
-def run_prompt(prompt_type: str, client_input: dict) -> str:
+def run_prompt(prompt_type: str, client_input: dict, stream: StageStream = None) -> str:
     """执行指定的 Prompt"""
     prompt_template = PROMPTS[prompt_type]
     formatted_input = format_client_input(client_input)
     full_prompt = prompt_template.format(client_input=formatted_input)
-    return call_api_with_retry(full_prompt)
+    return call_api_with_retry(full_prompt, stream=stream)
+
+
+def result_file(output_dir, client_name: str, prompt_type: str) -> Path:
+    """阶段结果文件：<输出目录>/<客户>_<阶段>_<阶段名>.md"""
+    return Path(output_dir) / f"{client_name}_{prompt_type}_{STAGE_FILE_NAMES[prompt_type]}.md"
+
+
+def save_result(output_dir, client_name: str, prompt_type: str, result: str, d_data: dict = None) -> Path:
+    """
+    写入阶段结果
+
+    D 阶段：有结构化结果时一并写入 JSON（在 markdown 之后写，保持 JSON 较新）；
+    没有时删除上一次结构化运行留下的 JSON，避免压力测试继续读取旧关键词。
+    """
+    output_file = result_file(output_dir, client_name, prompt_type)
+    output_file.write_text(result, encoding="utf-8")
+    if prompt_type == "D":
+        json_file = d_json_path(output_dir, client_name)
+        if d_data is not None:
+            json_file.write_text(json.dumps(d_data, ensure_ascii=False, indent=2), encoding="utf-8")
+        else:
+            json_file.unlink(missing_ok=True)
+    return output_file
+
 
+def save_input_card(output_dir, client_name: str, client_input: dict) -> Path:
+    """把输入卡写入输出目录；内容未变时不重写，保留修改时间，已有结果仍视为最新"""
+    input_copy = Path(output_dir) / f"{client_name}_输入卡.json"
+    content = json.dumps(client_input, ensure_ascii=False, indent=2)
+    if not input_copy.exists() or input_copy.read_text(encoding="utf-8") != content:
+        input_copy.write_text(content, encoding="utf-8")
+    return input_copy
 
-def run_full_pipeline(client_name: str, input_path: str, output_dir: str = None):
-    """运行完整的 D→B→C→A 流水线"""
+
+def cached_result(output_dir, client_name: str, prompt_type: str, client_input: dict):
+    """
+    已有的阶段结果（输入卡与当前一致，且结果在输入卡之后生成）
+
+    Returns:
+        结果文本，没有可用结果时返回 None
+    """
+    input_copy = Path(output_dir) / f"{client_name}_输入卡.json"
+    output_file = result_file(output_dir, client_name, prompt_type)
+    if not input_copy.exists() or not output_file.exists():
+        return None
+    try:
+        if json.loads(input_copy.read_text(encoding="utf-8")) != client_input:
+            return None
+    except ValueError:
+        return None
+    if output_file.stat().st_mtime < input_copy.stat().st_mtime:
+        return None
+    return output_file.read_text(encoding="utf-8")
+
+
+def run_structured_d(client_input: dict, stream: StageStream = None) -> dict:
+    """
+    以 JSON 模式执行 D 阶段，校验失败时最多修复重试一次
+
+    Returns:
+        通过 D_JSON_SCHEMA 校验的结构化结果
+
+    Raises:
+        ValueError: 修复后仍不合法
+    """
+    full_prompt = PROMPTS_JSON["D"].format(client_input=format_client_input(client_input))
+    raw = call_api_with_retry(full_prompt, json_mode=True, stream=stream)
+    try:
+        return validate_d_json(json.loads(raw))
+    except ValueError as e:  # json.JSONDecodeError 是 ValueError 的子类
+        print(f"   ⚠️ D 阶段 JSON 不合法（{e}），尝试修复一次...")
+        repair_prompt = JSON_REPAIR_PROMPT.format(
+            error=e,
+            schema=json.dumps(D_JSON_SCHEMA, ensure_ascii=False),
+            output=raw
+        )
+        repaired = call_api_with_retry(repair_prompt, json_mode=True, stream=stream)
+        return validate_d_json(json.loads(repaired))
+
+
+def run_full_pipeline(client_name: str, input_path: str, output_dir: str = None, structured_d: bool = False):
+    """运行完整的 D→B→C→A 流水线
+
+    structured_d=True 时 D 阶段输出 JSON（保存为 {client}_D_矩阵提取.json），
+    同时渲染出同名 markdown，后续阶段与交付物不受影响。
+    各阶段以流式方式生成，增量输出写入 output/客户名/.stream/ 供页面实时展示，
+    页面取消后剩余阶段不再执行。
+    """
     
     # 加载客户输入
     with open(input_path, "r", encoding="utf-8") as f:
@@ -53,36 +182,46 @@ def run_full_pipeline(client_name: str, input_path: str, output_dir: str = None)
     
     # 创建输出目录
     if output_dir is None:
-        output_dir = Path(__file__).parent.parent / "output" / client_name
+        output_dir = OUTPUT_ROOT / client_name
     else:
         output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
     print(f"✓ 输出目录: {output_dir}")
     
     # 复制输入卡到输出目录
-    input_copy = output_dir / f"{client_name}_输入卡.json"
-    with open(input_copy, "w", encoding="utf-8") as f:
-        json.dump(client_input, f, ensure_ascii=False, indent=2)
-    
-    # 按顺序执行 D→B→C→A
-    pipeline = [
-        ("D", "矩阵提取"),
-        ("B", "转化路径"),
-        ("C", "质检暴改"),
-        ("A", "商业提案"),
-    ]
+    save_input_card(output_dir, client_name, client_input)
     
+    reset_stream(output_dir, keep_cancel=True)
     results = {}
-    for prompt_type, name in pipeline:
+    cancelled = False
+    for prompt_type, name in PIPELINE:
+        if cancelled:
+            results[prompt_type] = {"status": CANCELLED}
+            continue
         print(f"\n⏳ 正在执行 Prompt {prompt_type}（{name}）...")
+        stream = StageStream(output_dir, prompt_type)
         try:
-            result = run_prompt(prompt_type, client_input)
-            output_file = output_dir / f"{client_name}_{prompt_type}_{name}.md"
-            with open(output_file, "w", encoding="utf-8") as f:
-                f.write(result)
+            d_data = None
+            if prompt_type == "D" and structured_d:
+                try:
+                    d_data = run_structured_d(client_input, stream)
+                    result = render_d_markdown(d_data)
+                except ValueError as e:
+                    print(f"   ⚠️ 结构化输出失败（{e}），改用 markdown 模式")
+                    result = run_prompt(prompt_type, client_input, stream)
+            else:
+                result = run_prompt(prompt_type, client_input, stream)
+            output_file = save_result(output_dir, client_name, prompt_type, result, d_data)
+            if d_data is not None:
+                print(f"   ✓ 结构化结果已保存到: {d_json_path(output_dir, client_name).name}")
             results[prompt_type] = {"status": "success", "file": str(output_file)}
             print(f"   ✓ 完成，已保存到: {output_file.name}")
+        except PipelineCancelled:
+            cancelled = True
+            results[prompt_type] = {"status": CANCELLED}
+            print(f"   🛑 已取消，跳过剩余阶段")
         except Exception as e:
+            stream.finish(ERROR)
             results[prompt_type] = {"status": "error", "error": str(e)}
             print(f"   ✗ 错误: {e}")
     
@@ -97,6 +236,7 @@ def run_full_pipeline(client_name: str, input_path: str, output_dir: str = None)
     summary_file = output_dir / "执行摘要.json"
     with open(summary_file, "w", encoding="utf-8") as f:
         json.dump(summary, f, ensure_ascii=False, indent=2)
+    refresh_client(output_dir)
     
     # 打印总结
     print("\n" + "="*60)
@@ -110,7 +250,7 @@ def run_full_pipeline(client_name: str, input_path: str, output_dir: str = None)
             print(f"  • {f.name} ({f.stat().st_size / 1024:.1f} KB)")
     
     success_count = sum(1 for r in results.values() if r["status"] == "success")
-    print(f"\n状态: {success_count}/{len(pipeline)} 个 Prompt 成功执行")
+    print(f"\n状态: {success_count}/{len(PIPELINE)} 个 Prompt 成功执行")
     
     return summary
 
@@ -120,9 +260,10 @@ def main():
     parser.add_argument("--client", "-c", required=True, help="客户名称")
     parser.add_argument("--input", "-i", required=True, help="客户输入卡 JSON 文件路径")
     parser.add_argument("--output", "-o", help="输出目录（可选，默认为 output/客户名/）")
+    parser.add_argument("--structured-d", action="store_true", help="D 阶段使用 JSON 结构化输出")
     
     args = parser.parse_args()
-    run_full_pipeline(args.client, args.input, args.output)
+    run_full_pipeline(args.client, args.input, args.output, structured_d=args.structured_d)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+本地 SQLite 存储的公共连接
+任务队列、输出清单、发件箱、平台镜像等都是 output/ 下的小型 SQLite 库，多个进程同时读写：
+每次操作打开一个短连接（autocommit，需要事务时显式 BEGIN IMMEDIATE），库文件使用 WAL 模式。
+建表语句每个进程每个库只执行一次。
+
+用法：
+    from sqlite_store import OUTPUT_ROOT, connect
+    with connect(DB_PATH, _SCHEMA) as conn:
+        conn.execute(...)
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Set, Union
+
+
+OUTPUT_ROOT = Path(__file__).parent.parent / "output"
+
+_initialized: Set[str] = set()
+_init_lock = threading.Lock()
+
+
+def _open(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _initialize(path: Path, schema: str):
+    """首次使用该库时建目录、切换 WAL（持久化在库文件中）并建表"""
+    key = f"{path.resolve()}\0{schema}"
+    if key in _initialized:
+        return
+    with _init_lock:
+        if key in _initialized:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = _open(path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(schema)
+        finally:
+            conn.close()
+        _initialized.add(key)
+
+
+@contextmanager
+def connect(db_path: Union[str, Path], schema: str) -> Iterator[sqlite3.Connection]:
+    """
+    打开一个短连接（行以 sqlite3.Row 返回）
+
+    Args:
+        db_path: 库文件路径
+        schema: 建表语句（CREATE ... IF NOT EXISTS），本进程第一次打开该库时执行
+    """
+    path = Path(db_path)
+    _initialize(path, schema)
+    conn = _open(path)
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+阶段流式输出
+流水线在生成过程中把每个阶段的增量文本和统计写到 <客户目录>/.stream/，
+Streamlit 页面读取这些文件实时展示；页面写入取消标记，流水线在下一个 token 处中止。
+
+文件布局：
+    .stream/D.md      D 阶段已生成的文本
+    .stream/D.json    {"status", "tokens", "elapsed", "tokens_per_sec", "started_at"}
+    .stream/CANCEL    取消标记
+"""
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+STREAM_DIR_NAME = ".stream"
+FLUSH_INTERVAL = 0.5  # 写盘节流间隔（秒）
+
+# 阶段状态
+WAITING = "waiting"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+STATUS_LABELS = {
+    WAITING: "⏸️ 等待中",
+    RUNNING: "✍️ 生成中",
+    DONE: "✅ 完成",
+    ERROR: "❌ 出错",
+    CANCELLED: "🛑 已取消",
+}
+
+
+class PipelineCancelled(Exception):
+    """用户在页面上取消了流水线"""
+    pass
+
+
+def stream_dir(client_folder) -> Path:
+    return Path(client_folder) / STREAM_DIR_NAME
+
+
+def reset(client_folder, keep_cancel: bool = False):
+    """新一轮执行前清空流式目录；keep_cancel=True 时保留已有的取消标记"""
+    directory = stream_dir(client_folder)
+    cancelled = keep_cancel and is_cancelled(client_folder)
+    if directory.exists():
+        shutil.rmtree(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if cancelled:
+        request_cancel(client_folder)
+
+
+def request_cancel(client_folder):
+    """写入取消标记"""
+    directory = stream_dir(client_folder)
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "CANCEL").touch()
+
+
+def is_cancelled(client_folder) -> bool:
+    return (stream_dir(client_folder) / "CANCEL").exists()
+
+
+def clear_cancel(client_folder):
+    (stream_dir(client_folder) / "CANCEL").unlink(missing_ok=True)
+
+
+class StageStream:
+    """单个阶段的流式写入器（流水线进程内使用）"""
+
+    def __init__(self, client_folder, stage: str):
+        self.client_folder = Path(client_folder)
+        self.directory = stream_dir(client_folder)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.stage = stage
+        self.text_parts = []
+        self.tokens = 0
+        self.started_at = time.time()
+        self._last_flush = 0.0
+        self._write_stats(RUNNING)
+
+    def restart(self):
+        """API 重试时丢弃已生成的部分"""
+        self.text_parts = []
+        self.tokens = 0
+        self.started_at = time.time()
+        self.flush(force=True)
+
+    def append(self, delta: str):
+        """追加一个增量片段；检测到取消标记时抛出 PipelineCancelled"""
+        self.text_parts.append(delta)
+        self.tokens += 1
+        # 取消标记随写盘一起检查，避免每个 token 都访问文件系统
+        if self.flush() and is_cancelled(self.client_folder):
+            self.finish(CANCELLED)
+            raise PipelineCancelled(f"{self.stage} 阶段已取消")
+
+    def flush(self, force: bool = False) -> bool:
+        """节流写盘，返回本次是否实际写入"""
+        now = time.time()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return False
+        self._last_flush = now
+        (self.directory / f"{self.stage}.md").write_text("".join(self.text_parts), encoding="utf-8")
+        self._write_stats(RUNNING)
+        return True
+
+    def finish(self, status: str = DONE, tokens: Optional[int] = None):
+        """结束阶段；tokens 为 API 返回的真实 completion_tokens（若有）"""
+        if tokens:
+            self.tokens = tokens
+        (self.directory / f"{self.stage}.md").write_text("".join(self.text_parts), encoding="utf-8")
+        self._write_stats(status)
+
+    def _write_stats(self, status: str):
+        elapsed = time.time() - self.started_at
+        stats = {
+            "status": status,
+            "tokens": self.tokens,
+            "elapsed": round(elapsed, 1),
+            "tokens_per_sec": round(self.tokens / elapsed, 1) if elapsed > 0 else 0,
+            "started_at": self.started_at,
+        }
+        tmp = self.directory / f"{self.stage}.json.tmp"
+        tmp.write_text(json.dumps(stats), encoding="utf-8")
+        tmp.replace(self.directory / f"{self.stage}.json")
+
+
+def read_stage(client_folder, stage: str) -> Dict[str, Any]:
+    """
+    读取阶段的当前输出（页面使用）
+
+    Returns:
+        {"status", "tokens", "elapsed", "tokens_per_sec", "text"}，尚未开始则 status 为 waiting
+    """
+    directory = stream_dir(client_folder)
+    stats_file = directory / f"{stage}.json"
+    if not stats_file.exists():
+        return {"status": WAITING, "tokens": 0, "elapsed": 0, "tokens_per_sec": 0, "text": ""}
+    try:
+        stats = json.loads(stats_file.read_text(encoding="utf-8"))
+    except (json.JSONDecodeError, OSError):
+        stats = {"status": RUNNING, "tokens": 0, "elapsed": 0, "tokens_per_sec": 0}
+    if stats["status"] == RUNNING:
+        # 运行中的阶段按当前时间刷新耗时
+        stats["elapsed"] = round(time.time() - stats.get("started_at", time.time()), 1)
+    text_file = directory / f"{stage}.md"
+    stats["text"] = text_file.read_text(encoding="utf-8") if text_file.exists() else ""
+    return stats
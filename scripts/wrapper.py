@@ -2,92 +2,27 @@
 
 import subprocess
 import os
-import re
 from pathlib import Path
 from typing import List, Tuple
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 
+from d_matrix_parser import load_d_matrix
+from output_manifest import refresh_client
+
 # -------------------------------------------------------------------
 # Helper: Extract keywords and questions from D matrix file
 # -------------------------------------------------------------------
 def _extract_keywords_and_questions(client_folder: str, client_name: str) -> Tuple[List[str], List[str]]:
     """从D矩阵提取文件中提取关键词和问题
 
+    解析由 d_matrix_parser 完成（单遍表格解析，按文件 mtime/哈希缓存）。
+
     Returns:
         (keywords, questions) 两个列表
     """
-    d_matrix_file = Path(client_folder) / f"{client_name}_D_矩阵提取.md"
-
-    if not d_matrix_file.exists():
-        raise FileNotFoundError(f"D矩阵文件不存在: {d_matrix_file}")
-
-    content = d_matrix_file.read_text(encoding='utf-8')
-
-    keywords = []
-    questions = []
-
-    # 提取硬核实体词 - 支持两种格式
-    keywords = []
-
-    # 格式1: 两列表格，关键词用<br>分隔
-    # | **1. 硬核实体词** | 1. 关键词<br>2. 关键词<br>... |
-    keyword_cell_match = re.search(r'\|\s*\*\*1\.\s*硬核实体词\*\*\s*\|\s*(.+?)\s*\|', content)
-    if keyword_cell_match:
-        cell_content = keyword_cell_match.group(1)
-        # 提取所有编号的关键词
-        keyword_items = re.findall(r'\d+\.\s*([^<\n]+?)(?:<br>|\||$)', cell_content)
-        for kw in keyword_items:
-            kw = kw.strip()
-            # 清理括号内容
-            kw = re.sub(r'\s*\([^)]*\)', '', kw)
-            kw = re.sub(r'\s*\[[^\]]*\]', '', kw)
-            kw = re.sub(r'\s*（[^）]*）', '', kw)
-            if kw and len(kw) > 1:
-                keywords.append(kw)
-
-    # 格式2: 多行表格（备用）
-    if not keywords:
-        keyword_match = re.search(r'\*\*1\. 硬核实体词\*\*.*?\n\*\*2\.', content, re.DOTALL)
-        if keyword_match:
-            section_text = keyword_match.group(0)
-            keyword_pattern = r'\|\s*(?:\*\*1\. 硬核实体词\*\*\s*)?\|?\s*\d+\s*\|\s*\*\*(.+?)\*\*'
-            for match in re.finditer(keyword_pattern, section_text):
-                keyword = match.group(1).strip()
-                if keyword != '1. 硬核实体词' and '硬核实体词' not in keyword:
-                    keyword = re.sub(r'\s*\([^)]*\)', '', keyword)
-                    keyword = re.sub(r'\s*\[[^\]]*\]', '', keyword)
-                    if keyword:
-                        keywords.append(keyword)
-
-    # 提取预测AI热门提问 - 支持两种格式
-    questions = []
-
-    # 格式1: 两列表格，问题用<br>分隔
-    # | **4. 预测 AI 热门提问** | 1. "问题？"<br>2. "问题？"<br>... |
-    question_cell_match = re.search(r'\|\s*\*\*4\.\s*预测\s*AI\s*热门提问\*\*\s*\|\s*(.+?)\s*\|', content)
-    if question_cell_match:
-        cell_content = question_cell_match.group(1)
-        # 提取所有编号的问题
-        question_items = re.findall(r'\d+\.\s*["""]?([^""<\n]+?)["""]?(?:<br>|\||$)', cell_content)
-        for q in question_items:
-            q = q.strip()
-            # 确保问题不为空且有实际内容
-            if q and len(q) > 5:
-                # 移除可能的引号
-                q = q.strip('"').strip('"').strip('"')
-                questions.append(q)
-
-    # 格式2: 多行表格（备用）
-    if not questions:
-        question_section = re.search(r'\*\*4\. 预测 AI 热门提问\*\*.*?\n(.*?)(\n\*\*|$)', content, re.DOTALL)
-        if question_section:
-            lines = question_section.group(1).split('\n')
-            for line in lines:
-                match = re.search(r'\|\s*\d+\s*\|\s*\*\*(.+?)\*\*', line)
-                if match:
-                    question = match.group(1).strip()
-                    if question:
-                        questions.append(question)
+    sections = load_d_matrix(client_folder, client_name)
+    keywords = sections["entities"]
+    questions = [q for q in sections["questions"] if len(q) > 5]
 
     # 如果提取失败，使用默认值
     if not keywords:
@@ -133,12 +68,15 @@ def _run_cmd(cmd: List[str], cwd: Path = None) -> subprocess.CompletedProcess:
 # -------------------------------------------------------------------
 # 1️⃣ Run full D→B→C→A pipeline
 # -------------------------------------------------------------------
-def run_pipeline(client_name: str, input_json_path: str) -> str:
+def run_pipeline(client_name: str, input_json_path: str, structured_d: bool = False) -> str:
     """Execute the full GEO pipeline for a client.
+    ``structured_d`` asks the D stage for validated JSON output instead of markdown tables.
     Returns the path to the client output folder.
     """
     script_path = Path(__file__).parent / "run_full_pipeline.py"
     cmd = ["python3", str(script_path), "--client", client_name, "--input", input_json_path]
+    if structured_d:
+        cmd.append("--structured-d")
     _run_cmd(cmd, cwd=Path(__file__).parent)
     # The pipeline creates files under ../output/<client_name>
     return str(Path(__file__).parent.parent / "output" / client_name)
@@ -186,6 +124,7 @@ def run_pressure_test(client_name: str, client_folder: str, engines: List[str])
     cmd.extend(keywords[:10])  # 最多10个关键词
 
     _run_cmd(cmd, cwd=Path(__file__).parent)
+    refresh_client(client_folder)
     # The script writes a report named "压力测试报告.md" inside the client folder
     report_path = Path(client_folder) / "压力测试报告.md"
     return str(report_path)
@@ -209,6 +148,7 @@ def generate_comparison_report(before_json: str, after_json: str, client_name: s
         client_name,
     ]
     _run_cmd(cmd, cwd=Path(__file__).parent)
+    refresh_client(Path(after_json).parent)
     # The script creates a file named "对比报告.md" in the same directory as the after_json
     report_path = Path(after_json).parent / "对比报告.md"
     return str(report_path)